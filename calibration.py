@@ -0,0 +1,289 @@
+"""
+INT8 量化校准集
+从训练集中按类别分层抽取有代表性的 N 张图片，并缓存选择结果和预处理后的张量
+
+- 选择结果写成图片列表 + 校准用 data.yaml，ONNX / TensorRT 的 INT8 导出共用同一批图片
+- 预处理后的张量 (N, 3, imgsz, imgsz) uint8 缓存为内存映射 .npy，重复使用时无需再解码；
+  onnxruntime 静态量化以及 ultralytics 的 ONNX / TensorRT INT8 导出都直接读取这份缓存
+
+使用方式：
+  # 导出时自动使用 (export_model.py --int8)
+  # 单独准备校准集
+  python calibration.py --dataset-dir datasets --images 256 --imgsz 640 --tensors
+"""
+
+import argparse
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import yaml
+
+from label_cache import LabelCache
+
+
+# 支持的图像格式
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.webp'}
+
+# 默认缓存目录（位于导出目录下）
+CALIBRATION_DIR_NAME = '.calibration'
+
+
+def _list_images(images_dir):
+    """{文件名主干: 图片路径}"""
+    with os.scandir(images_dir) as entries:
+        return {os.path.splitext(e.name)[0]: e.path for e in entries
+                if e.is_file() and os.path.splitext(e.name)[1].lower() in IMAGE_EXTENSIONS}
+
+
+def _split_fingerprint(labels_dir, images):
+    """根据标签文件的 文件名 / 修改时间 / 大小 计算目录指纹，标签变化后重新选择"""
+    digest = hashlib.sha256()
+    for stem in sorted(images):
+        label_path = os.path.join(labels_dir, f"{stem}.txt")
+        try:
+            st = os.stat(label_path)
+            digest.update(f"{stem}:{st.st_mtime_ns}:{st.st_size};".encode())
+        except FileNotFoundError:
+            digest.update(f"{stem}:-;".encode())
+    return digest.hexdigest()
+
+
+def select_calibration_images(images, labels_dir, num_images=256, seed=0):
+    """
+    按类别分层抽样
+
+    每张图片归入它所含的"最稀有"类别对应的层（不含目标的图片单独一层），
+    各层平均分配名额，层内随机抽取，名额用不完时再分给其它层
+
+    Args:
+        images: {文件名主干: 图片路径}
+        labels_dir: 标签目录
+        num_images: 抽取数量
+        seed: 随机种子
+
+    Returns:
+        排好序的图片路径列表
+    """
+    stems = sorted(images)
+    labels = LabelCache.load(labels_dir, verbose=False)
+    class_ids = [labels.get(stem)[:, 0].astype(int).tolist() for stem in stems]
+
+    totals = {}
+    for ids in class_ids:
+        for c in ids:
+            totals[c] = totals.get(c, 0) + 1
+
+    strata = {}
+    for stem, ids in zip(stems, class_ids):
+        key = min(set(ids), key=lambda c: (totals[c], c)) if ids else 'background'
+        strata.setdefault(key, []).append(stem)
+
+    rng = np.random.default_rng(seed)
+    pools = {key: list(rng.permutation(members)) for key, members in sorted(strata.items(), key=str)}
+
+    # 轮流从各层取图，保证类别均衡
+    selected = []
+    num_images = min(num_images, len(stems))
+    while len(selected) < num_images:
+        for key in list(pools):
+            if not pools[key]:
+                del pools[key]
+                continue
+            selected.append(pools[key].pop())
+            if len(selected) >= num_images:
+                break
+
+    return sorted(images[stem] for stem in selected)
+
+
+def prepare_calibration(dataset_dir='datasets', data_yaml=None, split='train', num_images=256,
+                        seed=0, cache_dir=os.path.join('model_exporter', CALIBRATION_DIR_NAME)):
+    """
+    选择校准图片并生成校准用 data.yaml；标签未变化时直接复用上次的选择
+
+    Args:
+        dataset_dir: 数据集目录
+        data_yaml: 数据集配置文件（读取类别名称），默认 <dataset_dir>/data.yaml
+        split: 从哪个划分抽取
+        num_images: 抽取数量
+        seed: 随机种子
+        cache_dir: 缓存目录
+
+    Returns:
+        {'key', 'yaml', 'list', 'images'}
+    """
+    data_yaml = data_yaml or os.path.join(dataset_dir, 'data.yaml')
+    images_dir = os.path.join(dataset_dir, split, 'images')
+    labels_dir = os.path.join(dataset_dir, split, 'labels')
+    if not os.path.isdir(images_dir):
+        raise FileNotFoundError(f"图片目录不存在: {images_dir}")
+
+    images = _list_images(images_dir)
+    if not images:
+        raise ValueError(f"图片目录为空: {images_dir}")
+
+    fingerprint = _split_fingerprint(labels_dir, images)
+    key = hashlib.sha256(f"{fingerprint}:{num_images}:{seed}".encode()).hexdigest()[:16]
+
+    os.makedirs(cache_dir, exist_ok=True)
+    list_path = os.path.abspath(os.path.join(cache_dir, f"calib_{key}.txt"))
+    yaml_path = os.path.abspath(os.path.join(cache_dir, f"calib_{key}.yaml"))
+
+    if os.path.exists(list_path) and os.path.exists(yaml_path):
+        with open(list_path, 'r', encoding='utf-8') as f:
+            selected = [line.strip() for line in f if line.strip()]
+        print(f"⚡ 复用校准集: {list_path} ({len(selected)} 张)")
+        return {'key': key, 'yaml': yaml_path, 'list': list_path, 'images': selected}
+
+    print(f"🎯 从 {images_dir} 分层抽取 {num_images} 张校准图片...")
+    selected = [os.path.abspath(p) for p in
+                select_calibration_images(images, labels_dir, num_images, seed)]
+
+    with open(data_yaml, 'r', encoding='utf-8') as f:
+        names = yaml.safe_load(f).get('names', [])
+
+    tmp_path = f"{list_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(selected) + '\n')
+    os.replace(tmp_path, list_path)
+
+    calib_config = {
+        'train': list_path,
+        'val': list_path,
+        'nc': len(names),
+        'names': names,
+    }
+    tmp_path = f"{yaml_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(calib_config, f, allow_unicode=True)
+    os.replace(tmp_path, yaml_path)
+
+    print(f"✅ 校准集已保存: {yaml_path} ({len(selected)} 张)")
+    return {'key': key, 'yaml': yaml_path, 'list': list_path, 'images': selected}
+
+
+def _load_tensor(path, imgsz):
+    """读取一张图片并预处理为 letterbox 后的 RGB CHW uint8"""
+    import cv2
+    from inference_pipeline import letterbox
+
+    image = cv2.imread(path)
+    if image is None:
+        raise IOError(f"无法读取图片: {path}")
+    image, _, _ = letterbox(image, imgsz)
+    return image[..., ::-1].transpose(2, 0, 1)
+
+
+def load_calibration_tensors(calibration, imgsz=640, workers=8):
+    """
+    获取校准图片的预处理张量，首次调用时并行解码并写入内存映射 .npy
+
+    Args:
+        calibration: prepare_calibration 的返回值
+        imgsz: 预处理尺寸
+        workers: 解码线程数
+
+    Returns:
+        只读内存映射数组 (N, 3, imgsz, imgsz) uint8，RGB，未归一化
+    """
+    cache_dir = os.path.dirname(calibration['list'])
+    npy_path = os.path.join(cache_dir, f"calib_{calibration['key']}_{imgsz}.npy")
+
+    if not os.path.exists(npy_path):
+        paths = calibration['images']
+        print(f"🔄 预处理 {len(paths)} 张校准图片 -> {npy_path}")
+        tmp_path = f"{npy_path}.tmp"
+        tensors = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8,
+                                            shape=(len(paths), 3, imgsz, imgsz))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for i, tensor in enumerate(executor.map(lambda p: _load_tensor(p, imgsz), paths)):
+                tensors[i] = tensor
+        tensors.flush()
+        del tensors
+        os.replace(tmp_path, npy_path)
+
+    return np.load(npy_path, mmap_mode='r')
+
+
+class CalibrationBatches:
+    """按 batch 迭代缓存的校准张量，接口与 ultralytics INT8 校准使用的 DataLoader 相同"""
+
+    def __init__(self, npy_path, batch_size):
+        """
+        Args:
+            npy_path: load_calibration_tensors 写出的 .npy
+            batch_size: 校准 batch 大小（不足一个 batch 的尾部丢弃，与 drop_last 一致）
+        """
+        self.tensors = np.load(npy_path, mmap_mode='r')
+        self.batch_size = min(batch_size, len(self.tensors))
+
+    def __len__(self):
+        return len(self.tensors) // self.batch_size
+
+    def __iter__(self):
+        import torch
+
+        for i in range(len(self)):
+            start = i * self.batch_size
+            yield {'img': torch.from_numpy(np.array(self.tensors[start:start + self.batch_size]))}
+
+
+# 从缓存张量校准的 ultralytics 导出格式
+CACHED_CALIBRATION_FORMATS = ('onnx', 'engine')
+
+
+def use_cached_calibration_tensors(npy_path):
+    """
+    让当前进程中 ultralytics 的 ONNX / TensorRT INT8 导出使用缓存的校准张量，不再重新解码校准图片
+
+    替换 Exporter.get_int8_calibration_dataloader；张量尺寸与导出尺寸不一致时仍走原来的数据集
+
+    Args:
+        npy_path: load_calibration_tensors 写出的 .npy
+    """
+    from ultralytics.engine.exporter import Exporter
+
+    build_dataloader = Exporter.get_int8_calibration_dataloader
+    imgsz = np.load(npy_path, mmap_mode='r').shape[-1]
+
+    def get_int8_calibration_dataloader(self, prefix=''):
+        if self.args.format not in CACHED_CALIBRATION_FORMATS or tuple(self.imgsz) != (imgsz, imgsz):
+            return build_dataloader(self, prefix)
+        print(f"⚡ {self.args.format} INT8 校准使用缓存张量: {npy_path}")
+        return CalibrationBatches(npy_path, self.args.batch)
+
+    Exporter.get_int8_calibration_dataloader = get_int8_calibration_dataloader
+
+
+def main():
+    parser = argparse.ArgumentParser(description='准备 INT8 量化校准集')
+    parser.add_argument('--dataset-dir', type=str, default='datasets',
+                        help='数据集目录 (默认: datasets)')
+    parser.add_argument('--data', type=str, default=None,
+                        help='数据集配置文件 (默认: <dataset-dir>/data.yaml)')
+    parser.add_argument('--split', type=str, default='train',
+                        help='抽样的数据划分 (默认: train)')
+    parser.add_argument('--images', type=int, default=256,
+                        help='校准图片数量 (默认: 256)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='随机种子 (默认: 0)')
+    parser.add_argument('--imgsz', type=int, default=640,
+                        help='预处理尺寸 (默认: 640)')
+    parser.add_argument('--cache-dir', type=str,
+                        default=os.path.join('model_exporter', CALIBRATION_DIR_NAME),
+                        help='缓存目录 (默认: model_exporter/.calibration)')
+    parser.add_argument('--tensors', action='store_true',
+                        help='同时生成预处理张量缓存 (.npy)')
+    args = parser.parse_args()
+
+    calibration = prepare_calibration(args.dataset_dir, args.data, args.split, args.images,
+                                      args.seed, args.cache_dir)
+    if args.tensors:
+        tensors = load_calibration_tensors(calibration, args.imgsz)
+        print(f"✅ 校准张量: {tensors.shape} {tensors.dtype}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Conversion manifest for incremental YOLO -> Label Studio exports
+记录上次转换时每张图像及其标注文件的 (修改时间, 文件大小, 内容哈希)，
+下次转换只输出新增或变化的任务，并给出已删除的图像
+
+文件状态未变化时直接沿用记录的哈希，不读取文件；状态变化时重新计算哈希，
+内容相同（例如只是 touch）仍视为未变化
+
+Usage:
+    manifest = ConversionManifest.load('datasets/train/.label_studio_manifest.json', config)
+    plan = manifest.plan([(image_url, image_path, label_path), ...])
+    # 转换 plan.changed 中的图像 ...
+    manifest.save()
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+
+# 默认 manifest 文件名（位于数据集划分目录）
+MANIFEST_NAME = '.label_studio_manifest.json'
+
+MANIFEST_VERSION = 1
+
+
+def file_digest(path: Union[str, Path], chunk_size: int = 1 << 20) -> str:
+    """计算文件内容的 SHA1"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ConversionPlan(NamedTuple):
+    """一次增量转换的计划"""
+    changed: set            # 需要转换的图像 URL（新增 + 变化）
+    new: int                # 新增的图像数
+    modified: int           # 内容变化的图像数
+    unchanged: int          # 未变化的图像数
+    deleted: List[str]      # 已删除的图像 URL
+
+
+class ConversionManifest:
+    """按图像 URL 记录图像与标注文件状态的 manifest"""
+
+    def __init__(self, path: Union[str, Path], config: Dict[str, Any],
+                 entries: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Args:
+            path: manifest 文件路径
+            config: 影响转换结果的配置（类别名称、图像相对路径等），变化后全部重新转换
+            entries: {图像URL: {'image': [mtime_ns, size, sha1], 'label': [...] 或 None}}
+        """
+        self.path = Path(path)
+        self.config = config
+        self.entries = entries or {}
+        self._current = {}
+
+    @classmethod
+    def load(cls, path: Union[str, Path], config: Dict[str, Any]) -> 'ConversionManifest':
+        """
+        读取 manifest；文件不存在、版本或配置不一致时返回空 manifest（即全量转换）
+        """
+        path = Path(path)
+        if not path.exists():
+            return cls(path, config)
+
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != MANIFEST_VERSION or data.get('config') != config:
+            print(f"Warning: Manifest {path} was written with a different configuration, "
+                  f"converting everything")
+            return cls(path, config)
+        return cls(path, config, data.get('entries', {}))
+
+    @staticmethod
+    def _file_state(path: Path, previous: Optional[List]) -> Optional[List]:
+        """[mtime_ns, size, sha1]；状态未变化时沿用上次的哈希"""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if previous and previous[0] == st.st_mtime_ns and previous[1] == st.st_size:
+            return previous
+        return [st.st_mtime_ns, st.st_size, file_digest(path)]
+
+    def _entry(self, url: str, image_path: Path, label_path: Path) -> Dict[str, Any]:
+        previous = self.entries.get(url, {})
+        return {
+            'image': self._file_state(image_path, previous.get('image')),
+            'label': self._file_state(label_path, previous.get('label')),
+        }
+
+    def plan(self, items: List[Tuple[str, Path, Path]], workers: int = 8) -> ConversionPlan:
+        """
+        对比当前文件与 manifest
+
+        Args:
+            items: [(图像URL, 图像路径, 标注路径), ...]
+            workers: 计算哈希的线程数
+
+        Returns:
+            ConversionPlan
+        """
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            states = list(executor.map(lambda item: self._entry(*item), items))
+
+        self._current = {}
+        changed = set()
+        new = modified = 0
+        for (url, _, _), state in zip(items, states):
+            previous = self.entries.get(url)
+            self._current[url] = state
+            if previous is None:
+                new += 1
+                changed.add(url)
+            elif ((previous['image'] or [None] * 3)[2] != (state['image'] or [None] * 3)[2]
+                  or (previous['label'] or [None] * 3)[2] != (state['label'] or [None] * 3)[2]):
+                modified += 1
+                changed.add(url)
+
+        deleted = sorted(url for url in self.entries if url not in self._current)
+        return ConversionPlan(changed, new, modified, len(items) - new - modified, deleted)
+
+    def update(self, converted: set, failed: set):
+        """
+        用 plan 时记录的当前状态替换 manifest
+
+        Args:
+            converted: 本次成功转换的图像 URL
+            failed: 本次转换失败的图像 URL，不记录，下次重试
+        """
+        self.entries = {url: state for url, state in self._current.items()
+                        if url not in failed and (url in converted or url in self.entries)}
+
+    def save(self):
+        """原子写出 manifest"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'config': self.config, 'entries': self.entries},
+                      f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,275 @@
+"""
+数据加载吞吐分析
+按 train.py 的预设配置构建与训练相同的数据集和增强流程，不加载模型，只迭代 DataLoader，
+测量不同 workers 下的 images/sec，并统计每个阶段的耗时，找出数据加载的瓶颈阶段
+
+阶段（各自只计本身耗时，不含嵌套的子阶段）：
+  read 读取文件字节 / decode 解码 / resize 按 imgsz 缩放 (load_image) / letterbox /
+  mosaic / perspective / mixup / hsv / flip / format / collate 组 batch / other 其余开销
+
+与 train_autotune.py 缓存的模型吞吐对比，判断训练受限于 CPU（数据加载）还是 GPU（模型计算）
+
+使用方式：
+  python dataloader_profile.py --config t4_standard
+  python dataloader_profile.py --config m1_standard --workers 0 2 4 --batches 30
+  python dataloader_profile.py --config t4_standard --data datasets_packed/data.yaml --output profile.json
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+
+import cv2
+import numpy as np
+import ultralytics.data.base as ultralytics_base
+from ultralytics.data.augment import Compose
+
+from shard_training import find_shard_member
+from train import CONFIGS, augment_overrides, get_config
+from train_autotune import build_train_dataset, load_tuning, tuning_key
+
+
+# 增强类 -> 阶段名
+STAGE_NAMES = {
+    'LetterBox': 'letterbox',
+    'Mosaic': 'mosaic',
+    'RandomPerspective': 'perspective',
+    'CopyPaste': 'copy_paste',
+    'MixUp': 'mixup',
+    'CutMix': 'cutmix',
+    'Albumentations': 'albumentations',
+    'RandomHSV': 'hsv',
+    'RandomFlip': 'flip',
+    'Format': 'format',
+}
+
+# 报告中的阶段顺序
+STAGE_ORDER = ['read', 'decode', 'resize', 'letterbox', 'mosaic', 'perspective', 'copy_paste', 'mixup',
+               'cutmix', 'albumentations', 'hsv', 'flip', 'format', 'other', 'collate']
+
+WARMUP_BATCHES = 3
+
+# 样本中携带阶段耗时的键（collate 时取出）
+TIMINGS_KEY = 'profile_timings'
+
+# 当前进程（主进程或 DataLoader worker）的计时状态
+_TIMINGS = defaultdict(float)
+_STACK = []
+
+
+class _Stage:
+    """计时上下文：阶段只累计自身耗时，嵌套阶段的耗时从外层扣除"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        _STACK.append([time.perf_counter(), 0.0])
+
+    def __exit__(self, *exc):
+        start, nested = _STACK.pop()
+        elapsed = time.perf_counter() - start
+        _TIMINGS[self.name] += elapsed - nested
+        if _STACK:
+            _STACK[-1][1] += elapsed
+
+
+class _Timed:
+    """给增强 / load_image 计时的包装（可 pickle，随数据集传给 worker）"""
+
+    def __init__(self, fn, stage):
+        self.fn = fn
+        self.stage = stage
+
+    def __call__(self, *args, **kwargs):
+        with _Stage(self.stage):
+            return self.fn(*args, **kwargs)
+
+
+def _imread(filename, flags=cv2.IMREAD_COLOR):
+    """替换 ultralytics 的 imread，分开统计读取和解码（分片数据集从 mmap 读取）"""
+    member = find_shard_member(filename)
+    with _Stage('read'):
+        if member is not None:
+            reader, index = member
+            # 复制一次，让 mmap 缺页的 I/O 计入读取而不是解码
+            data = np.frombuffer(reader.read(index), dtype=np.uint8).copy()
+        else:
+            try:
+                data = np.fromfile(filename, np.uint8)
+            except OSError:
+                return None
+    with _Stage('decode'):
+        if not data.size:
+            return None
+        return cv2.imdecode(data, flags)
+
+
+def _wrap_transforms(transforms):
+    """给 Compose 中的每个增强加上计时（嵌套的 Compose 展开，MixUp 复用的 pre_transform 同样计时）"""
+    for i, transform in enumerate(transforms.transforms):
+        if isinstance(transform, Compose):
+            _wrap_transforms(transform)
+        elif not isinstance(transform, _Timed):
+            name = type(transform).__name__
+            transforms.transforms[i] = _Timed(transform, STAGE_NAMES.get(name, name.lower()))
+
+
+class ProfiledDataset:
+    """包装训练数据集：每个样本附带各阶段耗时，collate 时汇总到 batch"""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        dataset.load_image = _Timed(dataset.load_image, 'resize')
+        _wrap_transforms(dataset.transforms)
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index):
+        # worker 进程中反序列化数据集时分片会重新注册 imread，这里每次覆盖
+        ultralytics_base.imread = _imread
+        _TIMINGS.clear()
+        with _Stage('other'):
+            sample = self.dataset[index]
+        sample[TIMINGS_KEY] = dict(_TIMINGS)
+        return sample
+
+    def collate_fn(self, batch):
+        timings = defaultdict(float)
+        for sample in batch:
+            for stage, seconds in sample.pop(TIMINGS_KEY).items():
+                timings[stage] += seconds
+        start = time.perf_counter()
+        collated = self.dataset.collate_fn(batch)
+        timings['collate'] += time.perf_counter() - start
+        collated[TIMINGS_KEY] = dict(timings)
+        return collated
+
+
+def profile_workers(dataset, batch, workers, batches):
+    """
+    用指定 workers 迭代数据集
+
+    Args:
+        dataset: ProfiledDataset
+        batch: batch size
+        workers: DataLoader workers
+        batches: 计时的 batch 数（之前先预热 WARMUP_BATCHES 个）
+
+    Returns:
+        {'workers', 'images_per_sec', 'stages_ms': {阶段: 每张图毫秒}}
+    """
+    from ultralytics.data import build_dataloader
+
+    loader = build_dataloader(dataset, batch, workers, shuffle=True, device='cpu')
+    try:
+        def iterate():
+            while True:
+                yield from loader
+
+        iterator = iterate()
+        for _ in range(WARMUP_BATCHES):
+            next(iterator)
+
+        timings = defaultdict(float)
+        images = 0
+        start = time.perf_counter()
+        for _ in range(batches):
+            data = next(iterator)
+            images += len(data['img'])
+            for stage, seconds in data[TIMINGS_KEY].items():
+                timings[stage] += seconds
+        elapsed = time.perf_counter() - start
+    finally:
+        if hasattr(loader, 'close'):
+            loader.close()
+
+    stages = {stage: timings[stage] * 1000 / images for stage in STAGE_ORDER if stage in timings}
+    stages.update({stage: seconds * 1000 / images for stage, seconds in timings.items() if stage not in stages})
+    return {
+        'workers': loader.num_workers,
+        'images_per_sec': images / elapsed,
+        'stages_ms': stages,
+    }
+
+
+def print_profile(rows, model_ips=None):
+    """打印各 workers 的吞吐、阶段耗时和瓶颈"""
+    print("\n" + "=" * 70)
+    print("📊 数据加载吞吐")
+    print("=" * 70)
+    for row in rows:
+        total = sum(row['stages_ms'].values())
+        print(f"  workers {row['workers']:>2}: {row['images_per_sec']:8.1f} img/s "
+              f"(每张图 {total:.1f} ms CPU)")
+
+    # 阶段耗时与 workers 无关，取最后一组（样本最多的并行配置）
+    stages = rows[-1]['stages_ms']
+    total = sum(stages.values())
+    print(f"\n⏱️  各阶段耗时 (每张图):")
+    for stage, ms in stages.items():
+        print(f"  {stage:<15} {ms:8.2f} ms  {ms / total * 100:5.1f}%")
+    bottleneck = max(stages, key=stages.get)
+    print(f"\n🐢 瓶颈阶段: {bottleneck} ({stages[bottleneck] / total * 100:.1f}%)")
+
+    best = max(rows, key=lambda row: row['images_per_sec'])
+    print(f"🚀 最高吞吐: {best['images_per_sec']:.1f} img/s (workers {best['workers']})")
+    if model_ips:
+        print(f"🧠 模型吞吐 (train_autotune 缓存): {model_ips:.1f} img/s")
+        if best['images_per_sec'] < model_ips:
+            print("💡 训练受限于数据加载：增加 CPU 核数 / workers，或预先缩放、打包数据集")
+        else:
+            print("💡 训练受限于模型计算：更快的 GPU 才能提速")
+    return bottleneck
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据加载吞吐与各阶段耗时分析')
+    parser.add_argument('--config', type=str, choices=list(CONFIGS.keys()),
+                        help='train.py 预设配置名称')
+    parser.add_argument('--data', type=str, help='数据集配置文件 (默认: 预设中的 DATA_YAML)')
+    parser.add_argument('--batch', type=int, help='批次大小 (默认: 预设中的 BATCH_SIZE)')
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help='测试的 workers 数 (默认: 0 2 4 8 中不超过 CPU 核数的值)')
+    parser.add_argument('--batches', type=int, default=20,
+                        help='每组计时的 batch 数 (默认: 20)')
+    parser.add_argument('--cache', type=str, choices=['ram', 'disk'], default=None,
+                        help='图像缓存方式 (默认: 不缓存，测量读取和解码)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    config = get_config(args.config)
+    data_yaml = args.data or config['DATA_YAML']
+    batch = args.batch or config['BATCH_SIZE']
+    imgsz = config['IMG_SIZE']
+    workers = args.workers or [w for w in (0, 2, 4, 8) if w <= (os.cpu_count() or 1)]
+
+    print(f"📂 预设: {args.config or '默认'}, 数据集: {data_yaml}, batch {batch}, imgsz {imgsz}")
+    print(f"🎨 增强: mosaic {config['MOSAIC']}, mixup {config['MIXUP']}, "
+          f"hsv ({config['HSV_H']}, {config['HSV_S']}, {config['HSV_V']})")
+    dataset = ProfiledDataset(build_train_dataset(data_yaml, imgsz, batch, augment_overrides(config),
+                                                  cache=args.cache or False))
+
+    rows = []
+    for count in workers:
+        print(f"\n🔄 workers {count}...")
+        row = profile_workers(dataset, batch, count, args.batches)
+        print(f"  {row['images_per_sec']:.1f} img/s")
+        rows.append(row)
+
+    tuned = load_tuning(tuning_key(config['MODEL_NAME'], imgsz, config['DEVICE']))
+    bottleneck = print_profile(rows, tuned['model_images_per_sec'] if tuned else None)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': args.config, 'data': data_yaml, 'batch': batch, 'imgsz': imgsz,
+                       'bottleneck': bottleneck, 'results': rows}, f, indent=2, ensure_ascii=False)
+        print(f"📄 结果已保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
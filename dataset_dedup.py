@@ -0,0 +1,429 @@
+"""
+近重复图片与划分泄漏检测
+为 datasets/{train,valid,test} 的全部图片计算感知哈希 (dHash + pHash)，查找近重复图片，
+报告跨划分的泄漏（验证 / 测试集图片在训练集中有近重复），并可写出去重后的数据集
+
+- 哈希并行计算（JPEG 按缩小尺寸解码），保存在 <dataset-dir>/.image_hashes.sqlite，
+  按 (路径, 修改时间, 文件大小) 失效，重复运行只处理变化的图片
+- 查找使用多索引哈希：阈值为 t 时把 64 位 dHash 切成 t+1 段，距离不超过 t 的两张图片
+  至少有一段完全相同，只在同段同值的桶内比较，避免 O(n²) 两两比较
+- 候选对再用 pHash 确认，减少误报
+
+使用方式：
+  python dataset_dedup.py
+  python dataset_dedup.py --dataset-dir datasets --threshold 4 --workers 16
+  python dataset_dedup.py --output-dir datasets_dedup    # 写出去重后的数据集
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+# 支持的图像格式
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.webp'}
+
+# 默认哈希索引文件名（位于数据集目录）
+HASH_INDEX_NAME = '.image_hashes.sqlite'
+
+# 默认报告文件名（位于数据集目录）
+REPORT_NAME = 'dedup_report.json'
+
+# 去重时保留的优先级：近重复组跨划分时保留评估划分中的图片，删除训练集中的副本
+SPLIT_PRIORITY = ('test', 'valid', 'val', 'train')
+
+# 每个子任务包含的图片数
+HASH_CHUNK_SIZE = 64
+
+# pHash 使用的 DCT 尺寸
+_DCT_SIZE = 32
+
+
+def _dct_matrix(n):
+    """正交 DCT-II 矩阵"""
+    k = np.arange(n)[:, None]
+    matrix = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+
+_BIT_WEIGHTS = (1 << np.arange(63, -1, -1, dtype=np.uint64)).astype(np.uint64)
+
+
+def _pack_bits(bits):
+    """64 个布尔值 -> uint64"""
+    return int(np.bitwise_or.reduce(_BIT_WEIGHTS[bits.ravel()]) if bits.any() else 0)
+
+
+def image_hashes(path):
+    """
+    计算一张图片的 dHash 和 pHash
+
+    Args:
+        path: 图片路径
+
+    Returns:
+        (dhash, phash) 两个 64 位无符号整数
+    """
+    from PIL import Image
+
+    with Image.open(path) as img:
+        # JPEG 直接按 1/2 ~ 1/8 缩小解码，大幅减少解码时间
+        img.draft('L', (_DCT_SIZE * 2, _DCT_SIZE * 2))
+        gray = img.convert('L')
+        small = np.asarray(gray.resize((9, 8), Image.BILINEAR), dtype=np.float32)
+        large = np.asarray(gray.resize((_DCT_SIZE, _DCT_SIZE), Image.BILINEAR), dtype=np.float32)
+
+    # dHash：相邻像素的亮度梯度方向
+    dhash = _pack_bits(small[:, 1:] > small[:, :-1])
+
+    # pHash：低频 DCT 系数与中值比较（不含直流分量）
+    coeffs = (_DCT @ large @ _DCT.T)[:8, :8].ravel()
+    phash = _pack_bits(coeffs > np.median(coeffs[1:]))
+    return dhash, phash
+
+
+def _hash_chunk(paths):
+    results = []
+    for path in paths:
+        try:
+            results.append(image_hashes(path))
+        except Exception:
+            results.append(None)
+    return results
+
+
+def _to_signed(value):
+    # SQLite INTEGER 为有符号 64 位
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class ImageHashIndex:
+    """按 (路径, 修改时间, 文件大小) 缓存感知哈希的 SQLite 索引"""
+
+    def __init__(self, db_path):
+        """
+        Args:
+            db_path: SQLite 文件路径，不存在时自动创建
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=60)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS hashes ('
+            'path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, dhash INTEGER, phash INTEGER)'
+        )
+
+    def hashes(self, paths, workers=8):
+        """
+        获取图片哈希，缓存失效的图片并行计算并写入索引
+
+        Args:
+            paths: 图片路径列表
+            workers: 进程数
+
+        Returns:
+            (dhash, phash, ok)：两个 (N,) uint64 数组和 (N,) 布尔数组（无法读取的图片为 False）
+        """
+        cached = {path: (mtime_ns, size, dhash, phash) for path, mtime_ns, size, dhash, phash
+                  in self._conn.execute('SELECT * FROM hashes')}
+
+        keys = [os.path.abspath(path) for path in paths]
+        states = []
+        results = [None] * len(keys)
+        stale = []
+        for i, key in enumerate(keys):
+            st = os.stat(key)
+            states.append((st.st_mtime_ns, st.st_size))
+            entry = cached.get(key)
+            if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                results[i] = (entry[2] & 0xFFFFFFFFFFFFFFFF, entry[3] & 0xFFFFFFFFFFFFFFFF)
+            else:
+                stale.append(i)
+
+        print(f"🔑 哈希索引: 复用 {len(keys) - len(stale)} 张, 计算 {len(stale)} 张 ({self.db_path})")
+        if stale:
+            chunks = [stale[i:i + HASH_CHUNK_SIZE] for i in range(0, len(stale), HASH_CHUNK_SIZE)]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for chunk, hashes in zip(chunks, executor.map(_hash_chunk,
+                                                              [[keys[i] for i in c] for c in chunks])):
+                    rows = []
+                    for i, value in zip(chunk, hashes):
+                        results[i] = value
+                        if value is not None:
+                            rows.append((keys[i], *states[i], _to_signed(value[0]), _to_signed(value[1])))
+                    with self._conn:
+                        self._conn.executemany('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)', rows)
+
+        ok = np.array([r is not None for r in results], dtype=bool)
+        dhash = np.array([r[0] if r else 0 for r in results], dtype=np.uint64)
+        phash = np.array([r[1] if r else 0 for r in results], dtype=np.uint64)
+        return dhash, phash, ok
+
+    def close(self):
+        self._conn.close()
+
+
+def _popcount(values):
+    """uint64 数组逐元素的 1 的个数"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    table = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+    return table[values.view(np.uint8)].reshape(*values.shape, 8).sum(axis=-1)
+
+
+def _chunk_ranges(threshold, bits=64):
+    """把 64 位切成 threshold+1 段 [(起始位, 位数)]"""
+    parts = threshold + 1
+    widths = [bits // parts + (1 if i < bits % parts else 0) for i in range(parts)]
+    starts = np.cumsum([0] + widths[:-1])
+    return list(zip(starts.tolist(), widths))
+
+
+def find_near_duplicates(hashes, threshold=4, confirm=None, confirm_threshold=None,
+                         max_elements=1 << 24):
+    """
+    多索引哈希查找汉明距离不超过 threshold 的图片
+
+    哈希完全相同的图片先合并，只在不同的哈希值之间查找；返回的图片对足以把
+    近重复图片连成组（用于并查集），不是全部两两组合
+
+    Args:
+        hashes: (N,) uint64 哈希
+        threshold: 汉明距离阈值
+        confirm: 可选 (N,) uint64 第二种哈希，用于确认候选对
+        confirm_threshold: 第二种哈希的阈值
+        max_elements: 桶内分块比较时每块的最大元素数，控制内存
+
+    Returns:
+        (M, 2) int64 图片对 (i < j)
+    """
+    unique, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    same = np.flatnonzero(first[inverse] != np.arange(len(hashes)))
+    pairs = [np.stack([first[inverse[same]], same], axis=1)]
+
+    for start, width in _chunk_ranges(threshold):
+        keys = (unique >> np.uint64(64 - start - width)) & np.uint64((1 << width) - 1)
+        order = np.argsort(keys, kind='stable')
+        bounds = np.flatnonzero(np.diff(keys[order])) + 1
+        for members in np.split(order, bounds):
+            if len(members) < 2:
+                continue
+            values = unique[members]
+            rows = max(1, max_elements // len(members))
+            for row in range(0, len(members) - 1, rows):
+                dist = _popcount(values[row:row + rows, None] ^ values[None, :])
+                i, j = np.nonzero(dist <= threshold)
+                i += row
+                keep = i < j
+                pairs.append(np.stack([first[members[i[keep]]], first[members[j[keep]]]], axis=1))
+
+    pairs = np.concatenate(pairs).astype(np.int64).reshape(-1, 2)
+    pairs = np.unique(np.sort(pairs, axis=1), axis=0)
+    if confirm is not None and confirm_threshold is not None and len(pairs):
+        dist = _popcount(confirm[pairs[:, 0]] ^ confirm[pairs[:, 1]])
+        pairs = pairs[dist <= confirm_threshold]
+    return pairs
+
+
+def _clusters(num_items, pairs):
+    """并查集：返回每个元素的组编号（组内最小下标）"""
+    parent = np.arange(num_items)
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in pairs.tolist():
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    return np.array([find(x) for x in range(num_items)])
+
+
+def _list_split_images(dataset_dir, splits):
+    """[(划分, 图片路径)]"""
+    items = []
+    for split in splits:
+        images_dir = os.path.join(dataset_dir, split, 'images')
+        if not os.path.isdir(images_dir):
+            continue
+        with os.scandir(images_dir) as entries:
+            paths = sorted(e.path for e in entries
+                           if e.is_file() and os.path.splitext(e.name)[1].lower() in IMAGE_EXTENSIONS)
+        items.extend((split, path) for path in paths)
+    return items
+
+
+def _split_rank(split):
+    return SPLIT_PRIORITY.index(split) if split in SPLIT_PRIORITY else len(SPLIT_PRIORITY)
+
+
+def detect_duplicates(dataset_dir='datasets', splits=('train', 'valid', 'test'), threshold=4,
+                      phash_threshold=10, workers=8, index_path=None):
+    """
+    检测近重复图片和跨划分泄漏
+
+    Args:
+        dataset_dir: 数据集目录
+        splits: 检查的划分
+        threshold: dHash 汉明距离阈值
+        phash_threshold: pHash 确认阈值，None 表示不确认
+        workers: 计算哈希的进程数
+        index_path: 哈希索引路径，默认 <dataset_dir>/.image_hashes.sqlite
+
+    Returns:
+        报告字典，groups 为近重复组，每组第一张为去重时保留的图片
+    """
+    items = _list_split_images(dataset_dir, splits)
+    index = ImageHashIndex(index_path or os.path.join(dataset_dir, HASH_INDEX_NAME))
+    dhash, phash, ok = index.hashes([path for _, path in items], workers)
+    index.close()
+
+    valid = np.flatnonzero(ok)
+    pairs = valid[find_near_duplicates(dhash[valid], threshold, phash[valid], phash_threshold)]
+
+    roots = _clusters(len(items), pairs)
+    groups = {}
+    for i in np.unique(pairs.ravel()).tolist():
+        groups.setdefault(int(roots[i]), []).append(i)
+    print(f"🔍 {len(items)} 张图片中找到 {len(groups)} 组近重复 (dHash <= {threshold}"
+          f"{f', pHash <= {phash_threshold}' if phash_threshold is not None else ''})")
+
+    report_groups = []
+    within = {split: 0 for split in splits}
+    leakage = {}
+    for members in groups.values():
+        # 评估划分优先，同一划分内按路径排序
+        members = sorted(members, key=lambda i: (_split_rank(items[i][0]), items[i][1]))
+        member_splits = [items[i][0] for i in members]
+        report_groups.append([{'split': items[i][0], 'path': items[i][1]} for i in members])
+        for split in set(member_splits):
+            within[split] += member_splits.count(split) - 1
+        # 泄漏：评估划分 a 中有多少张图片在划分 b 中有近重复
+        present = sorted(set(member_splits), key=_split_rank)
+        for a_index, a in enumerate(present):
+            for b in present[a_index + 1:]:
+                key = f"{a}/{b}"
+                leakage[key] = leakage.get(key, 0) + member_splits.count(a)
+
+    report_groups.sort(key=lambda g: (-len(g), g[0]['path']))
+    return {
+        'images': len(items),
+        'unreadable': [items[i][1] for i in np.flatnonzero(~ok)],
+        'threshold': threshold,
+        'phash_threshold': phash_threshold,
+        'duplicates_within_split': within,
+        'leakage': leakage,
+        'groups': report_groups,
+    }
+
+
+def _link_or_copy(src, dst):
+    if os.path.exists(dst):
+        return
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def write_deduplicated(report, dataset_dir, output_dir):
+    """
+    写出去重后的数据集（硬链接，跨文件系统时复制）：每个近重复组只保留第一张图片
+
+    Args:
+        report: detect_duplicates 的返回值
+        dataset_dir: 原数据集目录
+        output_dir: 输出目录
+
+    Returns:
+        删除的图片数
+    """
+    dropped = {member['path'] for group in report['groups'] for member in group[1:]}
+    splits = sorted({m['split'] for g in report['groups'] for m in g} | set(report['duplicates_within_split']))
+
+    for split, path in _list_split_images(dataset_dir, splits):
+        if path in dropped:
+            continue
+        stem = os.path.splitext(os.path.basename(path))[0]
+        for kind, src in (('images', path),
+                          ('labels', os.path.join(dataset_dir, split, 'labels', f"{stem}.txt"))):
+            if not os.path.exists(src):
+                continue
+            dst_dir = os.path.join(output_dir, split, kind)
+            os.makedirs(dst_dir, exist_ok=True)
+            _link_or_copy(src, os.path.join(dst_dir, os.path.basename(src)))
+
+    data_yaml = os.path.join(dataset_dir, 'data.yaml')
+    if os.path.exists(data_yaml) and not os.path.exists(os.path.join(output_dir, 'data.yaml')):
+        shutil.copy2(data_yaml, os.path.join(output_dir, 'data.yaml'))
+
+    print(f"✅ 去重后的数据集: {output_dir} (删除 {len(dropped)} 张图片)")
+    return len(dropped)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='近重复图片与划分泄漏检测')
+    parser.add_argument('--dataset-dir', type=str, default='datasets',
+                        help='数据集目录 (默认: datasets)')
+    parser.add_argument('--splits', type=str, nargs='+', default=['train', 'valid', 'test'],
+                        help='检查的数据划分 (默认: train valid test)')
+    parser.add_argument('--threshold', type=int, default=4,
+                        help='dHash 汉明距离阈值 (默认: 4)')
+    parser.add_argument('--phash-threshold', type=int, default=10,
+                        help='pHash 确认阈值，负数表示不确认 (默认: 10)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 8,
+                        help='计算哈希的进程数 (默认: CPU 核数)')
+    parser.add_argument('--index', type=str, default=None,
+                        help=f'哈希索引文件 (默认: <dataset-dir>/{HASH_INDEX_NAME})')
+    parser.add_argument('--report', type=str, default=None,
+                        help=f'报告文件 (默认: <dataset-dir>/{REPORT_NAME})')
+    parser.add_argument('--output-dir', type=str, default=None,
+                        help='写出去重后的数据集到该目录')
+    args = parser.parse_args()
+
+    report = detect_duplicates(args.dataset_dir, args.splits, args.threshold,
+                               args.phash_threshold if args.phash_threshold >= 0 else None,
+                               args.workers, args.index)
+
+    print("\n" + "=" * 60)
+    print("📊 近重复检测结果")
+    print("=" * 60)
+    print(f"  近重复组: {len(report['groups'])}")
+    for split, count in report['duplicates_within_split'].items():
+        print(f"  {split:<8} 内部重复: {count} 张")
+    if report['leakage']:
+        print("\n⚠️  跨划分泄漏:")
+        for key, count in report['leakage'].items():
+            a, b = key.split('/')
+            print(f"  {a} 中有 {count} 张图片在 {b} 中有近重复")
+        for group in [g for g in report['groups'] if len({m['split'] for m in g}) > 1][:5]:
+            print("   - " + " | ".join(f"{m['split']}/{os.path.basename(m['path'])}" for m in group[:4]))
+    else:
+        print("\n✅ 未发现跨划分泄漏")
+    if report['unreadable']:
+        print(f"\n⚠️  无法读取 {len(report['unreadable'])} 张图片, 例如: {report['unreadable'][0]}")
+
+    report_path = args.report or os.path.join(args.dataset_dir, REPORT_NAME)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 报告已保存: {report_path}")
+
+    if args.output_dir:
+        write_deduplicated(report, args.dataset_dir, args.output_dir)
+
+
+if __name__ == '__main__':
+    main()
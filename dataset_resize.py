@@ -0,0 +1,276 @@
+"""
+数据集离线缩放
+把 datasets/{train,valid,test} 的图片缩放到训练分辨率（长边 = imgsz）写到新目录，
+标签为归一化坐标，原样复制（硬链接）
+
+- 训练时不再每个 epoch 解码 1080p / 4K 原图，cache='ram' 占用的内存也按比例减少
+- JPEG 按缩小尺寸解码（PIL draft），并按 EXIF 方向旋转，与训练时读取的图像一致
+- 并行处理；输出文件的修改时间与源文件一致，重复运行只处理新增或变化的文件，
+  并删除源中已不存在的文件；缩放参数变化时全部重新生成
+
+使用方式：
+  python dataset_resize.py                                   # datasets -> datasets_640
+  python dataset_resize.py --imgsz 960 --format jpg --quality 90
+  python train.py --config t4_standard --resized             # 训练时使用缩放后的数据集
+"""
+
+import argparse
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
+
+
+# 支持的图像格式
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.webp'}
+
+# 输出格式
+OUTPUT_FORMATS = {'jpg': '.jpg', 'png': '.png', 'webp': '.webp'}
+
+# 缩放参数记录（位于输出目录）
+CONFIG_NAME = '.resize_config.json'
+
+# 每个子任务包含的图片数
+CHUNK_SIZE = 32
+
+
+def resized_dir(dataset_dir, imgsz):
+    """默认输出目录：datasets -> datasets_640"""
+    return f"{os.path.normpath(dataset_dir)}_{imgsz}"
+
+
+def _up_to_date(src, dst):
+    try:
+        return os.stat(dst).st_mtime_ns == os.stat(src).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def _link_or_copy(src, dst):
+    tmp_path = f"{dst}.tmp"
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copy2(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+
+def resize_image(src, dst, imgsz, quality=95):
+    """
+    缩放一张图片，长边不超过 imgsz（不放大）
+
+    Args:
+        src: 源图片
+        dst: 输出路径，扩展名决定格式
+        imgsz: 长边尺寸
+        quality: JPEG / WebP 质量
+
+    Returns:
+        True 表示重新编码，False 表示源图片无需缩放且格式相同，直接链接
+    """
+    from PIL import Image, ImageOps
+
+    ext = os.path.splitext(dst)[1].lower()
+    with Image.open(src) as img:
+        transposed = img.getexif().get(0x0112, 1) != 1
+        if (max(img.size) <= imgsz and not transposed
+                and os.path.splitext(src)[1].lower() == ext):
+            _link_or_copy(src, dst)
+            return False
+
+        # JPEG 直接按 1/2 ~ 1/8 缩小解码
+        img.draft(img.mode, (imgsz, imgsz))
+        image = ImageOps.exif_transpose(img)
+        image.thumbnail((imgsz, imgsz), Image.LANCZOS)
+
+    fmt = Image.registered_extensions().get(ext)
+    if fmt in ('JPEG', 'WEBP') and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    tmp_path = f"{dst}.tmp"
+    image.save(tmp_path, format=fmt, quality=quality)
+    os.replace(tmp_path, dst)
+    return True
+
+
+def _resize_chunk(jobs, imgsz, quality):
+    """[(源, 输出)] -> (重新编码数, 链接数, [失败的源])"""
+    encoded = linked = 0
+    failed = []
+    for src, dst in jobs:
+        try:
+            if resize_image(src, dst, imgsz, quality):
+                encoded += 1
+            else:
+                linked += 1
+            st = os.stat(src)
+            os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+        except Exception as e:
+            print(f"⚠️  无法处理 {src}: {e}")
+            failed.append(src)
+    return encoded, linked, failed
+
+
+def _sync_dir(expected, out_dir):
+    """删除输出目录中源已不存在的文件"""
+    removed = 0
+    if not os.path.isdir(out_dir):
+        return removed
+    with os.scandir(out_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name not in expected:
+                os.remove(entry.path)
+                removed += 1
+    return removed
+
+
+def _write_data_yaml(dataset_dir, output_dir, data_yaml=None):
+    """复制 data.yaml，path 指向输出目录，划分路径改为输出目录下的相对路径"""
+    data_yaml = data_yaml or os.path.join(dataset_dir, 'data.yaml')
+    if not os.path.exists(data_yaml):
+        return None
+    with open(data_yaml, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+
+    config['path'] = os.path.abspath(output_dir)
+    for key in ('train', 'val', 'test'):
+        value = config.get(key)
+        if not isinstance(value, str):
+            continue
+        relative = value
+        while relative.startswith('../'):
+            relative = relative[3:]
+        if os.path.isdir(os.path.join(output_dir, relative)):
+            config[key] = relative
+
+    yaml_path = os.path.join(output_dir, 'data.yaml')
+    tmp_path = f"{yaml_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False)
+    os.replace(tmp_path, yaml_path)
+    return yaml_path
+
+
+def resize_dataset(dataset_dir='datasets', output_dir=None, imgsz=640, splits=('train', 'valid', 'test'),
+                   quality=95, fmt=None, workers=None, data_yaml=None):
+    """
+    生成缩放后的数据集副本
+
+    Args:
+        dataset_dir: 源数据集目录
+        output_dir: 输出目录，默认 <dataset_dir>_<imgsz>
+        imgsz: 长边尺寸
+        splits: 处理的划分，不存在的划分跳过
+        quality: JPEG / WebP 质量
+        fmt: 输出格式 'jpg' / 'png' / 'webp'，None 表示保持原格式
+        workers: 进程数，默认 CPU 核数
+        data_yaml: 源数据集配置文件，默认 <dataset_dir>/data.yaml
+
+    Returns:
+        输出目录中 data.yaml 的路径（源数据集没有 data.yaml 时为 None）
+    """
+    output_dir = output_dir or resized_dir(dataset_dir, imgsz)
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 缩放参数变化时全部重新生成
+    params = {'imgsz': imgsz, 'quality': quality, 'format': fmt}
+    config_path = os.path.join(output_dir, CONFIG_NAME)
+    previous = None
+    if os.path.exists(config_path):
+        with open(config_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+    force = previous != params
+
+    jobs = []
+    totals = {'encoded': 0, 'linked': 0, 'skipped': 0, 'labels': 0, 'removed': 0}
+    failed = []
+    for split in splits:
+        images_dir = os.path.join(dataset_dir, split, 'images')
+        if not os.path.isdir(images_dir):
+            continue
+        labels_dir = os.path.join(dataset_dir, split, 'labels')
+        out_images = os.path.join(output_dir, split, 'images')
+        out_labels = os.path.join(output_dir, split, 'labels')
+        os.makedirs(out_images, exist_ok=True)
+        os.makedirs(out_labels, exist_ok=True)
+
+        expected_images = set()
+        with os.scandir(images_dir) as entries:
+            for entry in entries:
+                stem, ext = os.path.splitext(entry.name)
+                if not entry.is_file() or ext.lower() not in IMAGE_EXTENSIONS:
+                    continue
+                name = stem + (OUTPUT_FORMATS[fmt] if fmt else ext)
+                expected_images.add(name)
+                dst = os.path.join(out_images, name)
+                if not force and _up_to_date(entry.path, dst):
+                    totals['skipped'] += 1
+                else:
+                    jobs.append((entry.path, dst))
+
+        # 标签为归一化坐标，直接链接
+        expected_labels = set()
+        if os.path.isdir(labels_dir):
+            with os.scandir(labels_dir) as entries:
+                for entry in entries:
+                    if not entry.is_file() or not entry.name.endswith('.txt'):
+                        continue
+                    expected_labels.add(entry.name)
+                    dst = os.path.join(out_labels, entry.name)
+                    if not _up_to_date(entry.path, dst):
+                        _link_or_copy(entry.path, dst)
+                        totals['labels'] += 1
+
+        totals['removed'] += _sync_dir(expected_images, out_images) + _sync_dir(expected_labels, out_labels)
+
+    print(f"🔄 缩放到 {imgsz}: {len(jobs)} 张待处理, {totals['skipped']} 张未变化 -> {output_dir}")
+    if jobs:
+        chunks = [jobs[i:i + CHUNK_SIZE] for i in range(0, len(jobs), CHUNK_SIZE)]
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            futures = [executor.submit(_resize_chunk, chunk, imgsz, quality) for chunk in chunks]
+            for done, future in enumerate(futures, 1):
+                encoded, linked, chunk_failed = future.result()
+                totals['encoded'] += encoded
+                totals['linked'] += linked
+                failed.extend(chunk_failed)
+                if done % 50 == 0 or done == len(futures):
+                    print(f"  进度: {min(done * CHUNK_SIZE, len(jobs))}/{len(jobs)}")
+
+    # 全部处理完才记录参数，中断后下次继续
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump(params, f)
+
+    yaml_path = _write_data_yaml(dataset_dir, output_dir, data_yaml)
+    print(f"✅ 缩放完成: 重新编码 {totals['encoded']}, 直接链接 {totals['linked']}, "
+          f"未变化 {totals['skipped']}, 标签更新 {totals['labels']}, 删除 {totals['removed']}"
+          + (f", 失败 {len(failed)}" if failed else ""))
+    return yaml_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据集离线缩放到训练分辨率')
+    parser.add_argument('--dataset-dir', type=str, default='datasets',
+                        help='源数据集目录 (默认: datasets)')
+    parser.add_argument('--output-dir', type=str, default=None,
+                        help='输出目录 (默认: <dataset-dir>_<imgsz>)')
+    parser.add_argument('--imgsz', type=int, default=640,
+                        help='长边尺寸 (默认: 640)')
+    parser.add_argument('--splits', type=str, nargs='+', default=['train', 'valid', 'test'],
+                        help='处理的数据划分 (默认: train valid test)')
+    parser.add_argument('--quality', type=int, default=95,
+                        help='JPEG / WebP 质量 (默认: 95)')
+    parser.add_argument('--format', type=str, choices=list(OUTPUT_FORMATS), default=None,
+                        help='输出格式 (默认: 保持原格式)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='进程数 (默认: CPU 核数)')
+    args = parser.parse_args()
+
+    yaml_path = resize_dataset(args.dataset_dir, args.output_dir, args.imgsz, args.splits,
+                               args.quality, args.format, args.workers)
+    if yaml_path:
+        print(f"📄 数据集配置: {yaml_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+"""
+数据集分片打包
+把 datasets/<split> 中大量的小图片和标签文件打包成少量大文件：
+
+    <output>/<split>/shard_00000.bin   拼接的原始图片字节（不重新编码）
+    <output>/<split>/index.npz         文件名、所在分片、偏移、长度、图片尺寸、标签偏移和全部框
+
+读取时用 mmap 打开分片，按偏移零拷贝访问任意一张图片；训练 / 评估时每个 epoch 只读取少量大文件，
+不再有数十万次文件打开和元数据查询。输出目录中的 data.yaml 带 shards: true，
+train.py / test_yolo.py / export_benchmark.py 据此使用 shard_training 中的数据集类
+
+使用方式：
+  python dataset_shards.py                                    # datasets -> datasets_packed
+  python dataset_shards.py --dataset-dir datasets_640 --output-dir datasets_640_packed --shard-size 2048
+  python train.py --config t4_standard --data datasets_packed/data.yaml
+"""
+
+import argparse
+import io
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import yaml
+
+from label_cache import LabelCache
+
+
+# 支持的图像格式
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.webp'}
+
+INDEX_NAME = 'index.npz'
+
+INDEX_VERSION = 1
+
+# 默认每个分片的大小 (MB)
+DEFAULT_SHARD_SIZE_MB = 1024
+
+# 需要交换宽高的 EXIF 方向
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def is_shard_dir(path):
+    """目录中是否有分片索引"""
+    return isinstance(path, str) and os.path.isfile(os.path.join(path, INDEX_NAME))
+
+
+def is_sharded(data_yaml):
+    """数据集配置是否指向打包后的分片"""
+    try:
+        with open(data_yaml, 'r', encoding='utf-8') as f:
+            return bool((yaml.safe_load(f) or {}).get('shards'))
+    except (OSError, yaml.YAMLError):
+        return False
+
+
+def _read_image(path):
+    """读取图片字节和 EXIF 方向修正后的 (高, 宽)"""
+    from PIL import Image
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            width, height = img.size
+            if img.getexif().get(0x0112, 1) in _TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+    except Exception:
+        return None
+    return data, (height, width)
+
+
+class ShardWriter:
+    """按顺序把图片字节写入分片文件"""
+
+    def __init__(self, out_dir, shard_bytes):
+        self.out_dir = out_dir
+        self.shard_bytes = shard_bytes
+        self.shard = -1
+        self.position = 0
+        self._file = None
+
+    def _next_shard(self):
+        if self._file:
+            self._file.close()
+        self.shard += 1
+        self.position = 0
+        self._file = open(os.path.join(self.out_dir, f"shard_{self.shard:05d}.bin"), 'wb')
+
+    def write(self, data):
+        """写入一张图片，返回 (分片编号, 偏移)"""
+        if self._file is None or (self.position and self.position + len(data) > self.shard_bytes):
+            self._next_shard()
+        offset = self.position
+        self._file.write(data)
+        self.position += len(data)
+        return self.shard, offset
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def pack_split(split_dir, out_dir, shard_size_mb=DEFAULT_SHARD_SIZE_MB, workers=16):
+    """
+    打包一个划分
+
+    Args:
+        split_dir: 划分目录（包含 images/ 和 labels/）
+        out_dir: 输出目录
+        shard_size_mb: 每个分片的大小 (MB)
+        workers: 读取图片的线程数
+
+    Returns:
+        打包的图片数
+    """
+    images_dir = os.path.join(split_dir, 'images')
+    with os.scandir(images_dir) as entries:
+        paths = sorted(e.path for e in entries
+                       if e.is_file() and os.path.splitext(e.name)[1].lower() in IMAGE_EXTENSIONS)
+    labels = LabelCache.load(os.path.join(split_dir, 'labels'), workers=workers, verbose=False)
+
+    os.makedirs(out_dir, exist_ok=True)
+    # 先删除旧索引，打包中断时目录不会被当成完整的分片
+    if os.path.exists(os.path.join(out_dir, INDEX_NAME)):
+        os.remove(os.path.join(out_dir, INDEX_NAME))
+    for name in os.listdir(out_dir):
+        if name.startswith('shard_') and name.endswith('.bin'):
+            os.remove(os.path.join(out_dir, name))
+
+    names, shards, offsets, lengths, shapes, boxes = [], [], [], [], [], []
+    skipped = 0
+    writer = ShardWriter(out_dir, shard_size_mb << 20)
+
+    def write(path, result):
+        nonlocal skipped
+        if result is None:
+            print(f"⚠️  无法读取图片，跳过: {path}")
+            skipped += 1
+            return
+        data, shape = result
+        shard, offset = writer.write(data)
+        name = os.path.basename(path)
+        names.append(name)
+        shards.append(shard)
+        offsets.append(offset)
+        lengths.append(len(data))
+        shapes.append(shape)
+        boxes.append(labels.get(os.path.splitext(name)[0]))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # 按顺序写入，同时最多预读 workers * 4 张
+        pending = deque()
+        for path in paths:
+            pending.append((path, executor.submit(_read_image, path)))
+            if len(pending) >= workers * 4:
+                path, future = pending.popleft()
+                write(path, future.result())
+        for path, future in pending:
+            write(path, future.result())
+    writer.close()
+
+    counts = np.array([len(b) for b in boxes], dtype=np.int64)
+    label_offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum(counts, out=label_offsets[1:])
+
+    tmp_path = os.path.join(out_dir, f"{INDEX_NAME}.tmp.npz")
+    np.savez(
+        tmp_path,
+        version=np.int64(INDEX_VERSION),
+        names=np.array(names, dtype=str),
+        shards=np.array(shards, dtype=np.int32),
+        offsets=np.array(offsets, dtype=np.int64),
+        lengths=np.array(lengths, dtype=np.int64),
+        shapes=np.array(shapes, dtype=np.int32).reshape(-1, 2),
+        label_offsets=label_offsets,
+        boxes=np.concatenate(boxes).astype(np.float32) if boxes else np.zeros((0, 5), dtype=np.float32),
+    )
+    os.replace(tmp_path, os.path.join(out_dir, INDEX_NAME))
+
+    size_gb = (sum(lengths) or 0) / (1 << 30)
+    print(f"✅ {split_dir} -> {out_dir}: {len(names)} 张图片, {writer.shard + 1} 个分片, "
+          f"{size_gb:.2f} GB" + (f", 跳过 {skipped} 张无法读取的图片" if skipped else ""))
+    return len(names)
+
+
+def pack_dataset(dataset_dir='datasets', output_dir=None, splits=('train', 'valid', 'test'),
+                 shard_size_mb=DEFAULT_SHARD_SIZE_MB, workers=16, data_yaml=None):
+    """
+    打包数据集的各个划分，并写出指向分片的 data.yaml
+
+    Args:
+        dataset_dir: 源数据集目录
+        output_dir: 输出目录，默认 <dataset_dir>_packed
+        splits: 打包的划分，不存在的划分跳过
+        shard_size_mb: 每个分片的大小 (MB)
+        workers: 读取图片的线程数
+        data_yaml: 源数据集配置文件，默认 <dataset_dir>/data.yaml
+
+    Returns:
+        输出目录中 data.yaml 的路径
+    """
+    output_dir = output_dir or f"{os.path.normpath(dataset_dir)}_packed"
+    data_yaml = data_yaml or os.path.join(dataset_dir, 'data.yaml')
+    with open(data_yaml, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+
+    packed = []
+    for split in splits:
+        if os.path.isdir(os.path.join(dataset_dir, split, 'images')):
+            pack_split(os.path.join(dataset_dir, split), os.path.join(output_dir, split),
+                       shard_size_mb, workers)
+            packed.append(split)
+
+    # 划分路径改为分片目录
+    config['path'] = os.path.abspath(output_dir)
+    config['shards'] = True
+    for key in ('train', 'val', 'test'):
+        value = config.get(key)
+        if not isinstance(value, str):
+            continue
+        split = next((s for s in packed if f"{s}/" in f"{value.strip('/')}/"), None)
+        if split:
+            config[key] = split
+        else:
+            config.pop(key)
+
+    yaml_path = os.path.join(output_dir, 'data.yaml')
+    with open(yaml_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False)
+    print(f"📄 数据集配置: {yaml_path}")
+    return yaml_path
+
+
+class ShardReader:
+    """用 mmap 零拷贝读取打包后的划分"""
+
+    def __init__(self, shard_dir):
+        """
+        Args:
+            shard_dir: 打包后的划分目录
+        """
+        self.shard_dir = os.path.abspath(shard_dir)
+        with np.load(os.path.join(self.shard_dir, INDEX_NAME), allow_pickle=False) as index:
+            if int(index['version']) != INDEX_VERSION:
+                raise ValueError(f"不支持的分片索引版本: {self.shard_dir}")
+            self.names = index['names'].tolist()
+            self.shards = index['shards']
+            self.offsets = index['offsets']
+            self.lengths = index['lengths']
+            self.shapes = index['shapes']
+            self.label_offsets = index['label_offsets']
+            self.boxes = index['boxes']
+        self._positions = {name: i for i, name in enumerate(self.names)}
+        self._maps = {}
+
+    def __getstate__(self):
+        # 传给子进程时只携带目录，子进程各自读取索引并打开 mmap
+        return {'shard_dir': self.shard_dir}
+
+    def __setstate__(self, state):
+        loaded = _OPENED.get(state['shard_dir'])
+        if loaded is None:
+            loaded = _OPENED[state['shard_dir']] = ShardReader(state['shard_dir'])
+        self.__dict__ = loaded.__dict__
+
+    def __len__(self):
+        return len(self.names)
+
+    def find(self, name):
+        """文件名 -> 下标，不存在时返回 None"""
+        return self._positions.get(name)
+
+    def path(self, i):
+        """第 i 张图片的虚拟路径（分片目录/文件名），用作数据集中的图片标识"""
+        return os.path.join(self.shard_dir, self.names[i])
+
+    def _map(self, shard):
+        m = self._maps.get(shard)
+        if m is None:
+            with open(os.path.join(self.shard_dir, f"shard_{shard:05d}.bin"), 'rb') as f:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[shard] = m
+        return m
+
+    def read(self, i):
+        """第 i 张图片的编码字节 (memoryview，不复制)"""
+        offset = int(self.offsets[i])
+        return memoryview(self._map(int(self.shards[i])))[offset:offset + int(self.lengths[i])]
+
+    def decode(self, i, flags=None):
+        """解码第 i 张图片为 BGR 数组（与 cv2.imread 一致）"""
+        import cv2
+
+        data = np.frombuffer(self.read(i), dtype=np.uint8)
+        return cv2.imdecode(data, cv2.IMREAD_COLOR if flags is None else flags)
+
+    def labels(self, i):
+        """第 i 张图片的框 (N, 5) float32"""
+        return self.boxes[self.label_offsets[i]:self.label_offsets[i + 1]]
+
+    def close(self):
+        for m in self._maps.values():
+            m.close()
+        self._maps = {}
+
+
+# 子进程中已打开的分片
+_OPENED = {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把数据集打包为内存映射分片')
+    parser.add_argument('--dataset-dir', type=str, default='datasets',
+                        help='源数据集目录 (默认: datasets)')
+    parser.add_argument('--output-dir', type=str, default=None,
+                        help='输出目录 (默认: <dataset-dir>_packed)')
+    parser.add_argument('--data', type=str, default=None,
+                        help='数据集配置文件 (默认: <dataset-dir>/data.yaml)')
+    parser.add_argument('--splits', type=str, nargs='+', default=['train', 'valid', 'test'],
+                        help='打包的数据划分 (默认: train valid test)')
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE_MB,
+                        help=f'每个分片的大小 MB (默认: {DEFAULT_SHARD_SIZE_MB})')
+    parser.add_argument('--workers', type=int, default=16,
+                        help='读取图片的线程数 (默认: 16)')
+    args = parser.parse_args()
+
+    pack_dataset(args.dataset_dir, args.output_dir, args.splits, args.shard_size, args.workers, args.data)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,382 @@
+"""
+数据集统计与健康检查
+统计 datasets/{train,valid,test} 的类别实例数、框尺寸 / 长宽比分布、每图框数分布，
+并检查空标签、缺失 / 孤立标签、越界类别编号、退化框和越界框
+
+- 标签通过 label_cache 解析（只重新解析变化的文件），图像尺寸通过 image_size 读取文件头并缓存
+- 报告缓存在 <dataset-dir>/.dataset_report.json，未变化的划分直接复用，变化的划分重新统计
+- 框尺寸按训练分辨率换算为像素（letterbox 到 imgsz 后的大小），用于判断小目标（如人头）
+
+使用方式：
+  python dataset_stats.py
+  python dataset_stats.py --dataset-dir datasets --splits train valid --imgsz 640
+  python dataset_stats.py --refresh --workers 16
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import yaml
+
+from image_size import SIZE_CACHE_NAME, ImageSizeCache
+from label_cache import LabelCache
+
+
+# 支持的图像格式
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.webp'}
+
+# 默认报告文件名（位于数据集目录）
+REPORT_NAME = '.dataset_report.json'
+
+REPORT_VERSION = 1
+
+# 框尺寸分桶：sqrt(宽 x 高)，训练分辨率下的像素
+SIZE_BINS = [0, 4, 8, 16, 32, 64, 128, 256, np.inf]
+
+# 长宽比分桶：宽 / 高（像素）
+ASPECT_BINS = [0, 0.25, 0.5, 1, 2, 4, np.inf]
+
+# 每图框数分桶
+COUNT_BINS = [0, 1, 2, 6, 11, 21, 51, 101, np.inf]
+
+# 越界容差（归一化坐标）
+BOUNDS_TOLERANCE = 1e-3
+
+# 每类问题最多记录的示例文件数
+MAX_EXAMPLES = 10
+
+
+def _bin_labels(edges, integer=False):
+    """分桶名称，如 '8-16'、'>=256'"""
+    labels = []
+    for low, high in zip(edges[:-1], edges[1:]):
+        if integer:
+            high_label = f"{int(high) - 1}" if np.isfinite(high) else None
+            if high_label is None:
+                labels.append(f">={int(low)}")
+            else:
+                labels.append(f"{int(low)}" if int(low) == int(high) - 1 else f"{int(low)}-{high_label}")
+        else:
+            labels.append(f">={low:g}" if not np.isfinite(high) else f"{low:g}-{high:g}")
+    return labels
+
+
+def _histogram(values, edges, groups=None, num_groups=0):
+    """
+    分桶计数
+
+    Returns:
+        groups 为 None 时返回 [计数]，否则返回 (num_groups, 桶数) 的嵌套列表
+    """
+    bins = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+    if groups is None:
+        return np.bincount(bins, minlength=len(edges) - 1).tolist()
+    flat = np.bincount(groups * (len(edges) - 1) + bins, minlength=num_groups * (len(edges) - 1))
+    return flat.reshape(num_groups, len(edges) - 1).tolist()
+
+
+def _problem(mask, stems):
+    """{'count', 'examples'}：mask 为每个文件 / 框是否有问题，stems 为对应的文件名主干"""
+    indices = np.flatnonzero(mask)
+    examples = sorted({stems[i] for i in indices[:MAX_EXAMPLES * 10]})[:MAX_EXAMPLES]
+    return {'count': int(len(indices)), 'examples': examples}
+
+
+def _scan_images(images_dir):
+    """{文件名主干: (路径, mtime_ns, size)}"""
+    images = {}
+    if not os.path.isdir(images_dir):
+        return images
+    with os.scandir(images_dir) as entries:
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            if ext.lower() in IMAGE_EXTENSIONS and entry.is_file():
+                st = entry.stat()
+                images[stem] = (entry.path, st.st_mtime_ns, st.st_size)
+    return images
+
+
+def _fingerprint(images, labels, names, imgsz):
+    """图片和标签的 文件名 / 修改时间 / 大小 + 统计参数"""
+    digest = hashlib.sha256(json.dumps([REPORT_VERSION, names, imgsz]).encode())
+    for stem in sorted(images):
+        _, mtime_ns, size = images[stem]
+        digest.update(f"{stem}:{mtime_ns}:{size};".encode())
+    digest.update(labels.stems.astype('U').tobytes())
+    digest.update(labels.states.tobytes())
+    return digest.hexdigest()
+
+
+def _image_sizes(paths, size_cache, workers):
+    """并行读取图像宽高，无法读取的图像返回 (0, 0)"""
+    def read(path):
+        try:
+            return size_cache.get(path)
+        except Exception:
+            return 0, 0
+
+    if not paths:
+        return np.zeros((0, 2), dtype=np.float64)
+    # 在主线程中打开 SQLite 连接，之后的查询只读内存中的字典
+    first = read(paths[0])
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        sizes = [first] + list(executor.map(read, paths[1:]))
+    size_cache.flush()
+    return np.array(sizes, dtype=np.float64).reshape(-1, 2)
+
+
+def analyze_split(images, labels, names, imgsz=640, size_cache=None, workers=8):
+    """
+    统计一个划分
+
+    Args:
+        images: {文件名主干: (路径, mtime_ns, size)}
+        labels: LabelCache
+        names: 类别名称列表
+        imgsz: 训练分辨率，用于换算框的像素尺寸
+        size_cache: ImageSizeCache
+        workers: 读取图像尺寸的线程数
+
+    Returns:
+        划分统计字典
+    """
+    num_classes = len(names)
+    image_stems = sorted(images)
+    label_stems = labels.stems.tolist()
+    label_set = set(label_stems)
+
+    sizes = _image_sizes([images[stem][0] for stem in image_stems], size_cache, workers)
+    image_index = {stem: i for i, stem in enumerate(image_stems)}
+
+    # 每个标签文件对应的图片下标，孤立标签为 -1
+    label_image = np.array([image_index.get(stem, -1) for stem in label_stems], dtype=np.int64)
+    counts = labels.counts()
+    orphan = label_image < 0
+
+    # 只统计有图片的标签（训练实际使用的部分）
+    box_file = labels.file_index()
+    box_image = label_image[box_file]
+    used = box_image >= 0
+    boxes = labels.boxes[used].astype(np.float64)
+    box_image = box_image[used]
+    box_stems = [label_stems[i] for i in box_file[used]]
+
+    class_ids = boxes[:, 0]
+    xc, yc, w, h = boxes[:, 1], boxes[:, 2], boxes[:, 3], boxes[:, 4]
+    width, height = sizes[box_image, 0], sizes[box_image, 1]
+
+    valid_class = (class_ids >= 0) & (class_ids < num_classes) & (class_ids == np.round(class_ids))
+    finite = np.isfinite(boxes).all(axis=1)
+    degenerate = ~finite | (w <= 0) | (h <= 0)
+    sized = width > 0
+    degenerate |= sized & ((w * width < 1) | (h * height < 1))
+    out_of_bounds = finite & ((xc - w / 2 < -BOUNDS_TOLERANCE) | (yc - h / 2 < -BOUNDS_TOLERANCE)
+                              | (xc + w / 2 > 1 + BOUNDS_TOLERANCE) | (yc + h / 2 > 1 + BOUNDS_TOLERANCE))
+
+    # 训练分辨率下的像素尺寸：letterbox 按长边缩放到 imgsz
+    measured = valid_class & ~degenerate & sized
+    scale = imgsz / np.maximum(width[measured], height[measured])
+    px_w = w[measured] * width[measured] * scale
+    px_h = h[measured] * height[measured] * scale
+    px_size = np.sqrt(px_w * px_h)
+    aspect = px_w / px_h
+    measured_class = class_ids[measured].astype(np.int64)
+
+    size_hist = _histogram(px_size, SIZE_BINS, measured_class, num_classes)
+    aspect_hist = _histogram(aspect, ASPECT_BINS, measured_class, num_classes)
+
+    classes = {}
+    instance_counts = np.bincount(class_ids[valid_class].astype(np.int64), minlength=num_classes)
+    for c, name in enumerate(names):
+        in_class = class_ids[valid_class] == c
+        class_sizes = px_size[measured_class == c]
+        classes[name] = {
+            'instances': int(instance_counts[c]),
+            'images': int(len(np.unique(box_image[valid_class][in_class]))),
+            'size_px': size_hist[c],
+            'aspect': aspect_hist[c],
+            'size_px_percentiles': (
+                dict(zip(['p1', 'p5', 'p50', 'p95'],
+                         np.round(np.percentile(class_sizes, [1, 5, 50, 95]), 2).tolist()))
+                if len(class_sizes) else {}
+            ),
+        }
+
+    # 每图框数（没有标签文件的图片按 0 计）
+    per_image = np.zeros(len(image_stems), dtype=np.int64)
+    per_image[label_image[~orphan]] = counts[~orphan]
+
+    bad_ids = class_ids[~valid_class]
+    bad_id_counts = {}
+    for value, count in zip(*np.unique(bad_ids, return_counts=True)):
+        key = str(int(value)) if value == np.round(value) else f"{value:g}"
+        bad_id_counts[key] = int(count)
+
+    return {
+        'images': len(image_stems),
+        'label_files': len(label_stems),
+        'boxes': int(used.sum()),
+        'classes': classes,
+        'size_px': _histogram(px_size, SIZE_BINS),
+        'aspect': _histogram(aspect, ASPECT_BINS),
+        'boxes_per_image': {
+            'counts': _histogram(per_image, COUNT_BINS),
+            'mean': round(float(per_image.mean()), 3) if len(per_image) else 0.0,
+            'max': int(per_image.max()) if len(per_image) else 0,
+        },
+        'problems': {
+            # 无法解析而被跳过的行 (非数字、NaN、少于 5 列)，count 为文件数
+            'malformed_labels': dict(_problem(labels.malformed > 0, label_stems),
+                                     lines=int(labels.malformed.sum())),
+            'empty_labels': _problem(~orphan & (counts == 0), label_stems),
+            'missing_labels': _problem(np.array([stem not in label_set for stem in image_stems], dtype=bool),
+                                       image_stems),
+            'orphan_labels': _problem(orphan, label_stems),
+            'unreadable_images': _problem(sizes[:, 0] <= 0, image_stems),
+            'bad_class_ids': dict(_problem(~valid_class, box_stems), ids=bad_id_counts),
+            'degenerate_boxes': _problem(degenerate, box_stems),
+            'out_of_bounds_boxes': _problem(out_of_bounds, box_stems),
+        },
+    }
+
+
+def dataset_report(dataset_dir='datasets', data_yaml=None, splits=('train', 'valid', 'test'),
+                   imgsz=640, workers=8, report_path=None, refresh=False):
+    """
+    生成数据集报告；划分的图片和标签未变化时复用缓存中的统计
+
+    Args:
+        dataset_dir: 数据集目录
+        data_yaml: 数据集配置文件（读取类别名称），默认 <dataset_dir>/data.yaml
+        splits: 统计的划分，不存在的划分跳过
+        imgsz: 训练分辨率
+        workers: 并行数
+        report_path: 报告缓存路径，默认 <dataset_dir>/.dataset_report.json
+        refresh: 忽略缓存，全部重新统计
+
+    Returns:
+        {'imgsz', 'names', 'bins', 'splits': {划分: 统计}}
+    """
+    data_yaml = data_yaml or os.path.join(dataset_dir, 'data.yaml')
+    with open(data_yaml, 'r', encoding='utf-8') as f:
+        names = yaml.safe_load(f).get('names', [])
+    if isinstance(names, dict):
+        names = [names[k] for k in sorted(names)]
+
+    report_path = report_path or os.path.join(dataset_dir, REPORT_NAME)
+    cached = {}
+    if not refresh and os.path.exists(report_path):
+        with open(report_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f).get('splits', {})
+
+    size_cache = ImageSizeCache(os.path.join(dataset_dir, SIZE_CACHE_NAME))
+    report = {
+        'imgsz': imgsz,
+        'names': names,
+        'bins': {
+            'size_px': _bin_labels(SIZE_BINS),
+            'aspect': _bin_labels(ASPECT_BINS),
+            'boxes_per_image': _bin_labels(COUNT_BINS, integer=True),
+        },
+        'splits': {},
+    }
+
+    for split in splits:
+        images_dir = os.path.join(dataset_dir, split, 'images')
+        if not os.path.isdir(images_dir):
+            continue
+        images = _scan_images(images_dir)
+        labels = LabelCache.load(os.path.join(dataset_dir, split, 'labels'), workers=workers, verbose=False)
+        fingerprint = _fingerprint(images, labels, names, imgsz)
+
+        if cached.get(split, {}).get('fingerprint') == fingerprint:
+            print(f"♻️  {split}: 未变化，复用缓存的统计")
+            report['splits'][split] = cached[split]
+            continue
+
+        print(f"🔍 统计 {split}: {len(images)} 张图片, {len(labels)} 个标签文件...")
+        stats = analyze_split(images, labels, names, imgsz, size_cache, workers)
+        stats['fingerprint'] = fingerprint
+        report['splits'][split] = stats
+
+    size_cache.close()
+
+    tmp_path = f"{report_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, report_path)
+    print(f"✅ 报告已保存: {report_path}")
+    return report
+
+
+def print_report(report):
+    """在终端打印报告摘要"""
+    names = report['names']
+    size_bins = report['bins']['size_px']
+    aspect_bins = report['bins']['aspect']
+
+    for split, stats in report['splits'].items():
+        print("\n" + "=" * 60)
+        print(f"📊 {split}: {stats['images']} 张图片, {stats['label_files']} 个标签文件, "
+              f"{stats['boxes']} 个框")
+        print("=" * 60)
+
+        print(f"\n🏷️  类别 (框尺寸为 imgsz={report['imgsz']} 下的像素 sqrt(w*h)):")
+        for name in names:
+            c = stats['classes'][name]
+            p = c['size_px_percentiles']
+            sizes = f"p5={p['p5']:.1f} p50={p['p50']:.1f} p95={p['p95']:.1f}" if p else "-"
+            print(f"  {name:<12} 实例: {c['instances']:<8} 图片: {c['images']:<8} 尺寸: {sizes}")
+            tiny = sum(c['size_px'][:2])
+            if c['instances'] and tiny:
+                print(f"  {'':<12} ⚠️  {tiny} 个框小于 {SIZE_BINS[2]} 像素")
+
+        print(f"\n📐 框尺寸分布: " + ", ".join(f"{b}: {n}" for b, n in zip(size_bins, stats['size_px'])))
+        print(f"📐 长宽比分布: " + ", ".join(f"{b}: {n}" for b, n in zip(aspect_bins, stats['aspect'])))
+        per_image = stats['boxes_per_image']
+        print(f"🖼️  每图框数: 平均 {per_image['mean']}, 最多 {per_image['max']}; "
+              + ", ".join(f"{b}: {n}" for b, n in zip(report['bins']['boxes_per_image'],
+                                                    per_image['counts'])))
+
+        problems = {k: v for k, v in stats['problems'].items() if v['count']}
+        if not problems:
+            print("\n✅ 未发现问题")
+            continue
+        print("\n⚠️  问题:")
+        for name, problem in problems.items():
+            examples = ', '.join(problem['examples'][:3])
+            extra = f" 编号: {problem['ids']}" if problem.get('ids') else ""
+            if problem.get('lines'):
+                extra = f" (共 {problem['lines']} 行)"
+            print(f"  {name:<20} {problem['count']:<8}{extra} 例如: {examples}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据集统计与健康检查')
+    parser.add_argument('--dataset-dir', type=str, default='datasets',
+                        help='数据集目录 (默认: datasets)')
+    parser.add_argument('--data', type=str, default=None,
+                        help='数据集配置文件 (默认: <dataset-dir>/data.yaml)')
+    parser.add_argument('--splits', type=str, nargs='+', default=['train', 'valid', 'test'],
+                        help='统计的数据划分 (默认: train valid test)')
+    parser.add_argument('--imgsz', type=int, default=640,
+                        help='训练分辨率，用于换算框的像素尺寸 (默认: 640)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 8,
+                        help='并行数 (默认: CPU 核数)')
+    parser.add_argument('--report', type=str, default=None,
+                        help=f'报告文件 (默认: <dataset-dir>/{REPORT_NAME})')
+    parser.add_argument('--refresh', action='store_true',
+                        help='忽略缓存，全部重新统计')
+    args = parser.parse_args()
+
+    report = dataset_report(args.dataset_dir, args.data, args.splits, args.imgsz, args.workers,
+                            args.report, args.refresh)
+    print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,373 @@
+"""
+导出模型推理性能基准
+对 model_exporter/ 中的每个导出产物，在 CPU 上测试多种 batch 和图像尺寸的延迟与吞吐，
+并在数据集上对比各格式与源 .pt 模型的 mAP
+
+使用方式（通过 export_model.py 的 benchmark 子命令）：
+  python export_model.py benchmark --model runs/detect/yolo12n_person_head/weights/best.pt
+  python export_model.py benchmark --model best.pt --batch-sizes 1,8,32 --imgsz 320,640 --iters 100
+  python export_model.py benchmark --model best.pt --no-parity
+"""
+
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+# 可以基准测试的导出格式（后缀 / 目录名 -> 格式名）
+ARTIFACT_SUFFIXES = {
+    '.pt': 'pytorch',
+    '.onnx': 'onnx',
+    '.torchscript': 'torchscript',
+    '.engine': 'engine',
+}
+OPENVINO_DIR_SUFFIX = '_openvino_model'
+
+
+def find_artifacts(export_dir):
+    """
+    列出导出目录中的模型文件
+
+    Args:
+        export_dir: 导出目录
+
+    Returns:
+        [(格式, 路径), ...]
+    """
+    artifacts = []
+    if not os.path.isdir(export_dir):
+        return artifacts
+
+    for name in sorted(os.listdir(export_dir)):
+        path = os.path.join(export_dir, name)
+        if os.path.isdir(path) and name.endswith(OPENVINO_DIR_SUFFIX):
+            artifacts.append(('openvino', path))
+            continue
+        suffix = os.path.splitext(name)[1]
+        if os.path.isfile(path) and suffix in ARTIFACT_SUFFIXES and suffix != '.pt':
+            artifacts.append((ARTIFACT_SUFFIXES[suffix], path))
+    return artifacts
+
+
+def _artifact_size_mb(path):
+    if os.path.isdir(path):
+        total = sum(os.path.getsize(os.path.join(root, f))
+                    for root, _, files in os.walk(path) for f in files)
+    else:
+        total = os.path.getsize(path)
+    return total / (1024 * 1024)
+
+
+def _peak_rss_mb():
+    """当前进程的峰值常驻内存 (MB)"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为 KB，macOS 为字节
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+
+
+def _latency_stats(latencies_ms, batch):
+    latencies = np.asarray(latencies_ms)
+    return {
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'mean_ms': float(latencies.mean()),
+        'images_per_sec': float(batch * 1000 / latencies.mean()),
+    }
+
+
+def benchmark_artifact(path, batch_sizes, image_sizes, warmup=5, iters=50):
+    """
+    在当前进程中测试单个导出产物（由 run_benchmark 放到独立子进程中调用，
+    保证峰值内存互不干扰）
+
+    Args:
+        path: 模型路径
+        batch_sizes: batch 列表
+        image_sizes: 图像尺寸列表
+        warmup: 预热次数
+        iters: 计时次数
+
+    Returns:
+        每个 (imgsz, batch) 组合一行结果；peak_rss_mb 在该组合测完后采样（子进程到此为止的峰值，
+        组合按尺寸、batch 从小到大测试，因此基本就是该组合本身的峰值）
+    """
+    import torch
+    from ultralytics.nn.autobackend import AutoBackend
+
+    torch.set_grad_enabled(False)
+    backend = AutoBackend(path, device=torch.device('cpu'), verbose=False)
+
+    rows = []
+    for imgsz in sorted(image_sizes):
+        for batch in sorted(batch_sizes):
+            row = {'imgsz': imgsz, 'batch': batch}
+            x = torch.rand(batch, 3, imgsz, imgsz)
+            try:
+                for _ in range(warmup):
+                    backend(x)
+                latencies = []
+                for _ in range(iters):
+                    start = time.perf_counter()
+                    backend(x)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                row.update(_latency_stats(latencies, batch))
+                row['status'] = 'ok'
+            except Exception as e:
+                # 静态 shape 导出的模型不支持其它 batch / 尺寸
+                row['status'] = f"unsupported: {str(e).splitlines()[0][:120]}"
+            row['peak_rss_mb'] = _peak_rss_mb()
+            rows.append(row)
+
+    return rows
+
+
+def parity_shape(path, imgsz):
+    """
+    按导出时写出的 <name>.shapes.json 选择 mAP 评估用的输入 shape
+
+    静态 shape 的 multi 配置每个文件只支持一个 batch x 尺寸；优先使用与 imgsz 相同的尺寸，
+    其次最接近的尺寸，batch 取最小
+
+    Args:
+        path: 导出产物路径
+        imgsz: 期望的评估尺寸
+
+    Returns:
+        (batch, imgsz)；没有清单时为 (1, imgsz)，清单中没有通过校验的 shape 时返回 None
+    """
+    manifest_path = os.path.splitext(path)[0] + '.shapes.json'
+    if not os.path.isfile(manifest_path):
+        return 1, imgsz
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        shapes = [(s['batch'], s['imgsz']) for s in json.load(f)['shapes'] if s['ok']]
+    if not shapes:
+        return None
+    return min(shapes, key=lambda s: (abs(s[1] - imgsz), s[0]))
+
+
+def check_parity(source_model, artifacts, data_yaml, imgsz=640, reference_label='pytorch'):
+    """
+    在验证集上对比导出产物与源 .pt 模型的 mAP
+
+    产物按 shape 清单支持的 batch / 尺寸评估，参考模型在同一尺寸下评估；
+    没有可用 shape 的产物标记为跳过
+
+    Args:
+        source_model: 源 .pt 模型路径（或其它作为参考的模型）
+        artifacts: [(格式, 路径), ...]
+        data_yaml: 数据集配置文件
+        imgsz: 评估尺寸
+        reference_label: 参考模型在输出中的名称
+
+    Returns:
+        {路径: {'map50', 'map50_95', 'delta_map50_95', 'parity_batch', 'parity_imgsz'}
+        或 {'skipped'} 或 {'error'}}
+    """
+    from model_registry import get_model
+    from shard_training import val_kwargs
+
+    def evaluate(path, batch, size):
+        metrics = get_model(path).val(data=data_yaml, imgsz=size, batch=batch, device='cpu',
+                                      plots=False, verbose=False, **val_kwargs(data_yaml))
+        return {'map50': float(metrics.box.map50), 'map50_95': float(metrics.box.map),
+                'parity_batch': batch, 'parity_imgsz': size}
+
+    # {尺寸: 参考模型结果}
+    references = {}
+
+    def reference_at(size):
+        if size not in references:
+            references[size] = evaluate(source_model, 1, size)
+            references[size]['delta_map50_95'] = 0.0
+            print(f"  {reference_label:<12} mAP50={references[size]['map50']:.4f} "
+                  f"mAP50-95={references[size]['map50_95']:.4f} (imgsz={size})")
+        return references[size]
+
+    print(f"\n📊 mAP 一致性检查 ({data_yaml}, imgsz={imgsz})")
+    parity = {source_model: reference_at(imgsz)}
+
+    for fmt, path in artifacts:
+        shape = parity_shape(path, imgsz)
+        if shape is None:
+            result = {'skipped': 'no verified input shape in .shapes.json'}
+            print(f"  {fmt:<12} ⏭️  跳过: shape 清单中没有通过校验的输入 shape")
+            parity[path] = result
+            continue
+        batch, size = shape
+        try:
+            reference = reference_at(size)
+            result = evaluate(path, batch, size)
+            result['delta_map50_95'] = result['map50_95'] - reference['map50_95']
+            print(f"  {fmt:<12} mAP50={result['map50']:.4f} mAP50-95={result['map50_95']:.4f} "
+                  f"(Δ {result['delta_map50_95']:+.4f}, batch={batch} imgsz={size})")
+        except Exception as e:
+            result = {'error': str(e).splitlines()[0][:200]}
+            print(f"  {fmt:<12} ❌ 评估失败: {result['error']}")
+        parity[path] = result
+    return parity
+
+
+def write_report(rows, parity, report_prefix):
+    """写出 JSON 和 CSV 报告"""
+    os.makedirs(os.path.dirname(os.path.abspath(report_prefix)), exist_ok=True)
+
+    json_path = f"{report_prefix}.json"
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump({'results': rows, 'parity': parity}, f, indent=2, ensure_ascii=False)
+
+    csv_path = f"{report_prefix}.csv"
+    fields = ['format', 'path', 'size_mb', 'imgsz', 'batch', 'p50_ms', 'p95_ms', 'p99_ms',
+              'mean_ms', 'images_per_sec', 'peak_rss_mb', 'map50', 'map50_95', 'parity_batch', 'parity_imgsz',
+              'status']
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({**row, **parity.get(row['path'], {})})
+
+    return json_path, csv_path
+
+
+def run_benchmark(source_model=None, export_dir='model_exporter', batch_sizes=(1, 8),
+                  image_sizes=(640,), warmup=5, iters=50, data_yaml='datasets/data.yaml',
+                  parity=True, parity_imgsz=640, report_prefix=None):
+    """
+    基准测试导出目录中的所有模型
+
+    Args:
+        source_model: 源 .pt 模型，作为 pytorch 基线和 mAP 参考；None 表示不测基线
+        export_dir: 导出目录
+        batch_sizes: batch 列表
+        image_sizes: 图像尺寸列表
+        warmup: 预热次数
+        iters: 计时次数
+        data_yaml: mAP 一致性检查用的数据集配置
+        parity: 是否做 mAP 一致性检查
+        parity_imgsz: mAP 评估尺寸
+        report_prefix: 报告路径前缀，默认 <export_dir>/benchmark_report
+
+    Returns:
+        结果行列表
+    """
+    artifacts = find_artifacts(export_dir)
+    if source_model:
+        if not os.path.exists(source_model):
+            raise FileNotFoundError(f"模型文件不存在: {source_model}")
+        artifacts.insert(0, ('pytorch', source_model))
+    if not artifacts:
+        print(f"❌ 没有找到可测试的模型: {export_dir}")
+        return []
+
+    print("=" * 70)
+    print("⏱️  YOLO12 导出模型基准测试 (CPU)")
+    print("=" * 70)
+    print(f"📦 模型数: {len(artifacts)}")
+    print(f"📐 图像尺寸: {', '.join(map(str, image_sizes))}")
+    print(f"🔢 Batch: {', '.join(map(str, batch_sizes))}")
+    print(f"🔁 预热 {warmup} 次, 计时 {iters} 次")
+    print("=" * 70)
+
+    rows = []
+    context = multiprocessing.get_context('spawn')
+    for fmt, path in artifacts:
+        print(f"\n🔄 {fmt}: {path}")
+        if fmt == 'engine':
+            print("   ⏭️  TensorRT 需要 CUDA，跳过 CPU 基准")
+            rows.append({'format': fmt, 'path': path, 'size_mb': _artifact_size_mb(path),
+                         'status': 'skipped: requires CUDA'})
+            continue
+
+        # 每个模型在独立子进程中测试，峰值内存互不影响
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            try:
+                results = executor.submit(benchmark_artifact, path, list(batch_sizes),
+                                          list(image_sizes), warmup, iters).result()
+            except Exception as e:
+                print(f"   ❌ 加载失败: {e}")
+                rows.append({'format': fmt, 'path': path, 'size_mb': _artifact_size_mb(path),
+                             'status': f"error: {str(e).splitlines()[0][:120]}"})
+                continue
+
+        for row in results:
+            row.update({'format': fmt, 'path': path, 'size_mb': _artifact_size_mb(path)})
+            rows.append(row)
+            if row['status'] == 'ok':
+                print(f"   imgsz={row['imgsz']:<4} batch={row['batch']:<3} "
+                      f"p50={row['p50_ms']:8.2f}ms p95={row['p95_ms']:8.2f}ms "
+                      f"p99={row['p99_ms']:8.2f}ms {row['images_per_sec']:8.1f} img/s "
+                      f"RSS={row['peak_rss_mb']:.0f}MB")
+            else:
+                print(f"   imgsz={row['imgsz']:<4} batch={row['batch']:<3} ⚠️  {row['status']}")
+
+    parity_results = {}
+    if parity:
+        if not source_model:
+            print("\n⚠️  未指定 --model，跳过 mAP 一致性检查")
+        elif not os.path.exists(data_yaml):
+            print(f"\n⚠️  数据集配置文件不存在，跳过 mAP 一致性检查: {data_yaml}")
+        else:
+            exported = [(fmt, path) for fmt, path in artifacts if fmt not in ('pytorch', 'engine')]
+            parity_results = check_parity(source_model, exported, data_yaml, parity_imgsz)
+
+    report_prefix = report_prefix or os.path.join(export_dir, 'benchmark_report')
+    json_path, csv_path = write_report(rows, parity_results, report_prefix)
+
+    print("\n" + "=" * 70)
+    print("✅ 基准测试完成!")
+    print(f"📄 JSON 报告: {json_path}")
+    print(f"📄 CSV 报告:  {csv_path}")
+    print("=" * 70)
+    return rows
+
+
+def add_benchmark_arguments(parser):
+    """为 benchmark 子命令添加参数"""
+    parser.add_argument('--model', type=str, default=None,
+                        help='源模型 (best.pt)，作为 pytorch 基线和 mAP 参考')
+    parser.add_argument('--dir', type=str, default='model_exporter',
+                        help='导出目录 (默认: model_exporter)')
+    parser.add_argument('--batch-sizes', type=str, default='1,8',
+                        help='batch 列表，逗号分隔 (默认: 1,8)')
+    parser.add_argument('--imgsz', type=str, default='640',
+                        help='图像尺寸列表，逗号分隔 (默认: 640)')
+    parser.add_argument('--warmup', type=int, default=5,
+                        help='预热次数 (默认: 5)')
+    parser.add_argument('--iters', type=int, default=50,
+                        help='计时次数 (默认: 50)')
+    parser.add_argument('--data', type=str, default='datasets/data.yaml',
+                        help='mAP 一致性检查用的数据集配置 (默认: datasets/data.yaml)')
+    parser.add_argument('--parity-imgsz', type=int, default=640,
+                        help='mAP 评估尺寸 (默认: 640)')
+    parser.add_argument('--no-parity', action='store_true',
+                        help='跳过 mAP 一致性检查')
+    parser.add_argument('--report', type=str, default=None,
+                        help='报告路径前缀 (默认: <dir>/benchmark_report)')
+    return parser
+
+
+def main_from_args(args):
+    """根据解析后的命令行参数运行基准测试"""
+    return run_benchmark(
+        source_model=args.model,
+        export_dir=args.dir,
+        batch_sizes=[int(b) for b in args.batch_sizes.split(',')],
+        image_sizes=[int(s) for s in args.imgsz.split(',')],
+        warmup=args.warmup,
+        iters=args.iters,
+        data_yaml=args.data,
+        parity=not args.no_parity,
+        parity_imgsz=args.parity_imgsz,
+        report_prefix=args.report
+    )
@@ -38,6 +38,18 @@ echo "示例5: 同时导出 ONNX 和 TensorRT (INT8)"
 echo "命令: python export_model.py --model $MODEL_PATH --format onnx,engine --int8"
 # python export_model.py --model $MODEL_PATH --format onnx,engine --int8
 
+# 示例6: 导出动态 batch / 动态尺寸的 ONNX
+echo ""
+echo "示例6: 导出动态 shape 的 ONNX 并校验 1/8/32 x 320/480/640"
+echo "命令: python export_model.py --model $MODEL_PATH --format onnx --profile dynamic"
+# python export_model.py --model $MODEL_PATH --format onnx --profile dynamic
+
+# 示例7: 基准测试导出的模型
+echo ""
+echo "示例7: 基准测试 model_exporter/ 中的所有模型 (CPU)"
+echo "命令: python export_model.py benchmark --model $MODEL_PATH --batch-sizes 1,8 --imgsz 320,640"
+# python export_model.py benchmark --model $MODEL_PATH --batch-sizes 1,8 --imgsz 320,640
+
 echo ""
 echo "======================================"
 echo "💡 取消注释相应的命令行即可运行"
@@ -12,6 +12,12 @@ YOLO12 模型导出脚本
   # 导出 ONNX (INT8) 指定数据集目录
   python export_model.py --model runs/detect/yolo12n_person_head/weights/best.pt --format onnx --int8 --dataset-dir DF-Data
   
+  # ONNX Runtime INT8 量化 (静态 QDQ + 动态)，并生成与 FP32 对比的延迟 / 大小 / mAP 报告
+  python export_model.py --model runs/detect/yolo12n_person_head/weights/best.pt --format onnx --ort-quant static,dynamic
+  
+  # INT8 校准集：从训练集分层抽取 512 张 (默认 256；0 表示使用整个 data.yaml)
+  python export_model.py --model runs/detect/yolo12n_person_head/weights/best.pt --format onnx,engine --int8 --calib-images 512
+  
   # 导出到自定义目录
   python export_model.py --model runs/detect/yolo12n_person_head/weights/best.pt --format onnx --output-dir exported_models
   
@@ -23,17 +29,278 @@ YOLO12 模型导出脚本
   
   # 导出多种格式
   python export_model.py --model runs/detect/yolo12n_person_head/weights/best.pt --format onnx,engine --int8
+  
+  # 导出动态 batch + 动态尺寸的 ONNX，并用 onnxruntime 校验 1/8/32 x 320/480/640
+  python export_model.py --model runs/detect/yolo12n_person_head/weights/best.pt --format onnx --profile dynamic
+  
+  # 导出一组静态 shape 的 ONNX (每个 batch x 尺寸一个文件)
+  python export_model.py --model runs/detect/yolo12n_person_head/weights/best.pt --format onnx --profile multi --profile-batches 1,8 --profile-sizes 320,640
+  
+  # 基准测试 model_exporter/ 中的所有导出模型 (CPU 延迟、吞吐、内存、mAP 一致性)
+  python export_model.py benchmark --model runs/detect/yolo12n_person_head/weights/best.pt --batch-sizes 1,8 --imgsz 320,640
 """
 
 from ultralytics import YOLO
+import ultralytics
 import argparse
+import hashlib
+import json
+import multiprocessing
 import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from calibration import (CACHED_CALIBRATION_FORMATS, CALIBRATION_DIR_NAME, load_calibration_tensors,
+                         prepare_calibration, use_cached_calibration_tensors)
+
+
+# 导出缓存目录（位于输出目录下），按 权重哈希 + 导出参数 寻址
+CACHE_DIR_NAME = '.export_cache'
+
+# ONNX 导出配置
+#   static:  单一静态 shape (batch 1, imgsz)
+#   dynamic: 动态 batch 与空间维度，一个文件支持所有 shape
+#   multi:   一组静态 shape，每个 batch x 尺寸导出一个文件
+ONNX_PROFILES = ('static', 'dynamic', 'multi')
+
+# onnxruntime INT8 量化方式（见 onnx_quantize.py）
+ORT_QUANT_MODES = ('static', 'dynamic')
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """计算文件的 SHA256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_export_args(fmt, imgsz=640, int8=False, half=False, data_yaml=None,
+                      opset=12, simplify=True, dynamic=False, batch=1):
+    """
+    生成单个格式的 model.export 参数
+    
+    Args:
+        fmt: 导出格式
+        imgsz: 图像尺寸
+        int8: 是否使用 INT8 量化
+        half: 是否使用 FP16（仅 TensorRT）
+        data_yaml: INT8 校准数据集配置
+        opset: ONNX opset 版本
+        simplify: 是否简化 ONNX 图
+        dynamic: ONNX 是否使用动态 batch 与空间维度
+        batch: 静态 batch 大小
+    
+    Returns:
+        导出参数字典
+    """
+    export_args = {
+        'format': fmt,
+        'imgsz': imgsz,
+    }
+    if batch > 1:
+        export_args['batch'] = batch
+    
+    # ONNX 特定参数
+    if fmt == 'onnx':
+        export_args['simplify'] = simplify
+        export_args['opset'] = opset
+        if dynamic:
+            export_args['dynamic'] = True
+        if int8:
+            export_args['int8'] = True
+            export_args['data'] = data_yaml
+    
+    # TensorRT 特定参数
+    elif fmt == 'engine':
+        export_args['half'] = half if not int8 else False
+        if int8:
+            export_args['int8'] = True
+            export_args['data'] = data_yaml
+    
+    return export_args
+
+
+def plan_exports(formats, imgsz=640, int8=False, half=False, data_yaml=None, onnx_profile='static',
+                 profile_batches=(1, 8, 32), profile_sizes=(320, 480, 640), opset=12, simplify=True):
+    """
+    把格式列表展开为导出任务
+    
+    Returns:
+        [(任务名, 导出参数, 文件名后缀, 需要校验的 [(batch, imgsz)] 或 None), ...]
+    """
+    jobs = []
+    for fmt in formats:
+        if fmt == 'onnx' and onnx_profile == 'multi':
+            for size in profile_sizes:
+                for batch in profile_batches:
+                    export_args = build_export_args(fmt, size, int8, half, data_yaml, opset, simplify,
+                                                    batch=batch)
+                    jobs.append((f"onnx_b{batch}_{size}", export_args, f"_b{batch}_{size}",
+                                 [(batch, size)]))
+        elif fmt == 'onnx' and onnx_profile == 'dynamic':
+            export_args = build_export_args(fmt, imgsz, int8, half, data_yaml, opset, simplify,
+                                            dynamic=True)
+            shapes = [(batch, size) for size in profile_sizes for batch in profile_batches]
+            jobs.append(('onnx_dynamic', export_args, '_dynamic', shapes))
+        else:
+            export_args = build_export_args(fmt, imgsz, int8, half, data_yaml, opset, simplify)
+            jobs.append((fmt, export_args, '', [(1, imgsz)] if fmt == 'onnx' else None))
+    return jobs
+
+
+def verify_onnx_shapes(onnx_path, shapes):
+    """
+    用 onnxruntime 逐个运行输入 shape，确认模型确实支持
+    
+    Args:
+        onnx_path: .onnx 模型路径
+        shapes: [(batch, imgsz), ...]
+    
+    Returns:
+        每个 shape 的校验结果
+    """
+    import numpy as np
+    import onnxruntime as ort
+    
+    session = ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+    model_input = session.get_inputs()[0]
+    dtype = np.float16 if model_input.type == 'tensor(float16)' else np.float32
+    
+    results = []
+    for batch, size in shapes:
+        entry = {'batch': batch, 'imgsz': size}
+        try:
+            outputs = session.run(None, {model_input.name: np.zeros((batch, 3, size, size), dtype=dtype)})
+            entry['ok'] = True
+            entry['output_shape'] = list(outputs[0].shape)
+        except Exception as e:
+            entry['ok'] = False
+            entry['error'] = str(e).splitlines()[0][:200]
+        results.append(entry)
+    return results
+
+
+def write_shape_manifest(onnx_path, profile, shapes, export_args):
+    """
+    校验 ONNX 模型支持的 shape，并写出旁路清单 <name>.shapes.json
+    
+    Returns:
+        清单路径
+    """
+    import onnxruntime as ort
+    
+    session = ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+    model_input = session.get_inputs()[0]
+    results = verify_onnx_shapes(onnx_path, shapes)
+    
+    manifest = {
+        'model': os.path.basename(onnx_path),
+        'profile': profile,
+        'input': {'name': model_input.name, 'shape': model_input.shape, 'type': model_input.type},
+        'export_args': export_args,
+        'shapes': results,
+    }
+    manifest_path = os.path.splitext(onnx_path)[0] + '.shapes.json'
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    
+    passed = sum(r['ok'] for r in results)
+    print(f"   🔍 shape 校验: {passed}/{len(results)} 通过 -> {manifest_path}")
+    for r in results:
+        if not r['ok']:
+            print(f"      ❌ batch={r['batch']} imgsz={r['imgsz']}: {r['error']}")
+    return manifest_path
+
 
+def export_cache_key(weights_hash, export_args):
+    """缓存键：权重内容 + 导出参数 + ultralytics 版本"""
+    payload = json.dumps({
+        'weights': weights_hash,
+        'args': export_args,
+        'ultralytics': ultralytics.__version__,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
 
-def export_model(model_path, formats, int8=False, half=False, imgsz=640, data_yaml=None, dataset_dir='datasets', output_dir='model_exporter'):
+
+def _cached_artifact(cache_dir):
+    """返回缓存目录中的导出产物路径，未命中返回 None"""
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        artifact = os.path.join(cache_dir, json.load(f)['artifact'])
+    return artifact if os.path.exists(artifact) else None
+
+
+def _publish(artifact, output_dir):
+    """把缓存中的产物复制到输出目录"""
+    target = os.path.join(output_dir, os.path.basename(artifact))
+    if os.path.isdir(artifact):
+        shutil.copytree(artifact, target, dirs_exist_ok=True)
+    else:
+        shutil.copy2(artifact, target)
+    return target
+
+
+def _export_worker(model_path, export_args, cache_dir, suffix='', calib_tensors=None):
+    """
+    在子进程中导出单个格式并写入缓存
+    
+    每个任务在独立的临时目录中导出，避免并行的格式互相覆盖中间文件
+    （如 TensorRT 导出时会先生成同名 .onnx）
+    
+    Args:
+        suffix: 追加到文件名的后缀，区分同一格式的不同 shape 配置
+        calib_tensors: 缓存的校准张量 .npy，ONNX / TensorRT INT8 校准直接读取，不再解码图片
+    
+    Returns:
+        缓存中的产物路径
+    """
+    staging = f"{cache_dir}.tmp{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    
+    if calib_tensors:
+        use_cached_calibration_tensors(calib_tensors)
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        local_model = os.path.join(workdir, os.path.basename(model_path))
+        shutil.copy2(model_path, local_model)
+        
+        export_path = YOLO(local_model).export(**export_args)
+        if not export_path or not os.path.exists(export_path):
+            raise RuntimeError(f"导出未生成文件: {export_path}")
+        
+        name = os.path.basename(str(export_path).rstrip(os.sep))
+        if suffix:
+            stem, ext = os.path.splitext(name)
+            name = f"{stem}{suffix}{ext}"
+        shutil.move(str(export_path), os.path.join(staging, name))
+    
+    with open(os.path.join(staging, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'artifact': name, 'model': os.path.abspath(model_path), 'args': export_args},
+                  f, indent=2, ensure_ascii=False)
+    
+    # 整个目录原子替换，中断的导出不会留下半成品缓存
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.rename(staging, cache_dir)
+    return os.path.join(cache_dir, name)
+
+
+def export_model(model_path, formats, int8=False, half=False, imgsz=640, data_yaml=None, dataset_dir='datasets', output_dir='model_exporter',
+                 workers=None, use_cache=True, onnx_profile='static', profile_batches=(1, 8, 32),
+                 profile_sizes=(320, 480, 640), opset=12, simplify=True,
+                 calib_images=256, calib_split='train', calib_seed=0, ort_quant=(), quant_report=True):
     """
     导出模型
     
+    多个格式在独立进程中并行导出；相同权重 + 相同参数的导出结果缓存在
+    <output_dir>/.export_cache/ 下，重复导出直接复用
+    
     Args:
         model_path: 模型路径
         formats: 导出格式列表 ['onnx', 'engine', 'torchscript', 等]
@@ -43,7 +310,32 @@ def export_model(model_path, formats, int8=False, half=False, imgsz=640, data_ya
         data_yaml: 数据集配置（INT8 量化需要）
         dataset_dir: 数据集目录（默认 'datasets'）
         output_dir: 输出目录（默认 'model_exporter'）
+        workers: 并行导出进程数（默认 每个格式一个进程）
+        use_cache: 是否复用导出缓存
+        onnx_profile: ONNX 导出配置 ('static' / 'dynamic' / 'multi')
+        profile_batches: dynamic / multi 配置的 batch 列表
+        profile_sizes: dynamic / multi 配置的图像尺寸列表
+        opset: ONNX opset 版本
+        simplify: 是否简化 ONNX 图
+        calib_images: INT8 校准图片数量，从 calib_split 中按类别分层抽取；0 表示使用整个 data_yaml
+        calib_split: 校准图片所在的数据划分
+        calib_seed: 校准抽样的随机种子
+        ort_quant: 对导出的 FP32 ONNX 做 onnxruntime INT8 量化的方式 ('static' / 'dynamic')；
+                   启用后 ONNX 始终先导出 FP32，--int8 只作用于 TensorRT
+        quant_report: 是否生成量化模型与 FP32 的对比报告
+    
+    Returns:
+        {任务名: 导出文件路径}，失败的任务不包含在内
+        （任务名为格式名；ONNX 的 dynamic / multi 配置为 onnx_dynamic、onnx_b8_640 等）
     """
+    if onnx_profile not in ONNX_PROFILES:
+        raise ValueError(f"不支持的 ONNX 导出配置: {onnx_profile}")
+    for mode in ort_quant:
+        if mode not in ORT_QUANT_MODES:
+            raise ValueError(f"不支持的 onnxruntime 量化方式: {mode}")
+    if 'static' in ort_quant and not calib_images:
+        raise ValueError("onnxruntime 静态量化需要校准子集 (calib_images > 0)")
+
     print("=" * 70)
     print("🚀 YOLO12 模型导出")
     print("=" * 70)
@@ -53,9 +345,18 @@ def export_model(model_path, formats, int8=False, half=False, imgsz=640, data_ya
     print(f"📂 输出目录: {output_dir}")
     if int8:
         print(f"⚡ INT8 量化: 启用")
-        print(f"📊 校准数据: {data_yaml}")
+        print(f"📊 校准数据: {data_yaml or os.path.join(dataset_dir, 'data.yaml')}")
+        if calib_images:
+            print(f"🎯 校准子集: {calib_split} 中分层抽取 {calib_images} 张 (seed={calib_seed})")
     if half:
         print(f"⚡ FP16: 启用")
+    if 'onnx' in formats:
+        print(f"🧩 ONNX 配置: {onnx_profile} (opset={opset}, simplify={simplify})")
+        if onnx_profile != 'static':
+            print(f"   batch: {', '.join(map(str, profile_batches))} | "
+                  f"尺寸: {', '.join(map(str, profile_sizes))}")
+        if ort_quant:
+            print(f"⚡ onnxruntime INT8 量化: {', '.join(ort_quant)}")
     print("=" * 70)
     
     # 检查模型文件
@@ -67,69 +368,127 @@ def export_model(model_path, formats, int8=False, half=False, imgsz=640, data_ya
     print(f"📁 输出目录已创建: {output_dir}")
     
     # INT8 量化需要数据集
-    if int8 and not data_yaml:
+    if (int8 or ort_quant) and not data_yaml:
         data_yaml = os.path.join(dataset_dir, 'data.yaml')
         print(f"\n⚠️  警告: INT8 量化需要数据集用于校准")
         print(f"   使用默认数据集: {data_yaml}")
         if not os.path.exists(data_yaml):
             raise FileNotFoundError(f"数据集配置文件不存在: {data_yaml}")
     
-    # 加载模型
-    print("\n📥 加载模型...")
-    model = YOLO(model_path)
-    print("✅ 模型加载成功")
+    # INT8 校准子集：所有格式共用同一份图片列表，标签未变化时直接复用
+    eval_yaml = data_yaml
+    calibration = None
+    if (int8 or 'static' in ort_quant) and calib_images:
+        calibration = prepare_calibration(dataset_dir, data_yaml, calib_split, calib_images, calib_seed,
+                                          cache_dir=os.path.join(output_dir, CALIBRATION_DIR_NAME))
+        data_yaml = calibration['yaml']
     
-    # 导出每种格式
-    for fmt in formats:
-        print(f"\n🔄 导出 {fmt.upper()} 格式...")
+    # 查找缓存
+    weights_hash = file_sha256(model_path)
+    cache_root = os.path.join(output_dir, CACHE_DIR_NAME)
+    jobs = plan_exports(formats, imgsz, int8, half, data_yaml, onnx_profile,
+                        profile_batches, profile_sizes, opset, simplify)
+    if ort_quant:
+        # onnxruntime 量化的输入必须是 FP32 模型
+        for _, export_args, _, _ in jobs:
+            if export_args['format'] == 'onnx':
+                export_args.pop('int8', None)
+                export_args.pop('data', None)
+    exported = {}
+    pending = []
+    
+    for name, export_args, suffix, _ in jobs:
+        cache_dir = os.path.join(cache_root, f"{name}-{export_cache_key(weights_hash, export_args)}")
+        artifact = _cached_artifact(cache_dir) if use_cache else None
+        if artifact:
+            exported[name] = _publish(artifact, output_dir)
+            print(f"\n⚡ {name.upper()} 命中导出缓存: {exported[name]}")
+        else:
+            pending.append((name, export_args, suffix, cache_dir))
+    
+    # 并行导出未命中缓存的任务
+    if pending:
+        workers = workers or len(pending)
+        print(f"\n🔄 导出 {', '.join(name.upper() for name, _, _, _ in pending)} "
+              f"({min(workers, len(pending))} 个进程)...")
         
-        try:
-            export_args = {
-                'format': fmt,
-                'imgsz': imgsz,
-            }
-            
-            # ONNX 特定参数
-            if fmt == 'onnx':
-                export_args['simplify'] = True
-                export_args['opset'] = 12
-                if int8:
-                    export_args['int8'] = True
-                    export_args['data'] = data_yaml
-            
-            # TensorRT 特定参数
-            elif fmt == 'engine':
-                export_args['half'] = half if not int8 else False
-                if int8:
-                    export_args['int8'] = True
-                    export_args['data'] = data_yaml
-            
-            # 执行导出
-            export_path = model.export(**export_args)
+        # ultralytics 的 INT8 校准与 onnxruntime 静态量化共用预处理张量缓存
+        calib_tensors = {}
+        for name, export_args, _, _ in pending:
+            if (export_args['format'] in CACHED_CALIBRATION_FORMATS and export_args.get('int8')
+                    and calibration):
+                calib_tensors[name] = load_calibration_tensors(calibration, export_args['imgsz']).filename
+        
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = {executor.submit(_export_worker, model_path, export_args, cache_dir, suffix,
+                                       calib_tensors.get(name)): name
+                       for name, export_args, suffix, cache_dir in pending}
             
-            # 移动到输出目录
-            if export_path and os.path.exists(export_path):
-                filename = os.path.basename(export_path)
-                new_path = os.path.join(output_dir, filename)
-                os.rename(export_path, new_path)
-                export_path = new_path
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    exported[name] = _publish(future.result(), output_dir)
+                    print(f"✅ {name.upper()} 导出成功: {exported[name]}")
+                except Exception as e:
+                    print(f"❌ {name.upper()} 导出失败: {e}")
+    
+    # 显示文件大小，ONNX 逐个校验 shape 并写出清单
+    for name, export_args, _, shapes in jobs:
+        if name not in exported:
+            continue
+        if os.path.isfile(exported[name]):
+            file_size = os.path.getsize(exported[name]) / (1024 * 1024)
+            print(f"\n📦 {name.upper()}: {exported[name]} ({file_size:.2f} MB)")
+        if shapes:
+            write_shape_manifest(exported[name], onnx_profile, shapes, export_args)
+    
+    # onnxruntime INT8 量化
+    if ort_quant:
+        from onnx_quantize import QUANT_MODES, quantization_report, quantize_onnx
+        
+        for name, export_args, _, shapes in jobs:
+            if export_args['format'] != 'onnx' or name not in exported:
+                continue
+            fp32_path = exported[name]
+            print(f"\n🔄 {name.upper()} onnxruntime INT8 量化: {fp32_path}")
             
-            print(f"✅ {fmt.upper()} 导出成功: {export_path}")
+            variants = {}
+            for mode in ort_quant:
+                try:
+                    tensors = (load_calibration_tensors(calibration, export_args['imgsz'])
+                               if mode == 'static' else None)
+                    variants[mode] = quantize_onnx(fp32_path, mode, tensors)
+                    exported[f"{name}{QUANT_MODES[mode]}"] = variants[mode]
+                    print(f"✅ {mode} 量化成功: {variants[mode]}")
+                    write_shape_manifest(variants[mode], onnx_profile, shapes, export_args)
+                except Exception as e:
+                    print(f"❌ {mode} 量化失败: {e}")
             
-            # 显示文件大小
-            if os.path.exists(export_path):
-                file_size = os.path.getsize(export_path) / (1024 * 1024)
-                print(f"   文件大小: {file_size:.2f} MB")
-        
-        except Exception as e:
-            print(f"❌ {fmt.upper()} 导出失败: {e}")
+            if variants and quant_report:
+                quantization_report(fp32_path, variants, eval_yaml, export_args['imgsz'])
     
     print("\n" + "=" * 70)
     print("✅ 导出完成!")
     print("=" * 70)
+    return exported
+
+
+def benchmark_main(argv):
+    """benchmark 子命令"""
+    from export_benchmark import add_benchmark_arguments, main_from_args
+    
+    parser = argparse.ArgumentParser(prog='export_model.py benchmark',
+                                     description='YOLO12 导出模型基准测试')
+    add_benchmark_arguments(parser)
+    main_from_args(parser.parse_args(argv))
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        benchmark_main(sys.argv[2:])
+        return
+    
     parser = argparse.ArgumentParser(description='YOLO12 模型导出')
     
     # 必需参数
@@ -155,6 +514,30 @@ def main():
                         help='数据集目录 (默认: datasets)')
     parser.add_argument('--output-dir', type=str, default='model_exporter',
                         help='输出目录 (默认: model_exporter)')
+    parser.add_argument('--calib-images', type=int, default=256,
+                        help='INT8 校准图片数量，0 表示使用整个数据集 (默认: 256)')
+    parser.add_argument('--calib-split', type=str, default='train',
+                        help='INT8 校准图片所在的数据划分 (默认: train)')
+    parser.add_argument('--calib-seed', type=int, default=0,
+                        help='INT8 校准抽样的随机种子 (默认: 0)')
+    parser.add_argument('--profile', type=str, default='static', choices=ONNX_PROFILES,
+                        help='ONNX 导出配置: static 单一 shape / dynamic 动态 batch 与尺寸 / multi 多个静态 shape')
+    parser.add_argument('--profile-batches', type=str, default='1,8,32',
+                        help='dynamic / multi 配置的 batch 列表 (默认: 1,8,32)')
+    parser.add_argument('--profile-sizes', type=str, default='320,480,640',
+                        help='dynamic / multi 配置的图像尺寸列表 (默认: 320,480,640)')
+    parser.add_argument('--opset', type=int, default=12,
+                        help='ONNX opset 版本 (默认: 12)')
+    parser.add_argument('--no-simplify', action='store_true',
+                        help='不简化 ONNX 图')
+    parser.add_argument('--ort-quant', type=str, default=None,
+                        help='对导出的 ONNX 做 onnxruntime INT8 量化，多个用逗号分隔 (static,dynamic)')
+    parser.add_argument('--no-quant-report', action='store_true',
+                        help='不生成量化模型与 FP32 的对比报告')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='并行导出进程数 (默认: 每个格式一个进程)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='忽略导出缓存，强制重新导出')
     
     args = parser.parse_args()
     
@@ -170,7 +553,19 @@ def main():
         imgsz=args.imgsz,
         data_yaml=args.data,
         dataset_dir=args.dataset_dir,
-        output_dir=args.output_dir
+        output_dir=args.output_dir,
+        workers=args.workers,
+        use_cache=not args.no_cache,
+        onnx_profile=args.profile,
+        profile_batches=[int(b) for b in args.profile_batches.split(',')],
+        profile_sizes=[int(s) for s in args.profile_sizes.split(',')],
+        opset=args.opset,
+        simplify=not args.no_simplify,
+        calib_images=args.calib_images,
+        calib_split=args.calib_split,
+        calib_seed=args.calib_seed,
+        ort_quant=[m.strip() for m in args.ort_quant.split(',')] if args.ort_quant else (),
+        quant_report=not args.no_quant_report
     )
 
 
@@ -184,6 +579,9 @@ if __name__ == '__main__':
     print("\n📋 量化选项:")
     print("  --int8     - INT8 量化 (速度快，精度略降)")
     print("  --half     - FP16 半精度 (仅 TensorRT)")
+    print("  --ort-quant static,dynamic - onnxruntime INT8 量化 (CPU 部署) + 对比报告")
+    print("\n📋 子命令:")
+    print("  benchmark  - 基准测试导出模型 (python export_model.py benchmark --help)")
     print()
     
     main()
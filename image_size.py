@@ -0,0 +1,267 @@
+"""
+Image size probe
+只解析文件头读取图像宽高 (JPEG / PNG / BMP)，其它格式或解析失败时回退到 PIL
+
+宽高按 EXIF 方向修正（方向 5-8 交换宽高），与 ultralytics 训练、Label Studio 显示
+以及分片索引 (dataset_shards.py) 中的尺寸一致
+
+ImageSizeCache 把结果保存在 SQLite 中，按 (路径, 修改时间, 文件大小) 判断是否失效，
+重复转换同一数据集时完全不需要读取图像文件
+
+Usage:
+    from image_size import ImageSizeCache, read_image_size
+
+    width, height = read_image_size('datasets/train/images/xxx.jpg')
+
+    cache = ImageSizeCache('datasets/.image_sizes.sqlite')
+    width, height = cache.get('datasets/train/images/xxx.jpg')
+    cache.flush()
+"""
+
+import multiprocessing.util
+import os
+import sqlite3
+import struct
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from PIL import Image
+
+
+# 默认缓存文件名（位于数据集根目录）
+SIZE_CACHE_NAME = '.image_sizes.sqlite'
+
+# 缓存格式版本（SQLite user_version）；2: 宽高按 EXIF 方向修正
+SIZE_CACHE_VERSION = 2
+
+# 需要交换宽高的 EXIF 方向
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+# 含图像尺寸的 JPEG SOF 标记（排除 DHT 0xC4、JPG 0xC8、DAC 0xCC）
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                     0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# 没有长度字段的 JPEG 标记
+_JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+
+# 子进程中已打开的缓存：{(pid, SQLite 路径): (连接, 全部记录)}
+# 转换器按块提交任务，每块都会反序列化一次缓存，同一进程只连接、加载一次
+_OPENED = {}
+
+
+def _exif_orientation(segment: bytes) -> int:
+    """APP1 段中 EXIF 的方向标签 (0x0112)，没有时返回 1"""
+    if segment[:6] != b'Exif\x00\x00':
+        return 1
+    tiff = segment[6:]
+    if tiff[:2] == b'II':
+        endian = '<'
+    elif tiff[:2] == b'MM':
+        endian = '>'
+    else:
+        return 1
+    try:
+        ifd = struct.unpack(endian + 'I', tiff[4:8])[0]
+        count = struct.unpack(endian + 'H', tiff[ifd:ifd + 2])[0]
+        for i in range(count):
+            entry = ifd + 2 + i * 12
+            # 标签、类型、个数、值（SHORT 存在值字段的前 2 字节）
+            tag, _, _, value = struct.unpack(endian + 'HHIH', tiff[entry:entry + 10])
+            if tag == 0x0112:
+                return value
+    except struct.error:
+        pass
+    return 1
+
+
+def _jpeg_size(f) -> Optional[Tuple[int, int]]:
+    """逐个跳过 JPEG 段，直到找到 SOF 段；SOF 之前的 EXIF 方向为 5-8 时交换宽高"""
+    f.seek(2)
+    orientation = 1
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':
+            byte = f.read(1)
+        if not byte:
+            return None
+
+        marker = byte[0]
+        if marker in _JPEG_STANDALONE_MARKERS:
+            continue
+        if marker in (0xD9, 0xDA):
+            # 到达图像数据仍未找到 SOF
+            return None
+
+        header = f.read(2)
+        if len(header) < 2:
+            return None
+        length = struct.unpack('>H', header)[0]
+        if marker == 0xE1 and orientation == 1:
+            # APP1：EXIF（也可能是 XMP，这时方向仍为 1）
+            orientation = _exif_orientation(f.read(length - 2))
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack('>xHH', data)
+            return (height, width) if orientation in _TRANSPOSED_ORIENTATIONS else (width, height)
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def _header_size(path: Union[str, Path]) -> Optional[Tuple[int, int]]:
+    """解析文件头，无法识别时返回 None"""
+    with open(path, 'rb') as f:
+        head = f.read(26)
+
+        if head[:2] == b'\xff\xd8':
+            return _jpeg_size(f)
+
+        if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+            return struct.unpack('>II', head[16:24])
+
+        if head[:2] == b'BM' and len(head) >= 26:
+            header_size = struct.unpack('<I', head[14:18])[0]
+            if header_size == 12:
+                # OS/2 BITMAPCOREHEADER
+                return struct.unpack('<HH', head[18:22])
+            width, height = struct.unpack('<ii', head[18:26])
+            # 高度为负表示自上而下存储
+            return abs(width), abs(height)
+
+    return None
+
+
+def read_image_size(path: Union[str, Path]) -> Tuple[int, int]:
+    """
+    读取图像宽高（EXIF 方向修正后）
+
+    Args:
+        path: 图像路径
+
+    Returns:
+        (width, height)
+
+    Raises:
+        无法读取时抛出 OSError / PIL 异常
+    """
+    try:
+        size = _header_size(path)
+    except struct.error:
+        size = None
+    if size and size[0] > 0 and size[1] > 0:
+        return size
+
+    with Image.open(path) as img:
+        width, height = img.size
+        if img.getexif().get(0x0112, 1) in _TRANSPOSED_ORIENTATIONS:
+            return height, width
+        return width, height
+
+
+class ImageSizeCache:
+    """按 (路径, 修改时间, 文件大小) 缓存图像尺寸的 SQLite 索引"""
+
+    def __init__(self, db_path: Union[str, Path]):
+        """
+        Args:
+            db_path: SQLite 文件路径，不存在时自动创建
+        """
+        self.db_path = Path(db_path)
+        self._conn = None
+        self._sizes = None
+        self._pending = []
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        # 传给子进程时不携带连接和已加载的数据，子进程各自打开
+        state = self.__dict__.copy()
+        state.update(_conn=None, _sizes=None, _pending=[])
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # 子进程中复用本进程已打开的连接和已加载的记录
+        key = (os.getpid(), str(self.db_path))
+        if key not in _OPENED:
+            conn, sizes = self._open()
+            _OPENED[key] = (conn, sizes)
+            # 进程池 worker 退出时关闭连接（multiprocessing 子进程不执行 atexit）
+            multiprocessing.util.Finalize(None, conn.close, exitpriority=10)
+        self._conn, self._sizes = _OPENED[key]
+
+    def _open(self):
+        """打开 SQLite 并一次加载全部记录，之后的查询都在内存中完成"""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=60)
+        conn.execute('PRAGMA journal_mode=WAL')
+        if conn.execute('PRAGMA user_version').fetchone()[0] < SIZE_CACHE_VERSION:
+            # 旧版本记录的是未按 EXIF 方向修正的尺寸，全部重新读取
+            with conn:
+                conn.execute('DROP TABLE IF EXISTS sizes')
+                conn.execute(f'PRAGMA user_version = {SIZE_CACHE_VERSION}')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS sizes ('
+            'path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, '
+            'width INTEGER, height INTEGER)'
+        )
+        sizes = {
+            path: (mtime_ns, size, width, height)
+            for path, mtime_ns, size, width, height in conn.execute('SELECT * FROM sizes')
+        }
+        return conn, sizes
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn, self._sizes = self._open()
+        return self._conn
+
+    def get(self, path: Union[str, Path]) -> Tuple[int, int]:
+        """
+        获取图像宽高，缓存失效时读取文件头并记录
+
+        Args:
+            path: 图像路径
+
+        Returns:
+            (width, height)
+        """
+        self._connect()
+        key = os.path.abspath(path)
+        st = os.stat(key)
+
+        cached = self._sizes.get(key)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            self.hits += 1
+            return cached[2], cached[3]
+
+        self.misses += 1
+        width, height = read_image_size(key)
+        self._sizes[key] = (st.st_mtime_ns, st.st_size, width, height)
+        self._pending.append((key, st.st_mtime_ns, st.st_size, width, height))
+        return width, height
+
+    def flush(self):
+        """把新记录写入 SQLite"""
+        if not self._pending:
+            return
+        conn = self._connect()
+        with conn:
+            conn.executemany('INSERT OR REPLACE INTO sizes VALUES (?, ?, ?, ?, ?)', self._pending)
+        self._pending = []
+
+    def close(self):
+        """写入新记录并关闭连接"""
+        if self._conn is not None:
+            self.flush()
+            shared = _OPENED.get((os.getpid(), str(self.db_path)))
+            if shared is not None and shared[0] is self._conn:
+                # 子进程共用的连接在进程退出时关闭
+                self._conn = self._sizes = None
+                return
+            self._conn.close()
+            self._conn = None
+            self._sizes = None
@@ -0,0 +1,436 @@
+"""
+推理数据流水线
+后台线程解码、letterbox 图片，通过有界队列送给模型，使 CPU 预处理与推理重叠执行
+
+使用方式：
+  from inference_pipeline import PrefetchLoader, VideoPipeline, list_images
+
+  # 图片文件夹：批量预取
+  loader = PrefetchLoader(list_images('datasets/test/images'), batch_size=16, workers=4)
+  for batch in loader:
+      inputs = [item.input for item in batch]
+      ...
+
+  # 视频：解码 / 推理 / 编码 三阶段流水线
+  pipeline = VideoPipeline('video.mp4', infer_fn, annotate_fn, output_path='out.mp4')
+  pipeline.run()
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+# 支持的图像格式
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.webp'}
+
+# 单张已加载图片
+#   path:  图片路径
+#   image: 原图 (BGR)
+#   input: letterbox 后送入模型的图像 (BGR)
+#   ratio: 缩放比例
+#   pad:   (左, 上) 填充像素
+LoadedImage = namedtuple('LoadedImage', ['path', 'image', 'input', 'ratio', 'pad'])
+
+
+def _put(q, item, stop):
+    """队列满时阻塞等待，但能响应停止信号；放入成功返回 True"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    """阻塞取出一项，收到停止信号时返回 None"""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return None
+
+
+def list_images(folder_path):
+    """
+    按文件名排序列出文件夹中的图片
+
+    Args:
+        folder_path: 图片文件夹路径
+
+    Returns:
+        图片路径列表
+    """
+    with os.scandir(folder_path) as entries:
+        paths = [entry.path for entry in entries
+                 if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS]
+    return sorted(paths)
+
+
+def letterbox(image, new_shape=640, color=(114, 114, 114)):
+    """
+    等比缩放并居中填充到 new_shape (与 ultralytics LetterBox 的取整方式一致)
+
+    Args:
+        image: BGR 图像
+        new_shape: 目标尺寸，int 或 (高, 宽)
+        color: 填充颜色
+
+    Returns:
+        (letterbox 后的图像, 缩放比例, (左填充, 上填充))
+    """
+    if isinstance(new_shape, int):
+        new_shape = (new_shape, new_shape)
+
+    h, w = image.shape[:2]
+    ratio = min(new_shape[0] / h, new_shape[1] / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    dw = (new_shape[1] - new_w) / 2
+    dh = (new_shape[0] - new_h) / 2
+
+    if (w, h) != (new_w, new_h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return image, ratio, (left, top)
+
+
+def scale_boxes(boxes, ratio, pad, orig_shape):
+    """
+    把 letterbox 坐标系下的 xyxy 框映射回原图坐标
+
+    Args:
+        boxes: (N, 4) xyxy 框
+        ratio: letterbox 缩放比例
+        pad: (左填充, 上填充)
+        orig_shape: 原图 (高, 宽)
+
+    Returns:
+        原图坐标系下的 (N, 4) 框
+    """
+    boxes = np.array(boxes, dtype=np.float32, copy=True)
+    boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad[0]) / ratio
+    boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad[1]) / ratio
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, orig_shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, orig_shape[0])
+    return boxes
+
+
+class PrefetchLoader:
+    """
+    有界预取的批量图片加载器
+
+    线程池并行解码 + letterbox，最多提前准备 prefetch 个批次，
+    内存占用与文件夹大小无关
+    """
+
+    def __init__(self, paths, batch_size=16, workers=4, prefetch=2, imgsz=640):
+        """
+        初始化加载器
+
+        Args:
+            paths: 图片路径列表
+            batch_size: 批次大小
+            workers: 解码线程数
+            prefetch: 队列中最多预取的批次数
+            imgsz: letterbox 目标尺寸，None 表示不做 letterbox
+        """
+        self.paths = list(paths)
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.prefetch = max(1, prefetch)
+        self.imgsz = imgsz
+
+    def __len__(self):
+        return (len(self.paths) + self.batch_size - 1) // self.batch_size
+
+    def _load(self, path):
+        """解码单张图片，失败时返回 None"""
+        image = cv2.imread(path)
+        if image is None:
+            print(f"⚠️  无法读取图片: {path}")
+            return None
+
+        if self.imgsz is None:
+            return LoadedImage(path, image, image, 1.0, (0, 0))
+
+        inp, ratio, pad = letterbox(image, self.imgsz)
+        return LoadedImage(path, image, inp, ratio, pad)
+
+    def __iter__(self):
+        batches = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='prefetch')
+
+        def produce():
+            for start in range(0, len(self.paths), self.batch_size):
+                chunk = self.paths[start:start + self.batch_size]
+                futures = [executor.submit(self._load, p) for p in chunk]
+                if not _put(batches, futures, stop):
+                    for f in futures:
+                        f.cancel()
+                    return
+            _put(batches, None, stop)
+
+        producer = threading.Thread(target=produce, name='prefetch-producer', daemon=True)
+        producer.start()
+
+        try:
+            while True:
+                futures = batches.get()
+                if futures is None:
+                    break
+                batch = [item for item in (f.result() for f in futures) if item is not None]
+                if batch:
+                    yield batch
+        finally:
+            stop.set()
+            producer.join()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_detections(model, paths, conf_threshold=0.25, imgsz=640, batch_size=16, workers=4,
+                    prefetch=2):
+    """
+    批量、流式地对图片列表推理
+
+    Args:
+        model: YOLO 模型或 OnnxDetector（OnnxDetector 使用模型自身的输入尺寸）
+        paths: 图片路径列表
+        conf_threshold: 置信度阈值
+        imgsz: 推理尺寸
+        batch_size: 批次大小
+        workers: 解码线程数
+        prefetch: 预取批次数
+
+    Yields:
+        (LoadedImage, (N, 6) 数组 [x1, y1, x2, y2, conf, cls]，原图坐标)
+    """
+    is_onnx = hasattr(model, 'detect_letterboxed')
+    if is_onnx:
+        imgsz = model.imgsz
+
+    loader = PrefetchLoader(paths, batch_size=batch_size, workers=workers,
+                            prefetch=prefetch, imgsz=imgsz)
+
+    for batch in loader:
+        inputs = [item.input for item in batch]
+        if is_onnx:
+            detections = model.detect_letterboxed(inputs, conf=conf_threshold)
+        else:
+            # 输入已 letterbox 到 imgsz，predictor 内部不会再缩放
+            preds = model.predict(source=inputs, conf=conf_threshold, imgsz=imgsz, verbose=False)
+            detections = [pred.boxes.data.cpu().numpy() for pred in preds]
+
+        for item, data in zip(batch, detections):
+            if len(data):
+                data[:, :4] = scale_boxes(data[:, :4], item.ratio, item.pad, item.image.shape[:2])
+            yield item, data
+
+
+class StageTimer:
+    """流水线单个阶段的耗时统计"""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+
+    @property
+    def avg_ms(self):
+        return self.total / self.count * 1000 if self.count else 0.0
+
+    @property
+    def fps(self):
+        return self.count / self.total if self.total else 0.0
+
+    def __str__(self):
+        return f"{self.name}: {self.avg_ms:.1f} ms/帧 ({self.fps:.1f} FPS, {self.count} 帧)"
+
+
+def is_live_source(source):
+    """摄像头编号或网络流视为实时源"""
+    source = str(source)
+    return source.isdigit() or source.lower().startswith(('rtsp://', 'rtmp://', 'http://', 'https://'))
+
+
+class VideoPipeline:
+    """
+    视频推理三阶段流水线
+
+      读取线程 --(有界队列)--> 推理 (调用线程) --(有界队列)--> 写入线程
+
+    OpenCV 解码、绘制与编码和模型推理重叠执行。
+    实时源在推理跟不上时丢弃最旧的帧，文件源则阻塞等待，不丢帧。
+    """
+
+    def __init__(self, source, infer_fn, annotate_fn=None, output_path=None,
+                 queue_size=8, drop_frames=None):
+        """
+        初始化流水线
+
+        Args:
+            source: 视频路径、摄像头编号或网络流地址
+            infer_fn: 推理函数 frame -> result
+            annotate_fn: 绘制函数 (frame, result) -> frame，None 表示写入原始帧
+            output_path: 输出视频路径，None 表示不写文件
+            queue_size: 各阶段之间队列的容量
+            drop_frames: 队列满时是否丢帧，None 表示实时源丢帧、文件源不丢
+        """
+        self.source = source
+        self.infer_fn = infer_fn
+        self.annotate_fn = annotate_fn
+        self.output_path = output_path
+        self.queue_size = max(1, queue_size)
+        self.drop_frames = is_live_source(source) if drop_frames is None else drop_frames
+
+        self.timers = {
+            'decode': StageTimer('解码'),
+            'infer': StageTimer('推理'),
+            'encode': StageTimer('绘制+编码'),
+        }
+        self.dropped = 0
+        self.fps = 30.0
+        self._errors = []
+
+    def _open(self):
+        source = int(self.source) if str(self.source).isdigit() else self.source
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            raise IOError(f"无法打开视频源: {self.source}")
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        return cap
+
+    def _guard(self, target, stop):
+        """线程异常时记录并通知其它阶段停止"""
+        def run(*args):
+            try:
+                target(*args)
+            except Exception as e:
+                self._errors.append(e)
+                stop.set()
+        return run
+
+    def _read(self, cap, frames, stop):
+        try:
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                self.timers['decode'].add(time.perf_counter() - t0)
+
+                if self.drop_frames:
+                    # 推理跟不上时丢弃最旧的帧，保证延迟不累积
+                    while True:
+                        try:
+                            frames.put_nowait(frame)
+                            break
+                        except queue.Full:
+                            try:
+                                frames.get_nowait()
+                                self.dropped += 1
+                            except queue.Empty:
+                                pass
+                elif not _put(frames, frame, stop):
+                    break
+        finally:
+            cap.release()
+            _put(frames, None, stop)
+
+    def _write(self, results, stop):
+        writer = None
+        try:
+            while True:
+                item = _get(results, stop)
+                if item is None:
+                    break
+                frame, result = item
+
+                t0 = time.perf_counter()
+                if self.annotate_fn is not None:
+                    frame = self.annotate_fn(frame, result)
+                if self.output_path:
+                    if writer is None:
+                        h, w = frame.shape[:2]
+                        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+                        writer = cv2.VideoWriter(self.output_path, cv2.VideoWriter_fourcc(*'mp4v'),
+                                                 self.fps, (w, h))
+                    writer.write(frame)
+                self.timers['encode'].add(time.perf_counter() - t0)
+        finally:
+            if writer is not None:
+                writer.release()
+
+    def run(self, progress_every=30):
+        """
+        运行流水线直到视频结束
+
+        Args:
+            progress_every: 每处理多少帧打印一次进度，0 表示不打印
+
+        Returns:
+            推理的帧数
+        """
+        cap = self._open()
+        frames = queue.Queue(maxsize=self.queue_size)
+        results = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+
+        reader = threading.Thread(target=self._guard(self._read, stop), args=(cap, frames, stop),
+                                  name='video-reader', daemon=True)
+        writer = threading.Thread(target=self._guard(self._write, stop), args=(results, stop),
+                                  name='video-writer', daemon=True)
+        reader.start()
+        writer.start()
+
+        frame_count = 0
+        try:
+            while True:
+                frame = _get(frames, stop)
+                if frame is None:
+                    break
+
+                t0 = time.perf_counter()
+                result = self.infer_fn(frame)
+                self.timers['infer'].add(time.perf_counter() - t0)
+
+                if not _put(results, (frame, result), stop):
+                    break
+                frame_count += 1
+                if progress_every and frame_count % progress_every == 0:
+                    print(f"已处理 {frame_count} 帧... ({self.timers['infer'].fps:.1f} FPS)")
+
+            _put(results, None, stop)
+            writer.join()
+        finally:
+            stop.set()
+            reader.join()
+            writer.join()
+
+        if self._errors:
+            raise self._errors[0]
+        return frame_count
+
+    def print_stats(self):
+        """打印各阶段耗时统计"""
+        print("\n⏱️  流水线各阶段耗时:")
+        for timer in self.timers.values():
+            print(f"  {timer}")
+        if self.dropped:
+            print(f"  丢弃帧数: {self.dropped}")
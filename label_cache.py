@@ -0,0 +1,306 @@
+"""
+YOLO label loader
+用 NumPy 把整个标签文件解析为 (N, 5) float32 数组 [class_id, x_center, y_center, width, height]，
+并把一个划分的全部标签合并缓存为单个 .npz（偏移量 + 所有框）
+
+缓存按每个标签文件的 (修改时间, 文件大小) 失效，只重新解析变化的文件；
+转换器、校准集选择、数据集统计共用同一份缓存
+
+无法解析的行 (非数字、NaN / inf、少于 5 列) 被跳过，不会中断整个划分的加载；
+每个文件跳过的行数记录在缓存中，见 LabelCache.malformed_files()
+
+Usage:
+    from label_cache import LabelCache, parse_label_file
+
+    boxes = parse_label_file('datasets/train/labels/xxx.txt')     # (N, 5) float32
+
+    cache = LabelCache.load('datasets/train/labels')
+    boxes = cache.get('xxx')                                        # 同上，不读文件
+    for stem, boxes in cache.items():
+        ...
+"""
+
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+
+# 缓存文件名后缀：datasets/train/labels -> datasets/train/labels.index.npz
+CACHE_SUFFIX = '.index.npz'
+
+CACHE_VERSION = 2
+
+# 需要重新解析的文件超过这个数量时使用进程池
+PARALLEL_THRESHOLD = 2000
+
+_EMPTY = np.zeros((0, 5), dtype=np.float32)
+
+
+def _parse_row(row: List[str]) -> Optional[List[float]]:
+    """一行的前 5 列，无法解析或不是有限值时返回 None"""
+    if len(row) < 5:
+        return None
+    try:
+        values = [float(v) for v in row[:5]]
+    except ValueError:
+        return None
+    return values if all(math.isfinite(v) for v in values) else None
+
+
+def check_label_text(text: str) -> Tuple[np.ndarray, int]:
+    """
+    解析标签文件内容，并统计无法解析的行
+
+    每行 class x_center y_center width height；多于 5 列 (如分割多边形) 时只取前 5 列，
+    少于 5 列、含非数字或 NaN / inf 的行跳过
+
+    Returns:
+        ((N, 5) float32 数组, 跳过的行数)
+    """
+    rows = [tokens for tokens in (line.split() for line in text.splitlines()) if tokens]
+    if not rows:
+        return _EMPTY, 0
+
+    # 逐行检查列数：只比较总数时，4 列和 6 列的两行会错位拼成两个框
+    if all(len(row) == 5 for row in rows):
+        # 常见情况：每行恰好 5 列，一次转换
+        try:
+            boxes = np.array(rows, dtype=np.float32)
+        except ValueError:
+            boxes = None
+        if boxes is not None and np.isfinite(boxes).all():
+            return boxes, 0
+
+    # 逐行解析，跳过坏行
+    parsed = [values for values in map(_parse_row, rows) if values is not None]
+    boxes = np.array(parsed, dtype=np.float32) if parsed else _EMPTY
+    return boxes, len(rows) - len(parsed)
+
+
+def parse_label_text(text: str) -> np.ndarray:
+    """
+    解析标签文件内容，无法解析的行跳过 (见 check_label_text)
+
+    Returns:
+        (N, 5) float32 数组
+    """
+    return check_label_text(text)[0]
+
+
+def check_label_file(path: Union[str, Path]) -> Tuple[np.ndarray, int]:
+    """
+    读取并解析一个标签文件，文件不存在时返回空数组
+
+    Returns:
+        ((N, 5) float32 数组, 跳过的行数)
+    """
+    try:
+        # 非 UTF-8 字节替换为 U+FFFD，所在的行按坏行跳过
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return check_label_text(f.read())
+    except FileNotFoundError:
+        return _EMPTY, 0
+
+
+def parse_label_file(path: Union[str, Path]) -> np.ndarray:
+    """
+    读取并解析一个标签文件，文件不存在时返回空数组，无法解析的行跳过
+
+    Returns:
+        (N, 5) float32 数组
+    """
+    return check_label_file(path)[0]
+
+
+def _parse_many(paths: List[str]) -> List[Tuple[np.ndarray, int]]:
+    return [check_label_file(path) for path in paths]
+
+
+def _scan(labels_dir: Path) -> Dict[str, Tuple[int, int]]:
+    """{文件名主干: (mtime_ns, size)}"""
+    states = {}
+    with os.scandir(labels_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith('.txt') and entry.is_file():
+                st = entry.stat()
+                states[entry.name[:-4]] = (st.st_mtime_ns, st.st_size)
+    return states
+
+
+class LabelCache:
+    """一个划分 (labels 目录) 的全部标签"""
+
+    def __init__(self, labels_dir: Union[str, Path], stems: np.ndarray, states: np.ndarray,
+                 offsets: np.ndarray, boxes: np.ndarray, malformed: np.ndarray):
+        """
+        Args:
+            labels_dir: 标签目录
+            stems: (F,) 文件名主干，已排序
+            states: (F, 2) int64 [mtime_ns, size]
+            offsets: (F + 1,) int64，第 i 个文件的框为 boxes[offsets[i]:offsets[i + 1]]
+            boxes: (M, 5) float32
+            malformed: (F,) int64 每个文件跳过的坏行数
+        """
+        self.labels_dir = Path(labels_dir)
+        self.stems = stems
+        self.states = states
+        self.offsets = offsets
+        self.boxes = boxes
+        self.malformed = malformed
+        self._index = {stem: i for i, stem in enumerate(stems.tolist())}
+
+    @staticmethod
+    def cache_path(labels_dir: Union[str, Path]) -> Path:
+        labels_dir = Path(labels_dir)
+        return labels_dir.with_name(labels_dir.name + CACHE_SUFFIX)
+
+    @classmethod
+    def _read(cls, labels_dir: Path) -> Optional['LabelCache']:
+        path = cls.cache_path(labels_dir)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data['version']) != CACHE_VERSION:
+                    return None
+                return cls(labels_dir, data['stems'], data['states'], data['offsets'], data['boxes'],
+                           data['malformed'])
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None
+
+    def save(self):
+        """原子写出缓存文件"""
+        path = self.cache_path(self.labels_dir)
+        tmp_path = path.with_name(path.name + '.tmp.npz')
+        np.savez(tmp_path, version=np.int64(CACHE_VERSION), stems=self.stems, states=self.states,
+                 offsets=self.offsets, boxes=self.boxes, malformed=self.malformed)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, labels_dir: Union[str, Path], workers: Optional[int] = None,
+             verbose: bool = True) -> 'LabelCache':
+        """
+        加载标签缓存；文件有增删改时只重新解析变化的文件并更新缓存
+
+        Args:
+            labels_dir: 标签目录
+            workers: 解析进程数，默认 CPU 核数（变化的文件较少时在当前进程解析）
+            verbose: 是否打印缓存状态
+
+        Returns:
+            LabelCache
+        """
+        labels_dir = Path(labels_dir)
+        current = _scan(labels_dir) if labels_dir.exists() else {}
+        cached = cls._read(labels_dir)
+
+        reused = {}
+        if cached is not None:
+            for i, stem in enumerate(cached.stems.tolist()):
+                state = current.get(stem)
+                if state is not None and tuple(cached.states[i]) == state:
+                    reused[stem] = (cached.boxes[cached.offsets[i]:cached.offsets[i + 1]],
+                                    int(cached.malformed[i]))
+
+        stale = sorted(stem for stem in current if stem not in reused)
+        removed = sum(stem not in current for stem in cached._index) if cached is not None else 0
+
+        if cached is not None and not stale and not removed:
+            if verbose:
+                print(f"Label cache: {len(reused)} files from {cls.cache_path(labels_dir)}")
+                cached._warn_malformed()
+            return cached
+
+        paths = [str(labels_dir / f"{stem}.txt") for stem in stale]
+        workers = workers or os.cpu_count() or 1
+        if len(paths) >= PARALLEL_THRESHOLD and workers > 1:
+            chunk = (len(paths) + workers * 4 - 1) // (workers * 4)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                parsed = [result for part in executor.map(_parse_many, [paths[i:i + chunk]
+                                                                         for i in range(0, len(paths), chunk)])
+                          for result in part]
+        else:
+            parsed = _parse_many(paths)
+        reused.update(zip(stale, parsed))
+
+        stems = sorted(current)
+        arrays = [reused[stem][0] for stem in stems]
+        malformed = np.array([reused[stem][1] for stem in stems], dtype=np.int64)
+        counts = np.array([len(a) for a in arrays], dtype=np.int64)
+        offsets = np.zeros(len(stems) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        boxes = np.concatenate(arrays) if arrays else _EMPTY
+        states = np.array([current[stem] for stem in stems], dtype=np.int64).reshape(-1, 2)
+
+        cache = cls(labels_dir, np.array(stems, dtype=str), states, offsets,
+                    boxes.astype(np.float32, copy=False), malformed)
+        if labels_dir.exists():
+            cache.save()
+        if verbose:
+            print(f"Label cache: parsed {len(stale)} files, reused {len(stems) - len(stale)}, "
+                  f"removed {removed} ({cls.cache_path(labels_dir)})")
+            cache._warn_malformed()
+        return cache
+
+    def _warn_malformed(self):
+        bad = self.malformed_files()
+        if bad:
+            examples = ', '.join(f"{stem}.txt" for stem, _ in bad[:3])
+            print(f"Warning: Skipped {sum(n for _, n in bad)} malformed lines in {len(bad)} label files "
+                  f"({examples}{', ...' if len(bad) > 3 else ''})")
+
+    def malformed_files(self) -> List[Tuple[str, int]]:
+        """[(文件名主干, 跳过的坏行数), ...]，按文件名顺序"""
+        return [(str(self.stems[i]), int(self.malformed[i])) for i in np.flatnonzero(self.malformed)]
+
+    def __getstate__(self):
+        # 传给子进程时只携带路径，子进程直接读取父进程已更新的缓存文件
+        return {'labels_dir': self.labels_dir}
+
+    def __setstate__(self, state):
+        loaded = _LOADED.get(state['labels_dir'])
+        if loaded is None:
+            loaded = self._read(state['labels_dir'])
+            if loaded is None:
+                raise RuntimeError(f"Label cache missing for {state['labels_dir']}")
+            _LOADED[state['labels_dir']] = loaded
+        self.__dict__.update(loaded.__dict__)
+
+    def __len__(self) -> int:
+        return len(self.stems)
+
+    def __contains__(self, stem: str) -> bool:
+        return stem in self._index
+
+    def get(self, stem: str) -> np.ndarray:
+        """某个文件的框，文件不存在时返回空数组"""
+        i = self._index.get(stem)
+        if i is None:
+            return _EMPTY
+        return self.boxes[self.offsets[i]:self.offsets[i + 1]]
+
+    def read(self, label_path: Union[str, Path]) -> np.ndarray:
+        """按路径读取：在本缓存目录中则查缓存，否则直接解析文件"""
+        label_path = Path(label_path)
+        if label_path.parent == self.labels_dir:
+            return self.get(label_path.stem)
+        return parse_label_file(label_path)
+
+    def counts(self) -> np.ndarray:
+        """(F,) 每个文件的框数"""
+        return np.diff(self.offsets)
+
+    def file_index(self) -> np.ndarray:
+        """(M,) 每个框所属文件的下标"""
+        return np.repeat(np.arange(len(self.stems)), self.counts())
+
+    def items(self) -> Iterator[Tuple[str, np.ndarray]]:
+        """按文件名顺序遍历 (文件名主干, 框)"""
+        for i, stem in enumerate(self.stems.tolist()):
+            yield stem, self.boxes[self.offsets[i]:self.offsets[i + 1]]
+
+
+# 子进程中已加载的缓存
+_LOADED = {}
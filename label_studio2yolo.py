@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Label Studio to YOLO Converter
+将Label Studio导出的标注(JSON / JSONL)转换回YOLO格式的标签文件
+
+- 流式解析导出文件，不把整个导出读入内存
+- 图像地址 /data/local-files/?d=train/images/xxx.jpg 映射回 <project-root>/train/labels/xxx.txt
+- 并行写出标签文件，原子替换；内容未变化的文件不写，保留修改时间（训练的标签缓存不会失效）
+
+Usage:
+    python label_studio2yolo.py --input reviewed.json
+    python label_studio2yolo.py --input reviewed.jsonl.gz --project-root ./datasets --workers 16
+    python label_studio2yolo.py --input reviewed.json --dry-run
+"""
+
+import argparse
+import gzip
+import json
+import math
+import os
+import tempfile
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+from label_studio_io import iter_json_array, load_config
+
+
+# Label Studio 本地文件地址前缀
+LOCAL_FILES_PREFIX = '/data/local-files/'
+
+# 与已有标签比较时允许的坐标误差（已有文件可能使用不同的小数位数）
+COORD_TOLERANCE = 5e-6
+
+
+def iter_export(path: Path) -> Iterator[Dict[str, Any]]:
+    """
+    流式读取Label Studio导出文件 (.json / .jsonl，可为 .gz)
+
+    Args:
+        path: 导出文件路径
+
+    Yields:
+        任务字典
+    """
+    path = Path(path)
+    compressed = path.suffix == '.gz'
+    is_jsonl = (path.with_suffix('') if compressed else path).suffix == '.jsonl'
+
+    with (gzip.open(path, 'rt', encoding='utf-8') if compressed
+          else open(path, 'r', encoding='utf-8')) as f:
+        if is_jsonl:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from iter_json_array(f)
+
+
+def image_url_to_path(image_url: str, project_root: Path) -> Optional[Path]:
+    """
+    把 /data/local-files/?d=train/images/xxx.jpg 映射为数据集中的图像路径
+
+    Returns:
+        图像路径（已解析 .. 和符号链接）；不是本地文件地址时返回 None
+
+    Raises:
+        ValueError: 路径不在 project_root 之内（导出文件不可信，如 ?d=../../tmp/x.jpg）
+    """
+    parsed = urlparse(image_url)
+    if not parsed.path.startswith(LOCAL_FILES_PREFIX):
+        return None
+    relative = parse_qs(parsed.query).get('d')
+    if not relative:
+        return None
+    root = project_root.resolve()
+    path = (root / unquote(relative[0]).lstrip('/')).resolve()
+    if not path.is_relative_to(root):
+        raise ValueError(f"{image_url} points outside the project root {root}")
+    return path
+
+
+def label_path_for(image_path: Path) -> Path:
+    """图像路径 .../images/xxx.jpg 对应的标签路径 .../labels/xxx.txt"""
+    parts = list(image_path.parts)
+    for i in range(len(parts) - 2, -1, -1):
+        if parts[i] == 'images':
+            parts[i] = 'labels'
+            return Path(*parts).with_suffix('.txt')
+    return image_path.with_suffix('.txt')
+
+
+class LabelStudioToYoloConverter:
+    """Label Studio格式到YOLO格式的转换器"""
+
+    def __init__(self, project_root: str, class_names: List[str]):
+        """
+        初始化转换器
+
+        Args:
+            project_root: Label Studio本地文件根目录 (即数据集根目录)
+            class_names: 类别名称列表
+        """
+        self.project_root = Path(project_root)
+        self.class_names = class_names
+        self.class_ids = {name: idx for idx, name in enumerate(class_names)}
+        self.stats = Counter()
+
+    @staticmethod
+    def select_annotation(task: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """选择任务中最近一次未取消的标注；没有人工标注时返回 None"""
+        annotations = [a for a in task.get('annotations', []) if not a.get('was_cancelled')]
+        if not annotations:
+            return None
+        return max(annotations, key=lambda a: (a.get('updated_at') or a.get('created_at') or '',
+                                               a.get('id') or 0))
+
+    def label_studio_to_yolo_bbox(self, result: Dict[str, Any]) -> Optional[Tuple[float, float, float, float]]:
+        """
+        将Label Studio格式的边界框(百分比)转换为YOLO格式(归一化中心点)
+
+        带旋转的框 (绕左上角旋转) 使用 original_width / original_height 换算到像素坐标，
+        取其外接矩形
+
+        Args:
+            result: 标注结果 (type=rectanglelabels)
+
+        Returns:
+            (x_center, y_center, width, height)；宽高为负的无效框返回 None
+        """
+        value = result['value']
+        x, y = value['x'] / 100, value['y'] / 100
+        w, h = value['width'] / 100, value['height'] / 100
+        rotation = value.get('rotation', 0) or 0
+
+        if rotation:
+            img_w = result.get('original_width') or 1
+            img_h = result.get('original_height') or 1
+            angle = math.radians(rotation)
+            cos, sin = math.cos(angle), math.sin(angle)
+            px, py, pw, ph = x * img_w, y * img_h, w * img_w, h * img_h
+            xs = [px + dx * cos - dy * sin for dx, dy in ((0, 0), (pw, 0), (pw, ph), (0, ph))]
+            ys = [py + dx * sin + dy * cos for dx, dy in ((0, 0), (pw, 0), (pw, ph), (0, ph))]
+            x, y = min(xs) / img_w, min(ys) / img_h
+            w, h = (max(xs) - min(xs)) / img_w, (max(ys) - min(ys)) / img_h
+
+        if w < 0 or h < 0:
+            return None
+        return x + w / 2, y + h / 2, w, h
+
+    def convert_task(self, task: Dict[str, Any]) -> Optional[Tuple[Path, List[Tuple[int, float, float, float, float]]]]:
+        """
+        转换单个任务
+
+        Args:
+            task: Label Studio任务
+
+        Returns:
+            (标签文件路径, [(class_id, x_center, y_center, width, height), ...])；
+            无法映射或没有人工标注时返回 None
+        """
+        image_url = task.get('data', {}).get('image', '')
+        try:
+            image_path = image_url_to_path(image_url, self.project_root)
+        except ValueError as e:
+            print(f"Warning: Skipped task {task.get('id')}: {e}")
+            self.stats['skipped_outside_root'] += 1
+            return None
+        if image_path is None:
+            self.stats['skipped_url'] += 1
+            return None
+
+        annotation = self.select_annotation(task)
+        if annotation is None:
+            self.stats['skipped_unannotated'] += 1
+            return None
+
+        boxes = []
+        for result in annotation.get('result', []):
+            if result.get('type') != 'rectanglelabels':
+                continue
+            labels = result['value'].get('rectanglelabels') or []
+            if not labels or labels[0] not in self.class_ids:
+                print(f"Warning: Unknown label {labels} in {image_url}")
+                self.stats['unknown_labels'] += 1
+                continue
+            bbox = self.label_studio_to_yolo_bbox(result)
+            if bbox is None:
+                self.stats['degenerate_boxes'] += 1
+                continue
+            boxes.append((self.class_ids[labels[0]],) + bbox)
+
+        self.stats['boxes'] += len(boxes)
+        return label_path_for(image_path), boxes
+
+
+def _same_boxes(text: str, boxes: List[Tuple[int, float, float, float, float]]) -> bool:
+    """已有标签内容与新框是否一致（坐标允许 COORD_TOLERANCE 误差）"""
+    rows = [line.split() for line in text.splitlines() if line.strip()]
+    if len(rows) != len(boxes):
+        return False
+    for row, box in zip(rows, boxes):
+        if len(row) < 5 or int(row[0]) != box[0]:
+            return False
+        if any(abs(float(a) - b) > COORD_TOLERANCE for a, b in zip(row[1:5], box[1:])):
+            return False
+    return True
+
+
+def write_label(label_path: Path, boxes: List[Tuple[int, float, float, float, float]],
+                dry_run: bool = False) -> str:
+    """
+    写出一个YOLO标签文件；内容未变化时不写
+
+    Returns:
+        'created' / 'updated' / 'unchanged'
+    """
+    content = ''.join(f"{c} {xc:.6f} {yc:.6f} {w:.6f} {h:.6f}\n" for c, xc, yc, w, h in boxes)
+
+    try:
+        with open(label_path, 'r') as f:
+            existing = f.read()
+    except FileNotFoundError:
+        existing = None
+
+    if existing is not None and (existing == content or _same_boxes(existing, boxes)):
+        return 'unchanged'
+    if dry_run:
+        return 'created' if existing is None else 'updated'
+
+    # 先写临时文件再原子替换，中断时不会留下写了一半的标签
+    label_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=label_path.parent, prefix=f".{label_path.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, label_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return 'created' if existing is None else 'updated'
+
+
+def convert_export(converter: LabelStudioToYoloConverter, export_path: Path, workers: int = 8,
+                   dry_run: bool = False) -> Counter:
+    """
+    流式转换整个导出文件
+
+    标签文件的读取、比较和写出是 I/O 密集操作，在线程池中并行；
+    同时进行中的写出数量有上限，内存不随导出大小增长
+
+    Args:
+        converter: 转换器
+        export_path: 导出文件路径
+        workers: 写出线程数
+        dry_run: 只统计，不写文件
+
+    Returns:
+        统计信息
+    """
+    results = Counter()
+    pending = deque()
+    max_pending = workers * 64
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for task in iter_export(export_path):
+            converter.stats['tasks'] += 1
+            converted = converter.convert_task(task)
+            if converted is None:
+                continue
+            pending.append(executor.submit(write_label, *converted, dry_run))
+            if len(pending) >= max_pending:
+                results[pending.popleft().result()] += 1
+
+            if converter.stats['tasks'] % 1000 == 0:
+                print(f"Processed {converter.stats['tasks']} tasks...")
+
+        while pending:
+            results[pending.popleft().result()] += 1
+
+    return results + converter.stats
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description='Convert Label Studio exports back to YOLO label files',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # 把审核后的导出写回 datasets/ 下的标签文件
+  python label_studio2yolo.py --input reviewed.json
+
+  # JSONL / gzip 导出，16个线程写出
+  python label_studio2yolo.py --input reviewed.jsonl.gz --workers 16
+
+  # 只统计会修改哪些文件
+  python label_studio2yolo.py --input reviewed.json --dry-run
+        """
+    )
+
+    parser.add_argument(
+        '--input',
+        type=str,
+        required=True,
+        help='Label Studio export file (.json / .jsonl, optionally .gz)'
+    )
+
+    parser.add_argument(
+        '--config',
+        type=str,
+        default='./datasets/data.yaml',
+        help='Path to data.yaml config file (default: ./datasets/data.yaml)'
+    )
+
+    parser.add_argument(
+        '--project-root',
+        type=str,
+        default='./datasets',
+        help='Label Studio local files root / dataset root (default: ./datasets)'
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=8,
+        help='Number of threads writing label files (default: 8)'
+    )
+
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Report what would change without writing any files'
+    )
+
+    args = parser.parse_args()
+
+    export_path = Path(args.input)
+    if not export_path.exists():
+        print(f"Error: Export file not found: {export_path}")
+        return
+
+    config_path = Path(args.config)
+    if not config_path.exists():
+        print(f"Error: Config file not found: {config_path}")
+        return
+
+    print(f"Loading config from: {config_path}")
+    class_names = load_config(config_path).get('names', [])
+    if not class_names:
+        print("Error: No class names found in config")
+        return
+    print(f"Classes: {class_names}")
+    print(f"Project root: {args.project_root}")
+
+    converter = LabelStudioToYoloConverter(args.project_root, class_names)
+
+    print(f"\nConverting {export_path}{' (dry run)' if args.dry_run else ''}...")
+    stats = convert_export(converter, export_path, args.workers, args.dry_run)
+
+    print(f"\n✓ Processed {stats['tasks']} tasks")
+    print(f"\nStatistics:")
+    print(f"  Label files created: {stats['created']}")
+    print(f"  Label files updated: {stats['updated']}")
+    print(f"  Label files unchanged: {stats['unchanged']}")
+    print(f"  Total boxes: {stats['boxes']}")
+    if stats['skipped_unannotated']:
+        print(f"  Skipped (no annotations): {stats['skipped_unannotated']}")
+    if stats['skipped_url']:
+        print(f"  Skipped (not a local-files image URL): {stats['skipped_url']}")
+    if stats['skipped_outside_root']:
+        print(f"  Skipped (path outside project root): {stats['skipped_outside_root']}")
+    if stats['unknown_labels']:
+        print(f"  Unknown labels: {stats['unknown_labels']}")
+    if stats['degenerate_boxes']:
+        print(f"  Invalid boxes dropped: {stats['degenerate_boxes']}")
+
+
+if __name__ == '__main__':
+    main()
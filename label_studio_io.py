@@ -0,0 +1,106 @@
+"""
+Label Studio I/O helpers
+yolo2label_studio.py 与 label_studio2yolo.py 共用的读取函数：数据集配置、流式 JSON 数组解析
+
+Usage:
+    from label_studio_io import iter_json_array, load_config
+
+    class_names = load_config('datasets/data.yaml').get('names', [])
+    with open('reviewed.json', 'r', encoding='utf-8') as f:
+        for task in iter_json_array(f):
+            ...
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, Union
+
+import yaml
+
+
+# 流式读取的块大小
+READ_CHUNK_SIZE = 1 << 20
+
+
+def load_config(config_path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    加载YOLO数据集配置文件
+
+    Args:
+        config_path: data.yaml配置文件路径
+
+    Returns:
+        配置字典
+    """
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    return config
+
+
+def iter_json_array(f, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Any]:
+    """
+    增量解析顶层JSON数组，逐个返回数组元素
+
+    元素之间必须恰好有一个 ','；缺少分隔符 ([1 2])、连续分隔符 ([1,,2])、
+    首尾多余的分隔符 ([,1] / [1,]) 都会报错。空文件视为空数组
+
+    Args:
+        f: 文本模式打开的文件
+        chunk_size: 每次读取的字符数
+
+    Yields:
+        数组元素
+
+    Raises:
+        ValueError: 不是JSON数组或格式错误（json.JSONDecodeError 是 ValueError 的子类）
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    # 下一个期望的记号：'[' 数组起始；'first' 第一个元素或 ']'；'item' 元素；'separator' ',' 或 ']'
+    expect = '['
+
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+
+        if pos < len(buffer):
+            char = buffer[pos]
+            if expect == '[':
+                if char != '[':
+                    raise ValueError("Label Studio export must be a JSON array")
+                expect = 'first'
+                pos += 1
+                continue
+            if char == ']' and expect in ('first', 'separator'):
+                return
+            if expect == 'separator':
+                if char != ',':
+                    raise ValueError(f"Expected ',' or ']' between JSON array elements, got {char!r}")
+                expect = 'item'
+                pos += 1
+                continue
+            if char in ',]':
+                raise ValueError(f"Unexpected {char!r} in JSON array")
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # 数字等标量可能被块边界截断，需要确认后面紧跟分隔符
+                if eof or (end < len(buffer) and buffer[end] in ' \t\r\n,]'):
+                    yield item
+                    pos = end
+                    expect = 'separator'
+                    continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+
+        if eof:
+            if expect != '[':
+                raise ValueError("Unexpected end of JSON array")
+            return
+
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
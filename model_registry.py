@@ -0,0 +1,169 @@
+"""
+YOLO 模型注册表
+进程内共享的模型缓存，同一个权重文件只加载、融合一次
+
+缓存键为 (绝对路径, 文件修改时间, 设备, 后端, 后端参数)：
+  - 权重文件被重新训练覆盖后，修改时间变化，旧模型自动失效
+  - 不同设备各自持有一份模型（predictor 会绑定设备）
+  - backend='torch' 返回 ultralytics YOLO；backend='onnx' 返回 onnx_backend.OnnxDetector
+
+使用方式：
+  from model_registry import get_model, evict_model
+
+  model = get_model('runs/detect/yolo12n_person_head/weights/best.pt')
+  model.predict(...)
+
+  evict_model('runs/detect/yolo12n_person_head/weights/best.pt')  # 手动释放
+
+  detector = get_model('model_exporter/best.onnx', backend='onnx', intra_op_threads=4)
+"""
+
+import gc
+import os
+import threading
+from collections import OrderedDict
+
+import torch
+from ultralytics import YOLO
+
+
+# 默认最多缓存的模型数量
+MAX_MODELS = 4
+
+
+class ModelRegistry:
+    """按 (路径, 修改时间, 设备, 后端) 缓存模型的 LRU 注册表"""
+
+    def __init__(self, max_models=MAX_MODELS):
+        """
+        初始化注册表
+
+        Args:
+            max_models: 最多缓存的模型数量，超出后淘汰最久未使用的模型
+        """
+        self.max_models = max_models
+        self._models = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _resolve_path(model_path):
+        """本地文件返回绝对路径；'yolo12n.pt' 这类待下载的名称保持原样"""
+        model_path = str(model_path)
+        if os.path.exists(model_path):
+            return os.path.abspath(model_path)
+        return model_path
+
+    def _make_key(self, model_path, device, backend, options):
+        path = self._resolve_path(model_path)
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        device = str(device) if device is not None else None
+        return (path, mtime, device, backend, tuple(sorted(options.items())))
+
+    @staticmethod
+    def _load(model_path, backend, options):
+        if backend == 'torch':
+            return YOLO(model_path)
+        if backend == 'onnx':
+            from onnx_backend import OnnxDetector
+            return OnnxDetector(model_path, **options)
+        raise ValueError(f"不支持的推理后端: {backend}")
+
+    def get(self, model_path, device=None, backend='torch', **options):
+        """
+        获取模型，命中缓存时直接复用
+
+        Args:
+            model_path: 模型权重路径
+            device: 设备 ('cpu' / 'mps' / 'cuda' / 0 ...)，None 表示由 ultralytics 自动选择
+            backend: 推理后端 ('torch' / 'onnx')
+            **options: 传给后端的参数，如 onnx 的 intra_op_threads / inter_op_threads
+
+        Returns:
+            YOLO 模型对象或 OnnxDetector
+        """
+        key = self._make_key(model_path, device, backend, options)
+
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                print(f"♻️  复用已加载模型: {model_path}")
+                return self._models[key]
+
+            # 权重文件已更新：丢弃同路径、同配置的旧版本
+            stale = [k for k in self._models if k[0] == key[0] and k[2:] == key[2:]]
+            for k in stale:
+                del self._models[k]
+
+            print(f"📥 加载模型: {model_path}")
+            model = self._load(model_path, backend, options)
+            self._models[key] = model
+
+            while len(self._models) > self.max_models:
+                old_key, _ = self._models.popitem(last=False)
+                print(f"🗑️  淘汰模型: {old_key[0]}")
+
+        if stale:
+            self._release_memory()
+        return model
+
+    def evict(self, model_path=None, device=None):
+        """
+        移除缓存的模型
+
+        Args:
+            model_path: 模型权重路径，None 表示清空全部
+            device: 只移除该设备上的模型，None 表示所有设备
+
+        Returns:
+            移除的模型数量
+        """
+        with self._lock:
+            if model_path is None:
+                keys = list(self._models)
+            else:
+                path = self._resolve_path(model_path)
+                keys = [k for k in self._models
+                        if k[0] == path and (device is None or k[2] == str(device))]
+            for k in keys:
+                del self._models[k]
+
+        if keys:
+            self._release_memory()
+        return len(keys)
+
+    def clear(self):
+        """清空所有缓存的模型"""
+        return self.evict()
+
+    def __len__(self):
+        return len(self._models)
+
+    def __contains__(self, model_path):
+        path = self._resolve_path(model_path)
+        return any(k[0] == path for k in self._models)
+
+    @staticmethod
+    def _release_memory():
+        """释放被淘汰模型占用的内存/显存"""
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+# 进程级共享注册表
+registry = ModelRegistry()
+
+
+def get_model(model_path, device=None, backend='torch', **options):
+    """从共享注册表获取模型，参见 ModelRegistry.get"""
+    return registry.get(model_path, device, backend, **options)
+
+
+def evict_model(model_path=None, device=None):
+    """从共享注册表移除模型，参见 ModelRegistry.evict"""
+    return registry.evict(model_path, device)
+
+
+def clear_models():
+    """清空共享注册表"""
+    return registry.clear()
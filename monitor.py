@@ -7,7 +7,62 @@ import os
 import time
 import matplotlib.pyplot as plt
 from pathlib import Path
+import numpy as np
 import pandas as pd
+import yaml
+
+from results_tail import IDLE_TIMEOUT, FileWatcher, ResultsTailer
+from training_timing import TIMING_NAME, read_timing
+
+
+def _total_epochs(project_dir):
+    """训练设置的总轮数（args.yaml），读取不到时返回 None"""
+    args_yaml = os.path.join(project_dir, 'args.yaml')
+    if not os.path.exists(args_yaml):
+        return None
+    with open(args_yaml, 'r', encoding='utf-8') as f:
+        return (yaml.safe_load(f) or {}).get('epochs')
+
+
+def _format_duration(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
+def print_timing(project_dir, timing_rows):
+    """
+    显示 timing.csv 中实测的吞吐、耗时、内存和预计剩余时间
+    
+    Args:
+        project_dir: 训练结果目录
+        timing_rows: timing.csv 已读取的行（ResultsTailer.poll 返回的字典）
+    """
+    if not timing_rows:
+        return
+    latest = timing_rows[-1]
+    
+    print(f"\n⏱️  训练速度 (Epoch {latest['epoch']}):")
+    print(f"  吞吐:       {latest['images_per_sec']:.1f} img/s")
+    print(f"  Epoch 耗时: {latest['epoch_s']:.0f}s (计算 {latest['compute_s']:.0f}s, "
+          f"等待数据 {latest['data_wait_s']:.0f}s, 验证 {latest['val_s']:.0f}s)")
+    print(f"  迭代耗时:   p50 {latest['iter_ms_p50']:.0f} ms, p95 {latest['iter_ms_p95']:.0f} ms")
+    print(f"  内存:       主进程 {latest['host_rss_mb']:.0f} MB, workers {latest['workers_rss_mb']:.0f} MB, "
+          f"设备 {latest['device_mem_mb']:.0f} MB")
+    
+    # 与之前 epoch 的中位数比较，发现速度退化
+    if len(timing_rows) > 3:
+        baseline = float(np.median([row['images_per_sec'] for row in timing_rows[:-1]]))
+        if latest['images_per_sec'] < baseline * 0.8:
+            print(f"  ⚠️  吞吐低于之前的中位数 {baseline:.1f} img/s "
+                  f"({latest['images_per_sec'] / baseline - 1:+.0%})")
+    
+    total_epochs = _total_epochs(project_dir)
+    if total_epochs:
+        remaining = total_epochs - int(latest['epoch'])
+        if remaining > 0:
+            eta = remaining * float(np.mean([row['epoch_s'] for row in timing_rows[-5:]]))
+            print(f"  预计剩余:   {_format_duration(eta)} ({remaining} epochs，早停时更短)")
 
 
 def watch_training(project_dir='runs/detect/yolo12n_person_head', interval=5):
@@ -16,9 +71,14 @@ def watch_training(project_dir='runs/detect/yolo12n_person_head', interval=5):
     
     Args:
         project_dir: 训练结果目录
-        interval: 刷新间隔（秒）
+        interval: 轮询间隔（秒）；支持 inotify 时文件变化立即刷新，不再定时轮询
     """
     results_csv = os.path.join(project_dir, 'results.csv')
+    tailer = ResultsTailer(results_csv)
+    # timing.csv 在保存权重之后才写入，比 results.csv 晚，单独增量读取
+    timing_tailer = ResultsTailer(os.path.join(project_dir, TIMING_NAME), best_metrics=())
+    timing_rows = []
+    watcher = FileWatcher(project_dir, names=('results.csv', TIMING_NAME))
     
     print("=" * 60)
     print("📊 YOLO12 训练监控")
@@ -28,27 +88,23 @@ def watch_training(project_dir='runs/detect/yolo12n_person_head', interval=5):
     print("按 Ctrl+C 停止监控")
     print("=" * 60)
     
-    last_epoch = -1
-    
     try:
         while True:
-            if not os.path.exists(results_csv):
-                print("⏳ 等待训练开始...")
-                time.sleep(interval)
-                continue
-            
-            # 读取结果
+            # 只读取新追加的行
             try:
-                df = pd.read_csv(results_csv)
-                df.columns = df.columns.str.strip()  # 去除列名空格
+                new_rows = tailer.poll()
+                if tailer.rewritten:
+                    print("\n🔄 results.csv 已重新生成，从头读取")
+                new_timing = timing_tailer.poll()
+                if timing_tailer.rewritten:
+                    timing_rows = []
+                timing_rows.extend(new_timing)
                 
-                current_epoch = len(df)
-                
-                if current_epoch > last_epoch:
-                    last_epoch = current_epoch
-                    
-                    # 获取最新数据
-                    latest = df.iloc[-1]
+                if not tailer.exists:
+                    print("⏳ 等待训练开始...")
+                elif new_rows or new_timing:
+                    current_epoch = tailer.rows
+                    latest = tailer.latest
                     
                     # 清屏（可选）
                     # os.system('clear')
@@ -74,21 +130,25 @@ def watch_training(project_dir='runs/detect/yolo12n_person_head', interval=5):
                     if 'lr/pg0' in latest:
                         print(f"\n📊 学习率: {latest['lr/pg0']:.6f}")
                     
+                    # 实测吞吐和预计剩余时间
+                    print_timing(project_dir, timing_rows)
+                    
                     # 最佳结果
-                    best_map = df['metrics/mAP50-95(B)'].max()
-                    best_epoch = df['metrics/mAP50-95(B)'].idxmax() + 1
-                    print(f"\n🏆 最佳 mAP50-95: {best_map:.4f} (Epoch {best_epoch})")
+                    if 'metrics/mAP50-95(B)' in tailer.best:
+                        best_map, best_epoch = tailer.best['metrics/mAP50-95(B)']
+                        print(f"\n🏆 最佳 mAP50-95: {best_map:.4f} (Epoch {best_epoch})")
                     
                     print("=" * 60)
                 
-                time.sleep(interval)
-                
             except Exception as e:
                 print(f"⚠️  读取结果时出错: {e}")
-                time.sleep(interval)
+            
+            watcher.wait(IDLE_TIMEOUT if watcher.inotify else interval)
                 
     except KeyboardInterrupt:
         print("\n\n⏹️  监控已停止")
+    finally:
+        watcher.close()
 
 
 def plot_training_curves(project_dir='runs/detect/yolo12n_person_head'):
@@ -203,6 +263,17 @@ def summary_results(project_dir='runs/detect/yolo12n_person_head'):
     print(f"  Precision: {final['metrics/precision(B)']:.4f}")
     print(f"  Recall:    {final['metrics/recall(B)']:.4f}")
     
+    timing = read_timing(project_dir)
+    if timing is not None:
+        print(f"\n⏱️  训练速度:")
+        print(f"  平均吞吐:   {timing['images_per_sec'].mean():.1f} img/s "
+              f"(最低 {timing['images_per_sec'].min():.1f}, 最高 {timing['images_per_sec'].max():.1f})")
+        print(f"  总耗时:     {_format_duration(timing['epoch_s'].sum())}, "
+              f"其中等待数据 {timing['data_wait_s'].sum() / timing['train_s'].sum():.0%}, "
+              f"验证 {_format_duration(timing['val_s'].sum())}")
+        print(f"  峰值内存:   主进程 {timing['host_rss_mb'].max():.0f} MB, "
+              f"设备 {timing['device_mem_mb'].max():.0f} MB")
+    
     print(f"\n📁 模型文件:")
     weights_dir = os.path.join(project_dir, 'weights')
     if os.path.exists(weights_dir):
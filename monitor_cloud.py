@@ -8,7 +8,8 @@ import time
 import subprocess
 import matplotlib.pyplot as plt
 from pathlib import Path
-import pandas as pd
+
+from results_tail import IDLE_TIMEOUT, FileWatcher, ResultsTailer
 
 
 def get_gpu_info():
@@ -43,9 +44,11 @@ def watch_training_cloud(project_dir='runs/detect/yolo12s_person_head_t4', inter
     
     Args:
         project_dir: 训练结果目录
-        interval: 刷新间隔（秒）
+        interval: 轮询间隔（秒）；支持 inotify 时文件变化立即刷新，不再定时轮询
     """
     results_csv = os.path.join(project_dir, 'results.csv')
+    tailer = ResultsTailer(results_csv)
+    watcher = FileWatcher(project_dir, names=('results.csv',))
     
     print("=" * 70)
     print("🚀 YOLO12 云服务器训练监控 (T4 GPU)")
@@ -55,33 +58,27 @@ def watch_training_cloud(project_dir='runs/detect/yolo12s_person_head_t4', inter
     print("按 Ctrl+C 停止监控")
     print("=" * 70)
     
-    last_epoch = -1
-    
     try:
         while True:
             # 获取GPU信息
             gpu_info = get_gpu_info()
             
-            if not os.path.exists(results_csv):
-                print(f"\n⏳ 等待训练开始... [{time.strftime('%H:%M:%S')}]")
-                if gpu_info:
-                    print(f"   GPU使用: {gpu_info['gpu_util']}% | "
-                          f"显存: {gpu_info['mem_used']}/{gpu_info['mem_total']}MB "
-                          f"({gpu_info['mem_percent']:.1f}%) | "
-                          f"温度: {gpu_info['temp']}°C")
-                time.sleep(interval)
-                continue
-            
-            # 读取训练结果
+            # 读取训练结果（只读取新追加的行）
             try:
-                df = pd.read_csv(results_csv)
-                df.columns = df.columns.str.strip()
-                
-                current_epoch = len(df)
+                new_rows = tailer.poll()
+                if tailer.rewritten:
+                    print("\n🔄 results.csv 已重新生成，从头读取")
                 
-                if current_epoch > last_epoch:
-                    last_epoch = current_epoch
-                    latest = df.iloc[-1]
+                if not tailer.exists:
+                    print(f"\n⏳ 等待训练开始... [{time.strftime('%H:%M:%S')}]")
+                    if gpu_info:
+                        print(f"   GPU使用: {gpu_info['gpu_util']}% | "
+                              f"显存: {gpu_info['mem_used']}/{gpu_info['mem_total']}MB "
+                              f"({gpu_info['mem_percent']:.1f}%) | "
+                              f"温度: {gpu_info['temp']}°C")
+                elif new_rows:
+                    current_epoch = tailer.rows
+                    latest = tailer.latest
                     
                     # 清屏（可选）
                     # os.system('clear')
@@ -142,9 +139,9 @@ def watch_training_cloud(project_dir='runs/detect/yolo12s_person_head_t4', inter
                         print(f"\n📊 学习率: {latest['lr/pg0']:.6f}")
                     
                     # 最佳结果
-                    best_map = df['metrics/mAP50-95(B)'].max()
-                    best_epoch = df['metrics/mAP50-95(B)'].idxmax() + 1
-                    print(f"\n🏆 最佳 mAP50-95: {best_map:.4f} (Epoch {best_epoch})")
+                    if 'metrics/mAP50-95(B)' in tailer.best:
+                        best_map, best_epoch = tailer.best['metrics/mAP50-95(B)']
+                        print(f"\n🏆 最佳 mAP50-95: {best_map:.4f} (Epoch {best_epoch})")
                     
                     # 预计剩余时间（简单估算）
                     if current_epoch > 1:
@@ -155,14 +152,15 @@ def watch_training_cloud(project_dir='runs/detect/yolo12s_person_head_t4', inter
                     
                     print("=" * 70)
                 
-                time.sleep(interval)
-                
             except Exception as e:
                 print(f"⚠️  读取结果时出错: {e}")
-                time.sleep(interval)
+            
+            watcher.wait(IDLE_TIMEOUT if watcher.inotify else interval)
                 
     except KeyboardInterrupt:
         print("\n\n⏹️  监控已停止")
+    finally:
+        watcher.close()
 
 
 def monitor_gpu_only(interval=1):
@@ -0,0 +1,141 @@
+"""
+ONNX Runtime 推理后端
+直接运行 export_model.py 导出的 .onnx 模型，不依赖 PyTorch
+
+预处理 (letterbox) 在本模块完成，输出解码和 NMS 由 postprocess.py 完成，适合纯 CPU 部署。
+
+使用方式：
+  from onnx_backend import OnnxDetector
+
+  detector = OnnxDetector('model_exporter/best.onnx', intra_op_threads=4)
+  detections = detector.predict([cv2.imread('image.jpg')], conf=0.25)
+  # detections[0]: (N, 6) 数组，每行 [x1, y1, x2, y2, conf, cls]，原图坐标
+"""
+
+import ast
+import os
+
+import numpy as np
+import onnxruntime as ort
+
+from inference_pipeline import letterbox, scale_boxes
+from postprocess import postprocess
+
+
+class OnnxDetector:
+    """基于 onnxruntime 的 YOLO 检测器"""
+
+    def __init__(self, model_path, intra_op_threads=None, inter_op_threads=None, providers=None):
+        """
+        创建推理会话
+
+        Args:
+            model_path: .onnx 模型路径
+            intra_op_threads: 单个算子内部的并行线程数，None 表示由 onnxruntime 决定
+            inter_op_threads: 算子之间的并行线程数，大于 1 时启用并行执行模式
+            providers: 执行提供者列表，默认 ['CPUExecutionProvider']
+        """
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"模型文件不存在: {model_path}")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+            if inter_op_threads > 1:
+                options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+
+        self.model_path = model_path
+        self.session = ort.InferenceSession(
+            model_path,
+            sess_options=options,
+            providers=providers or ['CPUExecutionProvider']
+        )
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_dtype = np.float16 if model_input.type == 'tensor(float16)' else np.float32
+        batch_dim = model_input.shape[0]
+        self.static_batch = batch_dim if isinstance(batch_dim, int) else None
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = self._parse_names(metadata)
+        self.imgsz = self._parse_imgsz(metadata, model_input.shape)
+
+    def _parse_names(self, metadata):
+        """从 ultralytics 导出的元数据读取类别名称"""
+        if 'names' in metadata:
+            return ast.literal_eval(metadata['names'])
+        num_classes = self.session.get_outputs()[0].shape[1] - 4
+        return {i: str(i) for i in range(num_classes)}
+
+    @staticmethod
+    def _parse_imgsz(metadata, input_shape):
+        """优先读取元数据中的 imgsz，其次是静态输入尺寸，最后默认 640"""
+        if 'imgsz' in metadata:
+            imgsz = ast.literal_eval(metadata['imgsz'])
+            return tuple(imgsz) if isinstance(imgsz, (list, tuple)) else (imgsz, imgsz)
+        h, w = input_shape[2], input_shape[3]
+        if isinstance(h, int) and isinstance(w, int):
+            return (h, w)
+        return (640, 640)
+
+    def _to_blob(self, images):
+        """BGR HWC uint8 图像列表 -> RGB NCHW 归一化张量"""
+        blob = np.stack(images)[..., ::-1].transpose(0, 3, 1, 2)
+        return np.ascontiguousarray(blob, dtype=self.input_dtype) / self.input_dtype(255)
+
+    def _run(self, blob):
+        """执行推理；静态 batch 的模型按模型支持的 batch 分块运行，最后不足一块时补零"""
+        step = self.static_batch or len(blob)
+        outputs = []
+        for i in range(0, len(blob), step):
+            chunk = blob[i:i + step]
+            count = len(chunk)
+            if count < step:
+                padding = np.zeros((step - count,) + chunk.shape[1:], dtype=chunk.dtype)
+                chunk = np.concatenate([chunk, padding])
+            outputs.append(self.session.run(None, {self.input_name: chunk})[0][:count])
+        return np.concatenate(outputs).astype(np.float32)
+
+    def detect_letterboxed(self, inputs, conf=0.25, iou=0.7, max_det=300):
+        """
+        对已 letterbox 到 self.imgsz 的图像推理
+
+        Args:
+            inputs: letterbox 后的 BGR 图像列表
+            conf: 置信度阈值
+            iou: NMS IoU 阈值
+            max_det: 每张图最多保留的检测框数量
+
+        Returns:
+            每张图一个 (N, 6) 数组，letterbox 坐标
+        """
+        if not inputs:
+            return []
+        outputs = self._run(self._to_blob(inputs))
+        return postprocess(outputs, conf, iou, max_det, num_classes=len(self.names))
+
+    def predict(self, images, conf=0.25, iou=0.7, max_det=300):
+        """
+        对原始图像推理
+
+        Args:
+            images: BGR 图像列表
+            conf: 置信度阈值
+            iou: NMS IoU 阈值
+            max_det: 每张图最多保留的检测框数量
+
+        Returns:
+            每张图一个 (N, 6) 数组 [x1, y1, x2, y2, conf, cls]，原图坐标
+        """
+        prepared = [letterbox(image, self.imgsz) for image in images]
+        detections = self.detect_letterboxed([p[0] for p in prepared], conf, iou, max_det)
+
+        for image, (_, ratio, pad), dets in zip(images, prepared, detections):
+            if len(dets):
+                dets[:, :4] = scale_boxes(dets[:, :4], ratio, pad, image.shape[:2])
+        return detections
+
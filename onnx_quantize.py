@@ -0,0 +1,205 @@
+"""
+ONNX Runtime INT8 量化
+对导出的 FP32 .onnx 做静态 (QDQ) 和动态 INT8 量化，并与 FP32 对比延迟、模型大小和 mAP
+
+- static:  QDQ 格式，激活值的量化参数由校准集 (calibration.py) 离线统计
+- dynamic: 只离线量化权重，激活值的量化参数在推理时动态计算，不需要校准集
+
+只量化带权重的算子 (Conv / Gemm / MatMul)：检测头的解码同时包含像素坐标 (0~640)
+和类别概率 (0~1)，共用一个 INT8 量化尺度会把置信度全部舍入为 0
+
+使用方式（通过 export_model.py）：
+  python export_model.py --model best.pt --format onnx --ort-quant static,dynamic
+"""
+
+import csv
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import onnx
+from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                      quantize_dynamic, quantize_static)
+
+
+# 支持的量化方式 -> 输出文件名后缀
+QUANT_MODES = {
+    'static': '_int8_qdq',
+    'dynamic': '_int8_dynamic',
+}
+
+# 参与量化的算子类型
+QUANT_OP_TYPES = ('Conv', 'Gemm', 'MatMul')
+
+
+class TensorCalibrationReader(CalibrationDataReader):
+    """把 calibration.load_calibration_tensors 缓存的 uint8 张量按模型 batch 逐块送入校准"""
+
+    def __init__(self, tensors, input_name, batch_size=1):
+        """
+        Args:
+            tensors: (N, 3, H, W) uint8 数组（可以是内存映射）
+            input_name: 模型输入名
+            batch_size: 每次送入的图片数，需与静态 batch 模型的输入一致
+        """
+        self.tensors = tensors
+        self.input_name = input_name
+        self.batch_size = batch_size
+        self.rewind()
+
+    def get_next(self):
+        start = self._position
+        if start + self.batch_size > len(self.tensors):
+            return None
+        self._position += self.batch_size
+        batch = np.asarray(self.tensors[start:start + self.batch_size], dtype=np.float32)
+        return {self.input_name: batch / np.float32(255)}
+
+    def rewind(self):
+        self._position = 0
+
+
+def _model_input(onnx_path):
+    """返回 (输入名, 静态 batch 或 None)"""
+    graph_input = onnx.load(onnx_path, load_external_data=False).graph.input[0]
+    batch_dim = graph_input.type.tensor_type.shape.dim[0]
+    return graph_input.name, (batch_dim.dim_value if batch_dim.HasField('dim_value') else None)
+
+
+def _opset(onnx_path):
+    """模型的默认域 opset 版本"""
+    model = onnx.load(onnx_path, load_external_data=False)
+    return next((o.version for o in model.opset_import if o.domain in ('', 'ai.onnx')), 0)
+
+
+def _excluded_nodes(onnx_path):
+    """不参与量化的节点：除 QUANT_OP_TYPES 以外的全部节点"""
+    graph = onnx.load(onnx_path, load_external_data=False).graph
+    return [node.name for node in graph.node if node.op_type not in QUANT_OP_TYPES]
+
+
+def quantize_onnx(fp32_path, mode, calibration_tensors=None, output_path=None):
+    """
+    量化单个 FP32 ONNX 模型
+
+    Args:
+        fp32_path: FP32 .onnx 路径
+        mode: 'static' / 'dynamic'
+        calibration_tensors: static 需要的校准张量 (N, 3, H, W) uint8
+        output_path: 输出路径，默认 <stem><后缀>.onnx
+
+    Returns:
+        量化后的模型路径
+    """
+    if mode not in QUANT_MODES:
+        raise ValueError(f"不支持的量化方式: {mode}")
+    stem, ext = os.path.splitext(fp32_path)
+    output_path = output_path or f"{stem}{QUANT_MODES[mode]}{ext}"
+
+    if mode == 'static':
+        if calibration_tensors is None:
+            raise ValueError("静态量化需要校准数据")
+        input_name, static_batch = _model_input(fp32_path)
+        batch_size = static_batch or 1
+        if len(calibration_tensors) < batch_size:
+            raise ValueError(f"校准图片数 ({len(calibration_tensors)}) 少于模型 batch ({batch_size})")
+
+        # 按节点名排除而非按算子类型：所有张量仍参与校准，注意力中的 Softmax 等也有统计值
+        # 逐通道量化的 DequantizeLinear (axis 属性) 需要 opset >= 13
+        quantize_static(
+            fp32_path,
+            output_path,
+            TensorCalibrationReader(calibration_tensors, input_name, batch_size),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=_opset(fp32_path) >= 13,
+            nodes_to_exclude=_excluded_nodes(fp32_path),
+        )
+    else:
+        # CPU 上 ConvInteger 只支持 uint8 权重
+        quantize_dynamic(
+            fp32_path,
+            output_path,
+            weight_type=QuantType.QUInt8,
+            op_types_to_quantize=list(QUANT_OP_TYPES),
+        )
+    return output_path
+
+
+def quantization_report(fp32_path, variants, data_yaml=None, imgsz=640, warmup=5, iters=50,
+                        report_prefix=None):
+    """
+    对比量化模型与 FP32 的延迟 (CPU, batch 1)、模型大小和 mAP，写出 JSON / CSV 报告
+
+    Args:
+        fp32_path: FP32 .onnx 路径
+        variants: {量化方式: 模型路径}
+        data_yaml: mAP 评估用的数据集配置，None 或不存在时跳过 mAP
+        imgsz: 测试尺寸
+        warmup: 预热次数
+        iters: 计时次数
+        report_prefix: 报告路径前缀，默认 <stem>_quant_report
+
+    Returns:
+        每个模型一行结果
+    """
+    from export_benchmark import _artifact_size_mb, benchmark_artifact, check_parity
+
+    models = [('fp32', fp32_path)] + list(variants.items())
+    _, static_batch = _model_input(fp32_path)
+    batch = static_batch or 1
+
+    print(f"\n📊 INT8 量化对比 ({os.path.basename(fp32_path)}, imgsz={imgsz}, batch={batch}, CPU)")
+    rows = []
+    context = multiprocessing.get_context('spawn')
+    for name, path in models:
+        row = {'variant': name, 'path': path, 'size_mb': _artifact_size_mb(path)}
+        # 每个模型在独立子进程中测试，互不干扰
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            try:
+                result = executor.submit(benchmark_artifact, path, [batch], [imgsz],
+                                         warmup, iters).result()[0]
+                row.update({k: result[k] for k in result if k not in ('imgsz', 'batch')})
+            except Exception as e:
+                row['status'] = f"error: {str(e).splitlines()[0][:120]}"
+        rows.append(row)
+
+    if data_yaml and os.path.exists(data_yaml):
+        parity = check_parity(fp32_path, list(variants.items()), data_yaml, imgsz,
+                              reference_label='fp32')
+        for row in rows:
+            row.update(parity.get(row['path'], {}))
+    else:
+        print(f"⚠️  未找到数据集配置，跳过 mAP 对比: {data_yaml}")
+
+    reference = rows[0]
+    for row in rows:
+        if row.get('status') == 'ok' and reference.get('status') == 'ok':
+            row['speedup'] = reference['mean_ms'] / row['mean_ms']
+        row['size_ratio'] = row['size_mb'] / reference['size_mb']
+
+    print(f"\n  {'模型':<10} {'大小 (MB)':>10} {'p50 (ms)':>10} {'加速比':>8} {'mAP50':>8} {'mAP50-95':>10}")
+    for row in rows:
+        p50 = f"{row['p50_ms']:10.2f}" if 'p50_ms' in row else f"{'-':>10}"
+        speedup = f"{row['speedup']:7.2f}x" if 'speedup' in row else f"{'-':>8}"
+        map50 = f"{row['map50']:8.4f}" if 'map50' in row else f"{'-':>8}"
+        map50_95 = f"{row['map50_95']:10.4f}" if 'map50_95' in row else f"{'-':>10}"
+        print(f"  {row['variant']:<10} {row['size_mb']:10.2f} {p50} {speedup} {map50} {map50_95}")
+
+    report_prefix = report_prefix or f"{os.path.splitext(fp32_path)[0]}_quant_report"
+    with open(f"{report_prefix}.json", 'w', encoding='utf-8') as f:
+        json.dump({'imgsz': imgsz, 'batch': batch, 'data': data_yaml, 'results': rows},
+                  f, indent=2, ensure_ascii=False)
+
+    fields = ['variant', 'path', 'size_mb', 'size_ratio', 'p50_ms', 'p95_ms', 'mean_ms',
+              'images_per_sec', 'speedup', 'map50', 'map50_95', 'delta_map50_95', 'status']
+    with open(f"{report_prefix}.csv", 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(f"📄 量化报告: {report_prefix}.json / {report_prefix}.csv")
+    return rows
@@ -0,0 +1,251 @@
+"""
+YOLO 导出模型的 NumPy 后处理
+对原始输出 (B, 4+nc, N) 做向量化解码、置信度过滤、top-k 预筛选和按类别 NMS
+
+不依赖 PyTorch，onnx_backend.py 与导出校验共用。
+
+使用方式：
+  from postprocess import postprocess
+  detections = postprocess(output, conf=0.25, iou=0.7)
+  # detections[i]: (M, 6) 数组 [x1, y1, x2, y2, conf, cls]，模型输入坐标
+
+  # 与 torchvision NMS 对比性能
+  python postprocess.py --benchmark
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+
+def xywh2xyxy(xywh):
+    """(..., 4) 中心点宽高 -> 左上右下"""
+    xyxy = np.empty_like(xywh)
+    half = xywh[..., 2:] / 2
+    xyxy[..., :2] = xywh[..., :2] - half
+    xyxy[..., 2:] = xywh[..., :2] + half
+    return xyxy
+
+
+def nms(boxes, scores, iou_threshold, max_keep=None):
+    """
+    贪心 NMS，每轮用向量化 IoU 一次抑制所有重叠框
+
+    Args:
+        boxes: (N, 4) xyxy 框
+        scores: (N,) 置信度
+        iou_threshold: IoU 阈值
+        max_keep: 保留到这么多框后提前结束，None 表示不限
+
+    Returns:
+        保留框的下标，按置信度降序
+    """
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+
+    order = np.argsort(-scores, kind='stable')
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        if max_keep is not None and len(keep) >= max_keep:
+            break
+        rest = order[1:]
+
+        w = np.maximum(0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        h = np.maximum(0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = w * h
+        ious = inter / (areas[i] + areas[rest] - inter + 1e-7)
+        order = rest[ious <= iou_threshold]
+
+    return np.array(keep, dtype=np.int64)
+
+
+def batched_nms(boxes, scores, groups, iou_threshold, max_keep=None):
+    """
+    分组 NMS：每组的框平移到互不重叠的区域，一次 NMS 完成所有组
+
+    Args:
+        boxes: (N, 4) xyxy 框
+        scores: (N,) 置信度
+        groups: (N,) 分组编号（类别，或 图片编号 * 类别数 + 类别）
+        iou_threshold: IoU 阈值
+        max_keep: 见 nms
+
+    Returns:
+        保留框的下标，按置信度降序
+    """
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    span = boxes.max() - boxes.min() + 1
+    offset_boxes = boxes + (groups.astype(boxes.dtype) * span)[:, None]
+    return nms(offset_boxes, scores, iou_threshold, max_keep)
+
+
+def postprocess(output, conf=0.25, iou=0.7, max_det=300, pre_nms_topk=30000,
+                agnostic=False, num_classes=None):
+    """
+    解码 YOLO 检测模型的原始输出
+
+    Args:
+        output: (B, 4+nc, N) 或 (4+nc, N) 原始输出；导出时内置 NMS 的模型为 (B, max_det, 6)
+        conf: 置信度阈值
+        iou: NMS IoU 阈值
+        max_det: 每张图最多保留的检测框数量
+        pre_nms_topk: 每张图进入 NMS 的最大候选数，0 / None 表示不限
+        agnostic: 是否跨类别做 NMS
+        num_classes: 类别数，用于识别内置 NMS 的输出；None 表示按 (B, 4+nc, N) 处理
+
+    Returns:
+        每张图一个 (M, 6) float32 数组 [x1, y1, x2, y2, conf, cls]
+    """
+    output = np.asarray(output, dtype=np.float32)
+    if output.ndim == 2:
+        output = output[None]
+    batch = len(output)
+
+    if num_classes is not None and output.shape[1] != 4 + num_classes and output.shape[-1] == 6:
+        # 导出时已包含 NMS 的模型
+        return [dets[dets[:, 4] > conf][:max_det] for dets in output]
+
+    preds = output.transpose(0, 2, 1)                      # (B, N, 4+nc)
+    scores = preds[..., 4:]
+    class_ids = scores.argmax(axis=-1)
+    confidences = np.take_along_axis(scores, class_ids[..., None], axis=-1)[..., 0]
+
+    image_idx, anchor_idx = np.nonzero(confidences > conf)
+    if len(image_idx) == 0:
+        return [np.zeros((0, 6), dtype=np.float32) for _ in range(batch)]
+    selected = confidences[image_idx, anchor_idx]
+
+    if pre_nms_topk:
+        # 按 (图片, 置信度降序) 排序，每张图只保留前 pre_nms_topk 个候选
+        order = np.lexsort((-selected, image_idx))
+        image_idx, anchor_idx, selected = image_idx[order], anchor_idx[order], selected[order]
+        rank = np.arange(len(image_idx)) - np.searchsorted(image_idx, image_idx, side='left')
+        mask = rank < pre_nms_topk
+        image_idx, anchor_idx, selected = image_idx[mask], anchor_idx[mask], selected[mask]
+
+    boxes = xywh2xyxy(preds[image_idx, anchor_idx, :4])
+    classes = class_ids[image_idx, anchor_idx]
+
+    num_groups = 1 if agnostic else scores.shape[-1]
+    groups = image_idx * num_groups + (0 if agnostic else classes)
+    keep = batched_nms(boxes, selected, groups, iou, max_keep=max_det if batch == 1 else None)
+
+    # 按图片拆分，图片内保持置信度降序
+    keep = keep[np.argsort(image_idx[keep], kind='stable')]
+    detections = np.concatenate([boxes[keep], selected[keep, None], classes[keep, None]],
+                                axis=1).astype(np.float32)
+    counts = np.bincount(image_idx[keep], minlength=batch)
+    return [dets[:max_det] for dets in np.split(detections, np.cumsum(counts)[:-1])]
+
+
+def make_crowded_output(num_candidates, num_classes=2, num_objects=200, imgsz=640, seed=0):
+    """
+    生成模拟拥挤场景的原始输出：大量候选框聚集在少数目标周围
+
+    Returns:
+        (1, 4+nc, num_candidates) float32 数组
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(0, imgsz, (num_objects, 2))
+    sizes = rng.uniform(8, 120, (num_objects, 2))
+
+    owner = rng.integers(0, num_objects, num_candidates)
+    xy = centers[owner] + rng.normal(0, 4, (num_candidates, 2))
+    wh = sizes[owner] * rng.uniform(0.8, 1.2, (num_candidates, 2))
+    scores = rng.uniform(0, 1, (num_candidates, num_classes)) ** 3
+
+    output = np.concatenate([xy, wh, scores], axis=1).astype(np.float32)
+    return output.T[None]
+
+
+def _torchvision_postprocess(output, conf, iou, max_det):
+    """同等流程的 torch + torchvision 实现，仅用于基准对比"""
+    import torch
+    import torchvision
+
+    preds = torch.from_numpy(output[0]).T
+    confidences, classes = preds[:, 4:].max(dim=1)
+    mask = confidences > conf
+    boxes = torch.from_numpy(xywh2xyxy(preds[mask, :4].numpy()))
+    keep = torchvision.ops.batched_nms(boxes, confidences[mask], classes[mask], iou)[:max_det]
+    return keep.numel()
+
+
+def benchmark(num_candidates=(1000, 5000, 8400, 20000), num_classes=2, repeats=20,
+              conf=0.1, iou=0.7, max_det=300):
+    """
+    对比 NumPy 后处理与 torchvision NMS 的耗时
+
+    Args:
+        num_candidates: 候选框数量列表（640 输入时 YOLO 输出 8400 个）
+        num_classes: 类别数
+        repeats: 每组重复次数
+        conf: 置信度阈值
+        iou: NMS IoU 阈值
+        max_det: 每张图最多保留的检测框数量
+    """
+    try:
+        import torchvision  # noqa: F401
+        has_torchvision = True
+    except ImportError:
+        has_torchvision = False
+        print("⚠️  未安装 torchvision，只测试 NumPy 实现")
+
+    print("=" * 70)
+    print(f"⏱️  后处理基准 (类别数={num_classes}, conf={conf}, iou={iou}, 重复 {repeats} 次)")
+    print("=" * 70)
+    print(f"{'候选框':>8} {'过阈值':>8} {'NumPy (ms)':>12} {'torchvision (ms)':>18} {'保留数':>12}")
+
+    for n in num_candidates:
+        output = make_crowded_output(n, num_classes)
+        passed = int((output[0, 4:].max(axis=0) > conf).sum())
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            dets = postprocess(output, conf, iou, max_det)
+        numpy_ms = (time.perf_counter() - start) / repeats * 1000
+
+        if has_torchvision:
+            start = time.perf_counter()
+            for _ in range(repeats):
+                kept = _torchvision_postprocess(output, conf, iou, max_det)
+            torch_ms = (time.perf_counter() - start) / repeats * 1000
+            torch_text = f"{torch_ms:18.2f}"
+            kept_text = f"{len(dets[0])}/{kept}"
+        else:
+            torch_text = f"{'-':>18}"
+            kept_text = f"{len(dets[0])}"
+
+        print(f"{n:>8} {passed:>8} {numpy_ms:12.2f} {torch_text} {kept_text:>12}")
+
+    print("=" * 70)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='YOLO NumPy 后处理')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='运行与 torchvision NMS 的性能对比')
+    parser.add_argument('--candidates', type=str, default='1000,5000,8400,20000',
+                        help='候选框数量，多个用逗号分隔')
+    parser.add_argument('--classes', type=int, default=2,
+                        help='类别数 (默认: 2, person/head)')
+    parser.add_argument('--repeats', type=int, default=20,
+                        help='每组重复次数')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(
+            num_candidates=[int(n) for n in args.candidates.split(',')],
+            num_classes=args.classes,
+            repeats=args.repeats
+        )
+    else:
+        parser.print_help()
@@ -6,6 +6,8 @@ YOLO12 快速开始示例
 from ultralytics import YOLO
 import torch
 
+from model_registry import get_model
+
 
 def quick_start():
     """快速开始 - 5分钟完成整个流程"""
@@ -44,7 +46,7 @@ def quick_start():
     # 步骤 3: 验证模型
     print("\n🔍 步骤 3/4: 验证模型")
     
-    model = YOLO('runs/detect/quick_test/weights/best.pt')
+    model = get_model('runs/detect/quick_test/weights/best.pt')
     metrics = model.val(data='datasets/data.yaml')
     
     print(f"\n📊 性能指标:")
@@ -0,0 +1,247 @@
+"""
+results.csv 增量读取
+监控训练时不再每次 pd.read_csv 整个文件：
+
+- ResultsTailer: 记住已读到的字节偏移，只解析新追加的完整行，维护各指标的最佳值和所在 epoch；
+  文件被重新生成（新训练删除重建、resume 时重写）时自动从头读取
+- FileWatcher: Linux 上用 inotify 监听训练目录，results.csv / timing.csv 变化时立即唤醒；
+  其它平台或 inotify 不可用时退化为定时轮询
+
+使用方式：
+  tailer = ResultsTailer('runs/detect/exp/results.csv')
+  watcher = FileWatcher('runs/detect/exp', names=('results.csv',))
+  while True:
+      for row in tailer.poll():
+          print(row['epoch'], row['metrics/mAP50-95(B)'])
+      watcher.wait(5)
+"""
+
+import ctypes
+import ctypes.util
+import math
+import os
+import select
+import struct
+import sys
+import time
+
+
+# 维护最佳值的指标（越大越好）
+BEST_METRICS = ('metrics/mAP50-95(B)', 'metrics/mAP50(B)', 'metrics/precision(B)', 'metrics/recall(B)')
+
+# inotify 可用时没有文件变化的最长等待秒数（只是兜底，变化会立即唤醒）
+IDLE_TIMEOUT = 60
+
+# 用于检测文件被重写的尾部字节数
+FINGERPRINT_BYTES = 256
+
+# inotify 事件
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_IGNORED = 0x00008000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT = struct.Struct('iIII')
+
+
+def _parse_value(value):
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        return value if value else math.nan
+
+
+class ResultsTailer:
+    """增量读取 ultralytics 的 results.csv"""
+
+    def __init__(self, path, best_metrics=BEST_METRICS):
+        """
+        Args:
+            path: results.csv 路径
+            best_metrics: 维护最佳值的指标列
+        """
+        self.path = path
+        self.best_metrics = best_metrics
+        self.rewritten = False
+        self._reset()
+
+    def _reset(self):
+        self.columns = None
+        self.rows = 0
+        self.latest = None
+        # {指标: (最佳值, epoch)}
+        self.best = {}
+        self._file_id = None
+        self._offset = 0
+        self._fingerprint = b''
+
+    @property
+    def exists(self):
+        return self._file_id is not None
+
+    def _unchanged(self, f, st):
+        """已读部分是否还是原来的内容（同一个文件、没有截断、尾部字节相同）"""
+        if (st.st_dev, st.st_ino) != self._file_id or st.st_size < self._offset:
+            return False
+        if not self._fingerprint:
+            return True
+        f.seek(self._offset - len(self._fingerprint))
+        return f.read(len(self._fingerprint)) == self._fingerprint
+
+    def _add_row(self, line):
+        values = [_parse_value(v) for v in line.split(',')]
+        row = dict(zip(self.columns, values))
+        self.rows += 1
+        self.latest = row
+        epoch = row.get('epoch', self.rows)
+        epoch = int(epoch) if isinstance(epoch, float) and not math.isnan(epoch) else self.rows
+        row['epoch'] = epoch
+        for metric in self.best_metrics:
+            value = row.get(metric)
+            if not isinstance(value, float) or math.isnan(value):
+                continue
+            if metric not in self.best or value > self.best[metric][0]:
+                self.best[metric] = (value, epoch)
+        return row
+
+    def poll(self):
+        """
+        读取上次之后追加的行
+
+        Returns:
+            新行列表，每行为 {列名: 值} 字典（数值为 float）；文件被重写时 self.rewritten 为 True，
+            返回重写后的全部行
+        """
+        self.rewritten = False
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            if self.exists:
+                self._reset()
+                self.rewritten = True
+            return []
+
+        with f:
+            st = os.fstat(f.fileno())
+            if self.exists and not self._unchanged(f, st):
+                self._reset()
+                self.rewritten = True
+            self._file_id = (st.st_dev, st.st_ino)
+
+            f.seek(self._offset)
+            data = f.read()
+            # 只处理完整的行，写了一半的行留到下次
+            end = data.rfind(b'\n') + 1
+            if not end:
+                return []
+            self._offset += end
+            consumed = data[:end]
+            self._fingerprint = (self._fingerprint + consumed)[-FINGERPRINT_BYTES:]
+
+        rows = []
+        for line in consumed.decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            if self.columns is None:
+                self.columns = [name.strip() for name in line.split(',')]
+                continue
+            rows.append(self._add_row(line))
+        return rows
+
+
+class FileWatcher:
+    """等待训练目录中的文件变化：inotify（Linux），否则定时轮询"""
+
+    def __init__(self, directory, names=None, settle=1.0):
+        """
+        Args:
+            directory: 监听的目录（可以还不存在）
+            names: 只关心的文件名，None 表示目录中任意文件
+            settle: 收到事件后再等待这么久没有新事件才返回（一次 epoch 会先后写多个文件）
+        """
+        self.directory = directory
+        self.names = set(names) if names else None
+        self.settle = settle
+        self._libc = None
+        self._fd = None
+        if sys.platform.startswith('linux'):
+            try:
+                self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+                self._libc.inotify_init1
+            except (OSError, AttributeError):
+                self._libc = None
+        self._open()
+
+    @property
+    def inotify(self):
+        """是否正在使用 inotify"""
+        return self._fd is not None
+
+    def _open(self):
+        if self._libc is None or self._fd is not None or not os.path.isdir(self.directory):
+            return
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            self._libc = None
+            return
+        if self._libc.inotify_add_watch(fd, os.fsencode(self.directory), WATCH_MASK) < 0:
+            os.close(fd)
+            return
+        self._fd = fd
+
+    def _drain(self):
+        """读出所有待处理事件，返回是否有关心的文件变化"""
+        relevant = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return relevant
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0').decode()
+                offset += _EVENT.size + length
+                if mask & IN_IGNORED:
+                    # 目录被删除，之后重新监听
+                    self.close()
+                    return True
+                if self.names is None or name in self.names:
+                    relevant = True
+
+    def wait(self, timeout):
+        """
+        等待文件变化或超时
+
+        Args:
+            timeout: 最长等待秒数
+
+        Returns:
+            True 表示检测到变化，False 表示超时（轮询模式总是 False）
+        """
+        self._open()
+        if self._fd is None:
+            time.sleep(timeout)
+            return False
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if readable and self._drain():
+                break
+        # 等一组写入结束
+        while self._fd is not None and select.select([self._fd], [], [], self.settle)[0]:
+            self._drain()
+        return True
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
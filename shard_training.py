@@ -0,0 +1,176 @@
+"""
+分片数据集的 ultralytics 接入
+data.yaml 中带 shards: true 时（dataset_shards.py 生成），训练和评估通过这里的类
+从 mmap 分片读取图片和标签，不再逐个打开小文件
+
+- ShardedYOLODataset: 标签和图片尺寸直接来自分片索引，图片从分片解码
+- ShardedDetectionTrainer / ShardedDetectionValidator: 划分路径是分片目录时构建 ShardedYOLODataset
+
+使用方式：
+  from shard_training import train_kwargs, val_kwargs
+  model.train(data=data_yaml, **train_kwargs(data_yaml), ...)
+  model.val(data=data_yaml, **val_kwargs(data_yaml), ...)
+"""
+
+import os
+
+import cv2
+import numpy as np
+import ultralytics.data.base as ultralytics_base
+from ultralytics.data import YOLODataset
+from ultralytics.data.utils import get_split_fraction
+from ultralytics.models.yolo.detect import DetectionTrainer, DetectionValidator
+from ultralytics.utils import LOGGER, colorstr
+from ultralytics.utils.torch_utils import unwrap_model
+
+from dataset_shards import ShardReader, is_shard_dir, is_sharded
+
+
+# 已打开的分片：{分片目录: ShardReader}
+_READERS = {}
+
+_original_imread = ultralytics_base.imread
+
+
+def find_shard_member(path):
+    """
+    查找已打开分片中的虚拟路径
+
+    Args:
+        path: 图片路径（分片目录/文件名）
+
+    Returns:
+        (ShardReader, 下标)；不是已打开分片中的图片时返回 None
+    """
+    reader = _READERS.get(os.path.dirname(path))
+    if reader is None:
+        return None
+    i = reader.find(os.path.basename(path))
+    return None if i is None else (reader, i)
+
+
+def _imread(filename, flags=cv2.IMREAD_COLOR):
+    """ultralytics 读取图片的入口：分片中的虚拟路径从 mmap 解码，其它路径照常读取文件"""
+    member = find_shard_member(filename)
+    if member is not None:
+        reader, i = member
+        return reader.decode(i, flags)
+    return _original_imread(filename, flags=flags)
+
+
+def _register(reader):
+    _READERS[reader.shard_dir] = reader
+    ultralytics_base.imread = _imread
+
+
+class ShardedYOLODataset(YOLODataset):
+    """从分片读取的 YOLO 检测数据集"""
+
+    def __init__(self, *args, cache=False, **kwargs):
+        if cache == 'disk':
+            # 磁盘缓存会在图片旁写 .npy，分片中的图片没有真实路径
+            LOGGER.warning("cache='disk' is not supported for sharded datasets, images are read from shards")
+            cache = False
+        super().__init__(*args, cache=cache, **kwargs)
+
+    def __setstate__(self, state):
+        # DataLoader 子进程 (spawn) 中重新注册分片
+        self.__dict__.update(state)
+        _register(self.reader)
+
+    def get_img_files(self, img_path):
+        """分片中的图片，返回 分片目录/文件名 形式的虚拟路径"""
+        self.reader = ShardReader(img_path)
+        _register(self.reader)
+        count = len(self.reader)
+        if isinstance(self.fraction, int):
+            count = min(self.fraction, count)
+        else:
+            count = max(1, round(count * self.fraction))
+        self._indices = list(range(count))
+        return [self.reader.path(i) for i in self._indices]
+
+    def get_labels(self):
+        """标签和图片尺寸来自分片索引，跳过类别编号越界的图片"""
+        num_classes = len(self.data['names'])
+        self.label_files = []
+        labels = []
+        corrupt = 0
+        for i in self._indices:
+            boxes = self.reader.labels(i)
+            if len(boxes) and (boxes[:, 0].min() < 0 or boxes[:, 0].max() >= num_classes
+                               or (boxes[:, 1:] < 0).any()):
+                corrupt += 1
+                continue
+            # 与 ultralytics 校验标签时一致：去掉重复的框
+            boxes = np.unique(boxes, axis=0) if len(boxes) else np.zeros((0, 5), dtype=np.float32)
+            labels.append({
+                'im_file': self.reader.path(i),
+                'shape': tuple(int(v) for v in self.reader.shapes[i]),
+                'cls': boxes[:, 0:1].copy(),
+                'bboxes': boxes[:, 1:].copy(),
+                'segments': [],
+                'keypoints': None,
+                'normalized': True,
+                'bbox_format': 'xywh',
+            })
+        if corrupt:
+            LOGGER.warning(f"{self.prefix}Skipping {corrupt} images with invalid labels in {self.reader.shard_dir}")
+        if not labels:
+            raise RuntimeError(f"No valid images found in {self.reader.shard_dir}")
+        self.im_files = [label['im_file'] for label in labels]
+        return labels
+
+
+def build_shard_dataset(cfg, img_path, batch, data, mode='train', rect=False, stride=32, fraction=None):
+    """与 ultralytics build_yolo_dataset 的检测分支相同，数据集类换成 ShardedYOLODataset"""
+    if fraction is None:
+        fraction = get_split_fraction(cfg.fraction, 'train' if mode == 'train' else cfg.split)
+    return ShardedYOLODataset(
+        img_path=img_path,
+        imgsz=cfg.imgsz,
+        batch_size=batch,
+        augment=mode == 'train',
+        hyp=cfg,
+        rect=cfg.rect or rect,
+        cache=cfg.cache or None,
+        single_cls=cfg.single_cls or False,
+        stride=stride,
+        pad=0.0 if mode == 'train' else 0.5,
+        prefix=colorstr(f"{mode}: "),
+        task=cfg.task,
+        classes=cfg.classes,
+        data=data,
+        fraction=fraction,
+    )
+
+
+class ShardedDetectionTrainer(DetectionTrainer):
+    """训练 / 训练中验证使用分片数据集"""
+
+    def build_dataset(self, img_path, mode='train', batch=None):
+        if not is_shard_dir(img_path):
+            return super().build_dataset(img_path, mode, batch)
+        gs = max(int(unwrap_model(self.model).stride.max()), 32)
+        return build_shard_dataset(self.args, img_path, batch, self.data, mode=mode, rect=mode == 'val', stride=gs)
+
+
+class ShardedDetectionValidator(DetectionValidator):
+    """独立评估 (model.val) 使用分片数据集"""
+
+    def build_dataset(self, img_path, mode='val', batch=None):
+        if not is_shard_dir(img_path):
+            return super().build_dataset(img_path, mode, batch)
+        fraction = get_split_fraction(self.args.fraction, self.args.split or 'val')
+        return build_shard_dataset(self.args, img_path, batch, self.data, mode=mode, stride=self.stride,
+                                   fraction=fraction)
+
+
+def train_kwargs(data_yaml):
+    """data.yaml 指向分片时 model.train 需要的额外参数"""
+    return {'trainer': ShardedDetectionTrainer} if is_sharded(data_yaml) else {}
+
+
+def val_kwargs(data_yaml):
+    """data.yaml 指向分片时 model.val 需要的额外参数"""
+    return {'validator': ShardedDetectionValidator} if is_sharded(data_yaml) else {}
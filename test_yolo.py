@@ -1,15 +1,51 @@
 """
 YOLO12 模型推理测试脚本
 用于测试训练好的模型
+
+使用方式：
+  # PyTorch 后端（默认）
+  python test_yolo.py
+
+  # ONNX Runtime 后端（CPU 部署推荐，先用 export_model.py 导出 .onnx）
+  python test_yolo.py --backend onnx --model model_exporter/best.onnx --intra-threads 4
 """
 
-from ultralytics import YOLO
+import argparse
 import cv2
 import os
 from pathlib import Path
 
+import torch
+from ultralytics.engine.results import Results
+
+from inference_pipeline import VideoPipeline, iter_detections, list_images
+from model_registry import get_model
+from shard_training import val_kwargs
 
-def predict_image(model_path, image_path, save_dir='runs/predict', conf_threshold=0.25):
+
+def load_model(model_path, backend='torch', **backend_options):
+    """
+    按推理后端获取模型
+    
+    Args:
+        model_path: 模型路径 (torch: .pt，onnx: .onnx)
+        backend: 推理后端 ('torch' / 'onnx')
+        **backend_options: onnx 会话参数 (intra_op_threads / inter_op_threads)
+    
+    Returns:
+        YOLO 模型或 OnnxDetector
+    """
+    print(f"🤖 模型: {model_path} ({backend})")
+    return get_model(model_path, backend=backend, **backend_options)
+
+
+def to_results(image, path, names, detections):
+    """(N, 6) 检测数组 -> ultralytics Results，便于统一打印、绘制和保存"""
+    return Results(orig_img=image, path=path, names=names, boxes=torch.from_numpy(detections))
+
+
+def predict_image(model_path, image_path, save_dir='runs/predict', conf_threshold=0.25,
+                  backend='torch', **backend_options):
     """
     对单张图片进行预测
     
@@ -18,19 +54,31 @@ def predict_image(model_path, image_path, save_dir='runs/predict', conf_threshol
         image_path: 图片路径
         save_dir: 结果保存目录
         conf_threshold: 置信度阈值
+        backend: 推理后端 ('torch' / 'onnx')
+        **backend_options: onnx 会话参数
     """
-    print(f"🤖 加载模型: {model_path}")
-    model = YOLO(model_path)
+    model = load_model(model_path, backend, **backend_options)
     
     print(f"🖼️  预测图片: {image_path}")
-    results = model.predict(
-        source=image_path,
-        conf=conf_threshold,
-        save=True,
-        project=save_dir,
-        name='test',
-        exist_ok=True
-    )
+    if backend == 'onnx':
+        image = cv2.imread(image_path)
+        if image is None:
+            raise FileNotFoundError(f"无法读取图片: {image_path}")
+        result = to_results(image, image_path, model.names,
+                            model.predict([image], conf=conf_threshold)[0])
+        output_dir = Path(save_dir) / 'test'
+        output_dir.mkdir(parents=True, exist_ok=True)
+        result.save(filename=str(output_dir / Path(image_path).name))
+        results = [result]
+    else:
+        results = model.predict(
+            source=image_path,
+            conf=conf_threshold,
+            save=True,
+            project=save_dir,
+            name='test',
+            exist_ok=True
+        )
     
     # 打印检测结果
     for result in results:
@@ -45,66 +93,116 @@ def predict_image(model_path, image_path, save_dir='runs/predict', conf_threshol
     print(f"\n✅ 结果已保存到: {save_dir}/test/")
 
 
-def predict_folder(model_path, folder_path, save_dir='runs/predict', conf_threshold=0.25):
+def iter_folder_predictions(model, folder_path, conf_threshold=0.25, imgsz=640,
+                            batch_size=16, workers=4, prefetch=2):
+    """
+    批量、流式地预测文件夹中的图片
+
+    后台线程池解码 + letterbox，经有界队列送入模型，逐张产出结果，
+    内存占用与文件夹大小无关
+
+    Args:
+        model: YOLO 模型或 OnnxDetector
+        folder_path: 图片文件夹路径
+        conf_threshold: 置信度阈值
+        imgsz: 推理尺寸 (OnnxDetector 使用模型自身的输入尺寸)
+        batch_size: 批次大小
+        workers: 解码线程数
+        prefetch: 预取批次数
+
+    Yields:
+        ultralytics Results（坐标已映射回原图）
+    """
+    for item, data in iter_detections(model, list_images(folder_path), conf_threshold, imgsz,
+                                      batch_size, workers, prefetch):
+        yield to_results(item.image, item.path, model.names, data)
+
+
+def predict_folder(model_path, folder_path, save_dir='runs/predict', conf_threshold=0.25,
+                   imgsz=640, batch_size=16, workers=4, backend='torch', **backend_options):
     """
-    对文件夹中的所有图片进行预测
+    对文件夹中的所有图片进行批量预测
     
     Args:
         model_path: 模型权重路径
         folder_path: 图片文件夹路径
         save_dir: 结果保存目录
         conf_threshold: 置信度阈值
+        imgsz: 推理尺寸
+        batch_size: 批次大小
+        workers: 解码线程数
+        backend: 推理后端 ('torch' / 'onnx')
+        **backend_options: onnx 会话参数
+
+    Returns:
+        处理的图片数量
     """
-    print(f"🤖 加载模型: {model_path}")
-    model = YOLO(model_path)
-    
-    print(f"📁 预测文件夹: {folder_path}")
-    results = model.predict(
-        source=folder_path,
-        conf=conf_threshold,
-        save=True,
-        project=save_dir,
-        name='batch_test',
-        exist_ok=True
-    )
+    model = load_model(model_path, backend, **backend_options)
+    
+    output_dir = Path(save_dir) / 'batch_test'
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"📁 预测文件夹: {folder_path} (batch={batch_size}, workers={workers})")
+    image_count = 0
+    for result in iter_folder_predictions(model, folder_path, conf_threshold, imgsz,
+                                          batch_size=batch_size, workers=workers):
+        result.save(filename=str(output_dir / Path(result.path).name))
+        image_count += 1
+        if image_count % 1000 == 0:
+            print(f"已处理 {image_count} 张图片...")
     
-    print(f"\n✅ 处理了 {len(results)} 张图片")
+    print(f"\n✅ 处理了 {image_count} 张图片")
     print(f"✅ 结果已保存到: {save_dir}/batch_test/")
+    return image_count
 
 
-def predict_video(model_path, video_path, save_dir='runs/predict', conf_threshold=0.25):
+def predict_video(model_path, video_path, save_dir='runs/predict', conf_threshold=0.25,
+                  queue_size=8, drop_frames=None, backend='torch', **backend_options):
     """
     对视频进行预测
     
+    解码、推理、绘制+编码分别在独立线程中流水线执行
+    
     Args:
         model_path: 模型权重路径
-        video_path: 视频路径
+        video_path: 视频路径（也可以是摄像头编号或 rtsp 地址）
         save_dir: 结果保存目录
         conf_threshold: 置信度阈值
+        queue_size: 各阶段之间的队列容量
+        drop_frames: 推理跟不上时是否丢帧，None 表示仅实时源丢帧
+        backend: 推理后端 ('torch' / 'onnx')
+        **backend_options: onnx 会话参数
+
+    Returns:
+        推理的帧数
     """
-    print(f"🤖 加载模型: {model_path}")
-    model = YOLO(model_path)
+    model = load_model(model_path, backend, **backend_options)
+    
+    output_path = Path(save_dir) / 'video_test' / f"{Path(str(video_path)).stem}.mp4"
+    
+    if backend == 'onnx':
+        def infer(frame):
+            return to_results(frame, str(video_path), model.names,
+                              model.predict([frame], conf=conf_threshold)[0])
+    else:
+        def infer(frame):
+            return model.predict(frame, conf=conf_threshold, verbose=False)[0]
     
     print(f"🎥 预测视频: {video_path}")
-    results = model.predict(
-        source=video_path,
-        conf=conf_threshold,
-        save=True,
-        project=save_dir,
-        name='video_test',
-        exist_ok=True,
-        stream=True  # 流式处理，节省内存
+    pipeline = VideoPipeline(
+        video_path,
+        infer_fn=infer,
+        annotate_fn=lambda frame, result: result.plot(),
+        output_path=str(output_path),
+        queue_size=queue_size,
+        drop_frames=drop_frames
     )
-    
-    # 处理视频帧
-    frame_count = 0
-    for result in results:
-        frame_count += 1
-        if frame_count % 30 == 0:  # 每30帧打印一次
-            print(f"已处理 {frame_count} 帧...")
+    frame_count = pipeline.run(progress_every=30)
+    pipeline.print_stats()
     
     print(f"\n✅ 视频处理完成，共 {frame_count} 帧")
-    print(f"✅ 结果已保存到: {save_dir}/video_test/")
+    print(f"✅ 结果已保存到: {output_path}")
+    return frame_count
 
 
 def evaluate_model(model_path, data_yaml):
@@ -113,17 +211,17 @@ def evaluate_model(model_path, data_yaml):
     
     Args:
         model_path: 模型权重路径
-        data_yaml: 数据集配置文件
+        data_yaml: 数据集配置文件 (.onnx 模型由 ultralytics 自动使用 onnxruntime 评估)
     """
-    print(f"🤖 加载模型: {model_path}")
-    model = YOLO(model_path)
+    model = load_model(model_path)
     
     print(f"📊 在测试集上评估模型...")
     metrics = model.val(
         data=data_yaml,
         split='test',  # 使用测试集
         save_json=True,
-        plots=True
+        plots=True,
+        **val_kwargs(data_yaml)  # 分片数据集 (dataset_shards.py)
     )
     
     print("\n" + "=" * 60)
@@ -148,6 +246,42 @@ if __name__ == '__main__':
     # 置信度阈值
     CONF_THRESHOLD = 0.25
     
+    # 批量预测参数
+    BATCH_SIZE = 16    # 每批图片数
+    WORKERS = 4        # 解码线程数
+    
+    parser = argparse.ArgumentParser(description='YOLO12 模型推理测试')
+    parser.add_argument('--model', type=str, default=MODEL_PATH,
+                        help='模型路径 (.pt 或 .onnx)')
+    parser.add_argument('--backend', type=str, default='torch', choices=['torch', 'onnx'],
+                        help='推理后端 (默认: torch)')
+    parser.add_argument('--data', type=str, default=DATA_YAML,
+                        help='数据集配置文件')
+    parser.add_argument('--conf', type=float, default=CONF_THRESHOLD,
+                        help='置信度阈值')
+    parser.add_argument('--batch', type=int, default=BATCH_SIZE,
+                        help='批量预测的批次大小')
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help='图片解码线程数')
+    parser.add_argument('--intra-threads', type=int, default=None,
+                        help='onnxruntime 算子内线程数 (仅 onnx 后端)')
+    parser.add_argument('--inter-threads', type=int, default=None,
+                        help='onnxruntime 算子间线程数 (仅 onnx 后端)')
+    args = parser.parse_args()
+    
+    MODEL_PATH = args.model
+    DATA_YAML = args.data
+    CONF_THRESHOLD = args.conf
+    BATCH_SIZE = args.batch
+    WORKERS = args.workers
+    BACKEND = args.backend
+    BACKEND_OPTIONS = {}
+    if BACKEND == 'onnx':
+        BACKEND_OPTIONS = {
+            'intra_op_threads': args.intra_threads,
+            'inter_op_threads': args.inter_threads,
+        }
+    
     # ============ 选择测试模式 ============
     
     print("=" * 60)
@@ -160,6 +294,11 @@ if __name__ == '__main__':
         print("请先运行 train_yolo.py 训练模型")
         exit(1)
     
+    if BACKEND == 'onnx' and not MODEL_PATH.endswith('.onnx'):
+        print(f"❌ ONNX 后端需要 .onnx 模型: {MODEL_PATH}")
+        print("请先运行 export_model.py --format onnx 导出模型")
+        exit(1)
+    
     # 模式1: 在测试集上评估模型性能
     print("\n📊 模式1: 评估模型性能")
     evaluate_model(MODEL_PATH, DATA_YAML)
@@ -172,7 +311,11 @@ if __name__ == '__main__':
             MODEL_PATH, 
             test_images_path, 
             save_dir='runs/predict',
-            conf_threshold=CONF_THRESHOLD
+            conf_threshold=CONF_THRESHOLD,
+            batch_size=BATCH_SIZE,
+            workers=WORKERS,
+            backend=BACKEND,
+            **BACKEND_OPTIONS
         )
     else:
         print(f"⚠️  测试集图片目录不存在: {test_images_path}")
@@ -187,7 +330,9 @@ if __name__ == '__main__':
             MODEL_PATH,
             single_image,
             save_dir='runs/predict',
-            conf_threshold=CONF_THRESHOLD
+            conf_threshold=CONF_THRESHOLD,
+            backend=BACKEND,
+            **BACKEND_OPTIONS
         )
     """
     
@@ -201,7 +346,9 @@ if __name__ == '__main__':
             MODEL_PATH,
             video_path,
             save_dir='runs/predict',
-            conf_threshold=CONF_THRESHOLD
+            conf_threshold=CONF_THRESHOLD,
+            backend=BACKEND,
+            **BACKEND_OPTIONS
         )
     """
     
@@ -0,0 +1,37 @@
+"""image_size 与分片索引的 EXIF 方向一致性测试"""
+
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset_shards import _read_image  # noqa: E402
+from image_size import ImageSizeCache, read_image_size  # noqa: E402
+
+
+def _save(path, orientation):
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    Image.fromarray(np.zeros((40, 100, 3), dtype=np.uint8)).save(path, exif=exif)
+    return str(path)
+
+
+def test_rotated_jpeg_matches_shards(tmp_path):
+    for orientation, expected in ((1, (100, 40)), (3, (100, 40)), (6, (40, 100)), (8, (40, 100))):
+        path = _save(tmp_path / f"o{orientation}.jpg", orientation)
+        height, width = _read_image(path)[1]
+        assert read_image_size(path) == (width, height) == expected
+
+
+def test_pil_fallback_applies_orientation(tmp_path):
+    assert read_image_size(_save(tmp_path / 'o6.webp', 6)) == (40, 100)
+
+
+def test_cache_applies_orientation(tmp_path):
+    path = _save(tmp_path / 'o6.jpg', 6)
+    cache = ImageSizeCache(tmp_path / 'sizes.sqlite')
+    assert cache.get(path) == (40, 100)
+    cache.close()
@@ -0,0 +1,46 @@
+"""label_cache.parse_label_text 回归测试"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from label_cache import LabelCache, check_label_text, parse_label_text  # noqa: E402
+
+
+def test_five_columns():
+    boxes = parse_label_text('0 0.1 0.2 0.3 0.4\n1 0.5 0.5 0.2 0.2\n')
+    np.testing.assert_allclose(boxes, [[0, 0.1, 0.2, 0.3, 0.4], [1, 0.5, 0.5, 0.2, 0.2]], rtol=1e-6)
+
+
+def test_mixed_width_lines_do_not_misalign():
+    # 4 列 + 6 列，总数恰好是 5 的倍数：4 列的行忽略，6 列的行取前 5 列
+    boxes = parse_label_text('0 0.1 0.2 0.3\n1 0.5 0.5 0.2 0.2 0.9\n')
+    np.testing.assert_allclose(boxes, [[1, 0.5, 0.5, 0.2, 0.2]], rtol=1e-6)
+
+
+def test_short_lines_only():
+    assert parse_label_text('0 0.1 0.2\n\n').shape == (0, 5)
+    assert parse_label_text('').shape == (0, 5)
+
+
+def test_bad_tokens_skip_line_only():
+    boxes, bad = check_label_text('0 0.5 0.5 0.1 nan_x\n1 0.5 0.5 0.2 0.2\n0 0.5 nan 0.1 0.1\n')
+    np.testing.assert_allclose(boxes, [[1, 0.5, 0.5, 0.2, 0.2]], rtol=1e-6)
+    assert bad == 2
+
+
+def test_cache_records_malformed_files(tmp_path):
+    labels = tmp_path / 'labels'
+    labels.mkdir()
+    (labels / 'good.txt').write_text('0 0.5 0.5 0.1 0.1\n')
+    (labels / 'bad.txt').write_text('0 0.5 0.5 0.1 nan_x\n1 0.5 0.5 0.2 0.2\n')
+
+    for _ in range(2):
+        # 第二次从 .npz 读取，坏行统计仍然保留
+        cache = LabelCache.load(labels, verbose=False)
+        assert cache.malformed_files() == [('bad', 1)]
+        assert len(cache.get('bad')) == 1
+        assert len(cache.get('good')) == 1
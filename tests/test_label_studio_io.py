@@ -0,0 +1,32 @@
+"""label_studio_io.iter_json_array 回归测试"""
+
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from label_studio_io import iter_json_array  # noqa: E402
+
+
+def _parse(text, chunk_size=3):
+    # 小块读取，覆盖元素和分隔符被块边界截断的情况
+    return list(iter_json_array(io.StringIO(text), chunk_size))
+
+
+def test_valid_arrays():
+    items = [{'id': 1, 'data': {'image': 'a.jpg'}}, 12345, 'x', [1, 2], None, -0.5]
+    assert _parse(json.dumps(items)) == items
+    assert _parse(json.dumps(items, indent=2)) == items
+    assert _parse('[]') == []
+    assert _parse(' [ ] ') == []
+    assert _parse('') == []
+
+
+@pytest.mark.parametrize('text', ['[1 2]', '[1,,2]', '[,1]', '[1,]', '[,]', '[1', '{"a": 1}', '[1 2'])
+def test_malformed_arrays(text):
+    with pytest.raises(ValueError):
+        _parse(text)
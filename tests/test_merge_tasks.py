@@ -0,0 +1,48 @@
+"""yolo2label_studio.merge_tasks 回归测试"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from yolo2label_studio import TaskSpool, merge_tasks  # noqa: E402
+
+
+def _prediction(version, n):
+    return {'model_version': version, 'result': [{'id': 'tmp'} for _ in range(n)]}
+
+
+def test_predictions_keep_human_annotations():
+    existing = [{'id': 7, 'data': {'image': 'a'},
+                 'annotations': [{'result': [{'id': 'x'}]}],
+                 'predictions': [_prediction('m1', 2), _prediction('old', 1)]}]
+    updates = {'a': {'data': {'image': 'a'}, 'predictions': [_prediction('m1', 1)]}}
+
+    [task] = merge_tasks(existing, updates, set())
+    assert task['id'] == 7
+    assert task['annotations'] == [{'result': [{'id': '1_0'}]}]
+    # 同一 model_version 被替换，其它版本保留
+    assert [(p['model_version'], len(p['result'])) for p in task['predictions']] == [('old', 1), ('m1', 1)]
+
+
+def test_converted_tasks_replace_and_append():
+    existing = [{'data': {'image': 'a'}, 'annotations': [{'result': [{'id': 'x'}]}]},
+                {'data': {'image': 'b'}, 'annotations': []}]
+    updates = {'a': {'data': {'image': 'a'}, 'annotations': []},
+               'c': {'data': {'image': 'c'}, 'annotations': [{'result': [{'id': 'tmp'}]}]}}
+
+    tasks = list(merge_tasks(existing, updates, {'b'}))
+    assert [t['data']['image'] for t in tasks] == ['a', 'c']
+    assert tasks[0]['annotations'] == []
+    assert tasks[1]['annotations'][0]['result'][0]['id'] == '2_0'
+
+
+def test_merge_from_spool(tmp_path):
+    existing = [{'data': {'image': 'a'}, 'annotations': []}, {'data': {'image': 'b'}, 'annotations': []}]
+    with TaskSpool(tmp_path) as spool:
+        spool.extend([{'data': {'image': 'c'}, 'annotations': []},
+                      {'data': {'image': 'a'}, 'annotations': [{'result': [{'id': 'tmp'}]}]}])
+        tasks = list(merge_tasks(existing, spool, set()))
+    assert [t['data']['image'] for t in tasks] == ['a', 'b', 'c']
+    assert tasks[0]['annotations'][0]['result'][0]['id'] == '1_0'
+    assert list(tmp_path.iterdir()) == []
@@ -12,6 +12,9 @@ YOLO12 统一训练脚本
   # 方式2: 直接指定参数
   python train.py --device mps --model yolo12n.pt --epochs 50
   python train.py --device cuda --model yolo12s.pt --epochs 100
+  python train.py --config t4_standard --resized   # 使用预先缩放到 640 的数据集副本
+  python train.py --config t4_standard --data datasets_packed/data.yaml   # 使用打包的分片
+  python train.py --config t4_standard --autotune  # 自动搜索 batch / workers（结果按机器缓存）
   
   # 方式3: 使用默认配置（根据设备自动选择）
   python train.py                             # 自动检测设备
@@ -21,6 +24,9 @@ from ultralytics import YOLO
 import torch
 import os
 import argparse
+from model_registry import get_model
+from shard_training import train_kwargs, val_kwargs
+from training_timing import add_timing_callbacks
 from train_config import (
     QuickTestConfig, 
     StandardConfig, 
@@ -75,6 +81,18 @@ CONFIGS = {
 }
 
 
+# 数据增强参数（与 model.train 参数同名的小写形式）
+AUGMENT_KEYS = [
+    'HSV_H', 'HSV_S', 'HSV_V', 'DEGREES', 'TRANSLATE', 'SCALE', 'SHEAR',
+    'PERSPECTIVE', 'FLIPUD', 'FLIPLR', 'MOSAIC', 'MIXUP',
+]
+
+
+def augment_overrides(config):
+    """配置中的数据增强参数 -> ultralytics 训练参数"""
+    return {key.lower(): config[key] for key in AUGMENT_KEYS}
+
+
 def get_config(config_name=None, args=None):
     """
     获取配置
@@ -143,6 +161,8 @@ def get_config(config_name=None, args=None):
     
     # 命令行参数覆盖
     if args:
+        if args.data:
+            config['DATA_YAML'] = args.data
         if args.model:
             config['MODEL_NAME'] = args.model
         if args.epochs:
@@ -177,6 +197,7 @@ def main():
                         help='预设配置名称')
     
     # 核心参数
+    parser.add_argument('--data', type=str, help='数据集配置文件（可指向 dataset_shards.py 打包的分片）')
     parser.add_argument('--model', type=str, help='模型名称')
     parser.add_argument('--epochs', type=int, help='训练轮数')
     parser.add_argument('--batch', type=int, help='批次大小')
@@ -187,6 +208,14 @@ def main():
     parser.add_argument('--cache', type=str, 
                         choices=['ram', 'disk', 'false'],
                         help='数据缓存方式')
+    parser.add_argument('--resized', action='store_true',
+                        help='使用缩放到训练分辨率的数据集副本（dataset_resize.py，有变化时先同步）')
+    parser.add_argument('--resized-dir', type=str,
+                        help='缩放后的数据集目录 (默认: <数据集目录>_<imgsz>)')
+    parser.add_argument('--autotune', action='store_true',
+                        help='训练前自动搜索 batch size 和 workers（--batch / --workers 指定的值优先）')
+    parser.add_argument('--autotune-refresh', action='store_true',
+                        help='忽略本机调优缓存，重新探测')
     
     args = parser.parse_args()
     
@@ -237,11 +266,44 @@ def main():
     if not os.path.exists(config['DATA_YAML']):
         raise FileNotFoundError(f"数据集配置文件不存在: {config['DATA_YAML']}")
     
+    if args.resized:
+        from dataset_resize import resize_dataset
+        
+        print(f"\n🖼️  同步缩放后的数据集 (长边 {config['IMG_SIZE']})...")
+        config['DATA_YAML'] = resize_dataset(
+            os.path.dirname(config['DATA_YAML']) or '.',
+            output_dir=args.resized_dir,
+            imgsz=config['IMG_SIZE'],
+            data_yaml=config['DATA_YAML'],
+        )
+        print(f"✅ 使用缩放后的数据集: {config['DATA_YAML']}")
+    
+    if args.autotune or args.autotune_refresh:
+        from train_autotune import autotune
+        
+        print("\n⏱️  自动搜索 batch size 和 workers...")
+        tuned = autotune(
+            config['MODEL_NAME'],
+            config['DATA_YAML'],
+            config['IMG_SIZE'],
+            config['DEVICE'],
+            overrides=augment_overrides(config),
+            refresh=args.autotune_refresh,
+        )
+        if not args.batch:
+            config['BATCH_SIZE'] = tuned['batch']
+        if not args.workers:
+            config['WORKERS'] = tuned['workers']
+        print(f"✅ Batch Size: {config['BATCH_SIZE']}, Workers: {config['WORKERS']}")
+    
     # ============ 加载模型 ============
     print("\n📥 加载模型...")
     model = YOLO(config['MODEL_NAME'])
     print(f"✅ 模型加载成功: {config['MODEL_NAME']}")
     
+    # 每个 epoch 的吞吐、耗时和内存写入运行目录的 timing.csv
+    add_timing_callbacks(model)
+    
     # ============ 开始训练 ============
     print("\n🏋️ 开始训练...\n")
     
@@ -290,6 +352,9 @@ def main():
         if config['CACHE']:
             train_args['cache'] = config['CACHE']
         
+        # 分片数据集使用 shard_training 中的训练器
+        train_args.update(train_kwargs(config['DATA_YAML']))
+        
         # 开始训练
         results = model.train(**train_args)
         
@@ -303,8 +368,9 @@ def main():
         
         # 验证模型
         print("\n🔍 在验证集上评估...")
-        best_model = YOLO(best_path)
-        metrics = best_model.val(data=config['DATA_YAML'], device=config['DEVICE'])
+        best_model = get_model(best_path, device=config['DEVICE'])
+        metrics = best_model.val(data=config['DATA_YAML'], device=config['DEVICE'],
+                                 **val_kwargs(config['DATA_YAML']))
         
         print("\n📊 性能指标:")
         print(f"  mAP50: {metrics.box.map50:.4f}")
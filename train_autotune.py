@@ -0,0 +1,443 @@
+"""
+训练前自动搜索 batch size 和 workers
+在当前设备（CUDA / MPS / CPU）上做短时计时探测，选出内存预算内吞吐 (images/sec) 最高的配置，
+结果写入本机的调优缓存，键为 (模型, imgsz, 硬件)，之后的训练直接使用，不再探测
+
+- batch: 用随机图像和合成标注跑若干步 前向 + 反向 + 优化器更新，记录吞吐和峰值内存；
+  batch 从小到大探测，预计超出内存预算或 OOM 时停止，取吞吐接近最高值的最小 batch
+- workers: 用选定的 batch 构建真实的训练数据集和增强流程，测量不同 workers 的加载吞吐，
+  取达到模型吞吐所需的最少 workers
+- ultralytics 在 CPU / MPS 上强制 workers=0（数据在主进程加载），此时只搜索 batch
+
+使用方式：
+  python train.py --config t4_standard --autotune                  # 有缓存直接使用，没有则先探测
+  python train.py --config m1_standard --autotune --autotune-refresh
+  python train_autotune.py --model yolo12s.pt --device cuda --imgsz 640
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import time
+
+import torch
+
+
+# 本机调优缓存
+AUTOTUNE_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'yolo12', 'autotune.json')
+
+# 候选值
+BATCH_CANDIDATES = (4, 8, 16, 24, 32, 48, 64, 96, 128)
+WORKER_CANDIDATES = (0, 2, 4, 6, 8, 12, 16)
+
+# 默认内存预算：设备（CPU 为内存）总容量的比例
+MEMORY_FRACTION = 0.85
+
+# 探测步数
+WARMUP_STEPS = 2
+PROBE_STEPS = 5
+LOADER_BATCHES = 10
+
+# 吞吐达到最高值的这个比例即视为足够（取更小的 batch / 更少的 workers）
+THROUGHPUT_TOLERANCE = 0.95
+
+# 合成标注：每张图的框数
+BOXES_PER_IMAGE = 8
+
+MB = 1024 * 1024
+
+
+def _torch_device(device):
+    """train.py 的设备参数 ('cuda' / '0' / 'mps' / 'cpu') -> torch.device"""
+    device = str(device)
+    if device == 'cuda':
+        return torch.device('cuda:0')
+    if device.isdigit():
+        return torch.device(f'cuda:{device}')
+    return torch.device(device)
+
+
+def _host_memory_mb():
+    """(总内存, 可用内存) MB"""
+    import psutil
+
+    memory = psutil.virtual_memory()
+    return memory.total / MB, memory.available / MB
+
+
+def _host_used_mb():
+    """当前进程和子进程（数据加载 workers）的常驻内存之和 MB"""
+    import psutil
+
+    process = psutil.Process()
+    total = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / MB
+
+
+def hardware_key(device):
+    """
+    当前机器和设备的标识
+
+    Args:
+        device: 训练设备
+
+    Returns:
+        如 'host|cuda|Tesla T4|15GB'、'host|cpu|x86_64|8c|31GB'
+    """
+    device = _torch_device(device)
+    host_total, _ = _host_memory_mb()
+    parts = [socket.gethostname(), device.type]
+    if device.type == 'cuda':
+        props = torch.cuda.get_device_properties(device)
+        parts += [props.name, f"{props.total_memory / 1024 ** 3:.0f}GB"]
+    else:
+        parts += [platform.processor() or platform.machine(), f"{os.cpu_count()}c", f"{host_total / 1024:.0f}GB"]
+    return '|'.join(parts)
+
+
+def tuning_key(model_name, imgsz, device):
+    """调优缓存的键：模型 | imgsz | 硬件"""
+    return f"{os.path.normpath(model_name)}|{imgsz}|{hardware_key(device)}"
+
+
+def load_tuning(key, cache_path=AUTOTUNE_CACHE):
+    """读取缓存的调优结果，没有时返回 None"""
+    if not os.path.exists(cache_path):
+        return None
+    with open(cache_path, 'r', encoding='utf-8') as f:
+        return json.load(f).get(key)
+
+
+def save_tuning(key, result, cache_path=AUTOTUNE_CACHE):
+    """写入调优结果（保留其它键）"""
+    entries = {}
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+    entries[key] = result
+
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+
+
+def _memory_budget_mb(device, memory_fraction):
+    """设备内存预算 MB（CPU 为主机内存：当前占用 + 可用内存）"""
+    if device.type == 'cuda':
+        return torch.cuda.get_device_properties(device).total_memory / MB * memory_fraction
+    if device.type == 'mps':
+        return torch.mps.recommended_max_memory() / MB * memory_fraction
+    _, available = _host_memory_mb()
+    return _host_used_mb() + available * memory_fraction
+
+
+def _memory_used_mb(device):
+    if device.type == 'cuda':
+        return torch.cuda.max_memory_reserved(device) / MB
+    if device.type == 'mps':
+        return torch.mps.driver_allocated_memory() / MB
+    return _host_used_mb()
+
+
+def _synchronize(device):
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+    elif device.type == 'mps':
+        torch.mps.synchronize()
+
+
+def _release(device):
+    if device.type == 'cuda':
+        torch.cuda.empty_cache()
+    elif device.type == 'mps':
+        torch.mps.empty_cache()
+
+
+def _synthetic_batch(batch, imgsz, device):
+    """随机图像 + 每张 BOXES_PER_IMAGE 个随机框，格式与 DetectionTrainer.preprocess_batch 的输出一致"""
+    count = batch * BOXES_PER_IMAGE
+    xy = torch.rand(count, 2, device=device) * 0.6 + 0.2
+    wh = torch.rand(count, 2, device=device) * 0.2 + 0.05
+    return {
+        'img': torch.rand(batch, 3, imgsz, imgsz, device=device),
+        'batch_idx': torch.arange(batch, device=device).repeat_interleave(BOXES_PER_IMAGE).float(),
+        'cls': torch.zeros(count, 1, device=device),
+        'bboxes': torch.cat([xy, wh], dim=1),
+    }
+
+
+def probe_batch_sizes(model_name, imgsz, device, memory_fraction=MEMORY_FRACTION, candidates=BATCH_CANDIDATES):
+    """
+    探测不同 batch 的训练吞吐和峰值内存
+
+    Args:
+        model_name: 模型权重或 yaml
+        imgsz: 图像尺寸
+        device: 训练设备
+        memory_fraction: 内存预算比例
+        candidates: 候选 batch，从小到大
+
+    Returns:
+        [{'batch', 'images_per_sec', 'memory_mb'}, ...]，只包含预算内成功的 batch
+    """
+    from ultralytics import YOLO
+    from ultralytics.cfg import get_cfg
+    from ultralytics.utils import DEFAULT_CFG
+
+    device = _torch_device(device)
+    model = YOLO(model_name).model.to(device)
+    model.args = get_cfg(DEFAULT_CFG)
+    model.train()
+    for p in model.parameters():
+        p.requires_grad = True
+    optimizer = torch.optim.SGD(model.parameters(), lr=1e-9, momentum=0.9)
+    # 与训练一致：AMP 只在 CUDA 上启用
+    amp = device.type == 'cuda'
+
+    budget = _memory_budget_mb(device, memory_fraction)
+    _release(device)
+    base = _memory_used_mb(device)
+    print(f"🔍 探测 batch: 设备 {device}, 内存预算 {budget:.0f} MB")
+
+    rows = []
+    for batch in candidates:
+        # 按已测数据线性外推，预计超出预算时不再尝试（MPS / CPU 超出内存会严重变慢而不是报错）
+        if rows:
+            last = rows[-1]
+            per_image = max(last['memory_mb'] - base, 0) / last['batch']
+            if base + per_image * batch > budget:
+                print(f"  batch {batch}: 预计超出内存预算，停止")
+                break
+        if device.type == 'cuda':
+            torch.cuda.reset_peak_memory_stats(device)
+        try:
+            data = _synthetic_batch(batch, imgsz, device)
+            for step in range(WARMUP_STEPS + PROBE_STEPS):
+                if step == WARMUP_STEPS:
+                    _synchronize(device)
+                    start = time.perf_counter()
+                with torch.autocast(device.type, enabled=amp):
+                    loss, _ = model.loss(data)
+                loss.sum().backward()
+                optimizer.step()
+                optimizer.zero_grad(set_to_none=True)
+            _synchronize(device)
+            elapsed = time.perf_counter() - start
+        except RuntimeError as e:
+            if 'out of memory' not in str(e).lower():
+                raise
+            print(f"  batch {batch}: 内存不足，停止")
+            break
+        finally:
+            data = loss = None
+            optimizer.zero_grad(set_to_none=True)
+            _release(device)
+
+        used = _memory_used_mb(device)
+        row = {'batch': batch, 'images_per_sec': batch * PROBE_STEPS / elapsed, 'memory_mb': used}
+        if used > budget:
+            print(f"  batch {batch}: {used:.0f} MB 超出内存预算，停止")
+            break
+        rows.append(row)
+        print(f"  batch {batch}: {row['images_per_sec']:.1f} img/s, {used:.0f} MB")
+
+    del model, optimizer
+    _release(device)
+    return rows
+
+
+def build_train_dataset(data_yaml, imgsz, batch, overrides=None, cache=False):
+    """
+    构建与训练时相同的训练集和增强流程
+
+    Args:
+        data_yaml: 数据集配置文件（可指向分片）
+        imgsz: 图像尺寸
+        batch: batch size
+        overrides: 训练参数（增强设置等）
+        cache: 图像缓存方式，默认不缓存
+
+    Returns:
+        ultralytics 训练数据集
+    """
+    from ultralytics.cfg import get_cfg
+    from ultralytics.data import build_yolo_dataset
+    from ultralytics.data.utils import check_det_dataset
+    from ultralytics.utils import DEFAULT_CFG
+
+    from dataset_shards import is_shard_dir
+
+    cfg = get_cfg(DEFAULT_CFG, {**(overrides or {}), 'data': data_yaml, 'imgsz': imgsz, 'cache': cache})
+    data = check_det_dataset(data_yaml)
+    if is_shard_dir(data['train']):
+        from shard_training import build_shard_dataset
+        return build_shard_dataset(cfg, data['train'], batch, data, mode='train')
+    return build_yolo_dataset(cfg, data['train'], batch, data, mode='train')
+
+
+def _loader_throughput(dataset, batch, workers, device):
+    """(images/sec, 主进程 + workers 常驻内存 MB)"""
+    from ultralytics.data import build_dataloader
+
+    loader = build_dataloader(dataset, batch, workers, shuffle=True, device=device)
+    try:
+        def batches():
+            while True:
+                yield from loader
+
+        iterator = batches()
+        for _ in range(WARMUP_STEPS):
+            next(iterator)
+        start = time.perf_counter()
+        images = 0
+        for _ in range(LOADER_BATCHES):
+            images += len(next(iterator)['img'])
+        elapsed = time.perf_counter() - start
+        return images / elapsed, _host_used_mb()
+    finally:
+        if hasattr(loader, 'close'):
+            loader.close()
+
+
+def probe_workers(data_yaml, imgsz, batch, device, target_ips=None, memory_fraction=MEMORY_FRACTION,
+                  candidates=WORKER_CANDIDATES, overrides=None):
+    """
+    探测不同 workers 的数据加载吞吐
+
+    Args:
+        data_yaml: 数据集配置文件
+        imgsz: 图像尺寸
+        batch: batch size
+        device: 训练设备
+        target_ips: 模型吞吐，加载吞吐达到后不再增加 workers
+        memory_fraction: 主机内存预算比例
+        candidates: 候选 workers，从小到大（超过 CPU 核数的跳过）
+        overrides: 训练参数（增强设置等）
+
+    Returns:
+        [{'workers', 'images_per_sec', 'host_memory_mb'}, ...]
+    """
+    device = _torch_device(device)
+    dataset = build_train_dataset(data_yaml, imgsz, batch, overrides)
+    _, available = _host_memory_mb()
+    budget = _host_used_mb() + available * memory_fraction
+    print(f"🔍 探测 workers: batch {batch}, 主机内存预算 {budget:.0f} MB")
+
+    rows = []
+    for workers in candidates:
+        if workers > (os.cpu_count() or 1):
+            break
+        ips, used = _loader_throughput(dataset, batch, workers, device)
+        if used > budget:
+            print(f"  workers {workers}: {used:.0f} MB 超出主机内存预算，停止")
+            break
+        rows.append({'workers': workers, 'images_per_sec': ips, 'host_memory_mb': used})
+        print(f"  workers {workers}: {ips:.1f} img/s, {used:.0f} MB")
+        if target_ips and ips >= target_ips:
+            break
+    return rows
+
+
+def autotune(model_name, data_yaml, imgsz, device, overrides=None, memory_fraction=MEMORY_FRACTION,
+             cache_path=AUTOTUNE_CACHE, refresh=False):
+    """
+    搜索 batch size 和 workers，结果按 (模型, imgsz, 硬件) 缓存
+
+    Args:
+        model_name: 模型权重或 yaml
+        data_yaml: 数据集配置文件
+        imgsz: 图像尺寸
+        device: 训练设备 ('cuda' / '0' / 'mps' / 'cpu')
+        overrides: 训练参数（增强设置等），用于构建加载探测的数据集
+        memory_fraction: 内存预算比例
+        cache_path: 调优缓存文件
+        refresh: 忽略缓存重新探测
+
+    Returns:
+        {'batch', 'workers', 'images_per_sec', ...}
+    """
+    key = tuning_key(model_name, imgsz, device)
+    if not refresh:
+        cached = load_tuning(key, cache_path)
+        if cached:
+            print(f"⚡ 使用调优缓存: batch {cached['batch']}, workers {cached['workers']} "
+                  f"({cached['images_per_sec']:.1f} img/s, {cached['tuned_at']})")
+            return cached
+
+    batch_rows = probe_batch_sizes(model_name, imgsz, device, memory_fraction)
+    if not batch_rows:
+        raise RuntimeError(f"最小的 batch ({BATCH_CANDIDATES[0]}) 也超出内存预算")
+    # 吞吐接近最高值的最小 batch，留出内存余量
+    top = max(row['images_per_sec'] for row in batch_rows)
+    best = next(row for row in batch_rows if row['images_per_sec'] >= top * THROUGHPUT_TOLERANCE)
+    model_ips = best['images_per_sec']
+
+    pipelined = _torch_device(device).type == 'cuda'
+    worker_rows = probe_workers(data_yaml, imgsz, best['batch'], device,
+                                target_ips=model_ips if pipelined else None,
+                                memory_fraction=memory_fraction,
+                                candidates=WORKER_CANDIDATES if pipelined else (0,),
+                                overrides=overrides)
+    fastest = max(row['images_per_sec'] for row in worker_rows)
+    # 达到需要的加载吞吐的最少 workers
+    needed = min(model_ips, fastest) * THROUGHPUT_TOLERANCE
+    chosen = next(row for row in worker_rows if row['images_per_sec'] >= needed)
+
+    loader_ips = chosen['images_per_sec']
+    if pipelined:
+        images_per_sec = min(model_ips, loader_ips)
+    else:
+        # workers=0：加载和计算串行
+        images_per_sec = 1 / (1 / model_ips + 1 / loader_ips)
+
+    result = {
+        'batch': best['batch'],
+        'workers': chosen['workers'],
+        'images_per_sec': images_per_sec,
+        'model_images_per_sec': model_ips,
+        'loader_images_per_sec': loader_ips,
+        'memory_mb': best['memory_mb'],
+        'memory_fraction': memory_fraction,
+        'batch_probes': batch_rows,
+        'worker_probes': worker_rows,
+        'tuned_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    save_tuning(key, result, cache_path)
+    print(f"✅ 调优完成: batch {result['batch']}, workers {result['workers']}, "
+          f"约 {images_per_sec:.1f} img/s -> {cache_path}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='训练前自动搜索 batch size 和 workers')
+    parser.add_argument('--model', type=str, default='yolo12n.pt',
+                        help='模型 (默认: yolo12n.pt)')
+    parser.add_argument('--data', type=str, default='datasets/data.yaml',
+                        help='数据集配置文件 (默认: datasets/data.yaml)')
+    parser.add_argument('--imgsz', type=int, default=640,
+                        help='图像尺寸 (默认: 640)')
+    parser.add_argument('--device', type=str, default='cuda' if torch.cuda.is_available() else 'cpu',
+                        help='设备 (默认: 有 CUDA 时 cuda，否则 cpu)')
+    parser.add_argument('--memory-fraction', type=float, default=MEMORY_FRACTION,
+                        help=f'内存预算比例 (默认: {MEMORY_FRACTION})')
+    parser.add_argument('--cache-file', type=str, default=AUTOTUNE_CACHE,
+                        help=f'调优缓存文件 (默认: {AUTOTUNE_CACHE})')
+    parser.add_argument('--refresh', action='store_true',
+                        help='忽略缓存重新探测')
+    args = parser.parse_args()
+
+    autotune(args.model, args.data, args.imgsz, args.device, memory_fraction=args.memory_fraction,
+             cache_path=args.cache_file, refresh=args.refresh)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,7 @@ YOLO12 目标检测训练脚本
 from ultralytics import YOLO
 import torch
 import os
+from training_timing import add_timing_callbacks
 
 # ============ 配置方式选择 ============
 # 取消下面某一行的注释，使用对应的配置类
@@ -156,6 +157,9 @@ def main():
     
     print(f"✅ 模型加载成功: {model_name}")
     
+    # 每个 epoch 的吞吐、耗时和内存写入运行目录的 timing.csv
+    add_timing_callbacks(model)
+    
     # ============ 开始训练 ============
     print("\n🏋️ 开始训练...\n")
     
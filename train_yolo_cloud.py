@@ -13,6 +13,7 @@ CPU: 8核, 内存: 16GB
 from ultralytics import YOLO
 import torch
 import os
+from training_timing import add_timing_callbacks
 
 def main():
     # ============ 配置参数 (T4 GPU 优化) ============
@@ -78,6 +79,9 @@ def main():
     model = YOLO(model_name)
     print(f"✅ 模型加载成功: {model_name}")
     
+    # 每个 epoch 的吞吐、耗时和内存写入运行目录的 timing.csv
+    add_timing_callbacks(model)
+    
     # ============ 开始训练 ============
     print("\n🏋️ 开始训练...\n")
     
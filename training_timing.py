@@ -0,0 +1,183 @@
+"""
+训练吞吐记录
+注册到 ultralytics 训练回调，每个 epoch 往运行目录的 timing.csv 追加一行：
+
+  images_per_sec       训练阶段吞吐（不含验证）
+  data_wait_s          等待 DataLoader 的时间（上一个 batch 结束到下一个 batch 开始）
+  compute_s            前向 + 反向 + 优化器更新
+  val_s                验证 + 写结果 + 保存权重
+  iter_ms_p50 / p95    单次迭代（等待数据 + 计算）耗时
+  host_rss_mb          主进程常驻内存；workers_rss_mb 为 DataLoader workers 合计
+  device_mem_mb        CUDA 峰值保留显存 / MPS 已分配内存
+
+新训练时重新生成 timing.csv；resume 时保留已完成 epoch 的记录
+
+使用方式：
+  from training_timing import add_timing_callbacks
+  model = YOLO('yolo12n.pt')
+  add_timing_callbacks(model)
+  model.train(...)
+"""
+
+import csv
+import os
+import time
+
+import numpy as np
+import torch
+
+
+TIMING_NAME = 'timing.csv'
+
+COLUMNS = ['epoch', 'images', 'iterations', 'images_per_sec', 'epoch_s', 'train_s', 'data_wait_s',
+           'compute_s', 'val_s', 'iter_ms_p50', 'iter_ms_p95', 'host_rss_mb', 'workers_rss_mb', 'device_mem_mb']
+
+MB = 1024 * 1024
+
+
+def _host_rss_mb():
+    """(主进程, 子进程合计) 常驻内存 MB"""
+    import psutil
+
+    process = psutil.Process()
+    workers = 0
+    for child in process.children(recursive=True):
+        try:
+            workers += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return process.memory_info().rss / MB, workers / MB
+
+
+def _synchronize(device):
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+    elif device.type == 'mps':
+        torch.mps.synchronize()
+
+
+def _device_memory_mb(device):
+    if device.type == 'cuda':
+        return torch.cuda.max_memory_reserved(device) / MB
+    if device.type == 'mps':
+        return torch.mps.driver_allocated_memory() / MB
+    return 0.0
+
+
+class TimingRecorder:
+    """记录每个 epoch 的耗时和内存，写入 <运行目录>/timing.csv"""
+
+    def __init__(self):
+        self.path = None
+        self._reset()
+
+    def _reset(self):
+        self.iter_times = []
+        self.data_wait = 0.0
+        self.compute = 0.0
+        self.train_end = None
+
+    def on_train_start(self, trainer):
+        self.path = os.path.join(trainer.save_dir, TIMING_NAME)
+        if not trainer.args.resume:
+            # 与 results.csv 一致：新训练重新生成
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        elif os.path.exists(self.path):
+            # resume：丢弃最后一个检查点之后的记录
+            with open(self.path, 'r', encoding='utf-8', newline='') as f:
+                rows = [row for row in csv.DictReader(f) if int(row['epoch']) <= trainer.start_epoch]
+            with open(self.path, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=COLUMNS)
+                writer.writeheader()
+                writer.writerows(rows)
+
+    def on_train_epoch_start(self, trainer):
+        self._reset()
+        if trainer.device.type == 'cuda':
+            torch.cuda.reset_peak_memory_stats(trainer.device)
+        self.epoch_start = self.batch_end = time.perf_counter()
+
+    def on_train_batch_start(self, trainer):
+        self.batch_start = time.perf_counter()
+        self.data_wait += self.batch_start - self.batch_end
+
+    def on_train_batch_end(self, trainer):
+        _synchronize(trainer.device)
+        now = time.perf_counter()
+        self.compute += now - self.batch_start
+        self.iter_times.append(now - self.batch_end)
+        self.batch_end = now
+
+    def on_train_epoch_end(self, trainer):
+        self.train_end = time.perf_counter()
+
+    def on_fit_epoch_end(self, trainer):
+        # 训练结束后的最终验证也会触发 on_fit_epoch_end，这时没有新的迭代，不记录
+        if self.path is None or not self.iter_times:
+            return
+        now = time.perf_counter()
+        train_s = self.train_end - self.epoch_start
+        iterations = len(self.iter_times)
+        images = min(iterations * trainer.batch_size, len(trainer.train_loader.dataset))
+        iter_ms = np.asarray(self.iter_times) * 1000
+        host_rss, workers_rss = _host_rss_mb()
+        row = {
+            'epoch': trainer.epoch + 1,
+            'images': images,
+            'iterations': iterations,
+            'images_per_sec': round(images / train_s, 2),
+            'epoch_s': round(now - self.epoch_start, 3),
+            'train_s': round(train_s, 3),
+            'data_wait_s': round(self.data_wait, 3),
+            'compute_s': round(self.compute, 3),
+            'val_s': round(now - self.train_end, 3),
+            'iter_ms_p50': round(float(np.percentile(iter_ms, 50)), 2),
+            'iter_ms_p95': round(float(np.percentile(iter_ms, 95)), 2),
+            'host_rss_mb': round(host_rss, 1),
+            'workers_rss_mb': round(workers_rss, 1),
+            'device_mem_mb': round(_device_memory_mb(trainer.device), 1),
+        }
+        new_file = not os.path.exists(self.path)
+        with open(self.path, 'a', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            if new_file:
+                writer.writeheader()
+            writer.writerow(row)
+        self._reset()
+
+
+def add_timing_callbacks(model):
+    """
+    给 YOLO 模型注册吞吐记录回调
+
+    Args:
+        model: ultralytics YOLO 对象（在 model.train 之前调用）
+
+    Returns:
+        TimingRecorder
+    """
+    recorder = TimingRecorder()
+    for event in ('on_train_start', 'on_train_epoch_start', 'on_train_batch_start', 'on_train_batch_end',
+                  'on_train_epoch_end', 'on_fit_epoch_end'):
+        model.add_callback(event, getattr(recorder, event))
+    return recorder
+
+
+def read_timing(run_dir):
+    """
+    读取运行目录中的 timing.csv
+
+    Args:
+        run_dir: 训练运行目录
+
+    Returns:
+        pandas.DataFrame，没有记录时返回 None
+    """
+    import pandas as pd
+
+    path = os.path.join(run_dir, TIMING_NAME)
+    if not os.path.exists(path):
+        return None
+    df = pd.read_csv(path)
+    return df if len(df) else None
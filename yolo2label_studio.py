@@ -8,31 +8,69 @@ Usage:
     python yolo2label_studio.py --dataset valid --output output.json
     python yolo2label_studio.py --dataset test --output output.json
     python yolo2label_studio.py --dataset-path /custom/path --output output.json
+    python yolo2label_studio.py --dataset train --output output.json --workers 16
+    python yolo2label_studio.py --dataset train --output output.jsonl --compact --gzip --shard-size 10000
+    python yolo2label_studio.py --dataset train --output delta.json --incremental --tombstones
+    python yolo2label_studio.py --dataset-path ./datasets/unlabeled --output pre.json --model best.pt
+    python yolo2label_studio.py --dataset train --output output.json --shards datasets_packed/train
 """
 
+import gzip
 import json
 import os
 import argparse
-import yaml
+import shutil
+import sqlite3
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import base64
-from PIL import Image
+
+import numpy as np
+
+from conversion_manifest import MANIFEST_NAME, ConversionManifest, file_digest
+from dataset_shards import ShardReader
+from image_size import SIZE_CACHE_NAME, ImageSizeCache, read_image_size
+from label_cache import LabelCache, parse_label_file
+from label_studio_io import iter_json_array, load_config
+
+
+# 支持的图像格式
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif'}
+
+# 并行转换时每个子任务包含的图像数
+DEFAULT_CHUNK_SIZE = 256
+
+# 输出格式: json 为任务数组，jsonl 为每行一个任务
+OUTPUT_FORMATS = ('json', 'jsonl')
 
 
 class YoloToLabelStudioConverter:
     """YOLO格式到Label Studio格式的转换器"""
     
-    def __init__(self, dataset_root: str, class_names: List[str]):
+    def __init__(self, dataset_root: str, class_names: List[str],
+                 size_cache: Optional[ImageSizeCache] = None,
+                 label_cache: Optional[LabelCache] = None,
+                 shard_reader: Optional[ShardReader] = None):
         """
         初始化转换器
         
         Args:
             dataset_root: 数据集根目录路径
             class_names: 类别名称列表
+            size_cache: 图像尺寸缓存，None 表示每次都读取文件头
+            label_cache: 标签缓存，None 表示每次都解析标签文件
+            shard_reader: 打包后的划分 (dataset_shards.py)，图像尺寸和标注从分片索引读取
         """
         self.dataset_root = Path(dataset_root)
         self.class_names = class_names
+        self.size_cache = size_cache
+        self.label_cache = label_cache
+        self.shard_reader = shard_reader
+        self.unknown_class_ids = {}
         
     def read_yolo_annotation(self, label_file: Path) -> List[Dict[str, Any]]:
         """
@@ -44,27 +82,30 @@ class YoloToLabelStudioConverter:
         Returns:
             标注列表,每个标注包含class_id, x_center, y_center, width, height
         """
-        annotations = []
+        if self.label_cache is not None:
+            boxes = self.label_cache.read(label_file)
+        else:
+            boxes = parse_label_file(label_file)
+        return self.boxes_to_annotations(boxes)
+    
+    @staticmethod
+    def boxes_to_annotations(boxes) -> List[Dict[str, Any]]:
+        """
+        (N, 5) 标注数组转换为标注列表
         
-        if not label_file.exists():
-            return annotations
+        Args:
+            boxes: [class_id, x_center, y_center, width, height] float32 数组
             
-        with open(label_file, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                    
-                parts = line.split()
-                if len(parts) >= 5:
-                    annotations.append({
-                        'class_id': int(parts[0]),
-                        'x_center': float(parts[1]),
-                        'y_center': float(parts[2]),
-                        'width': float(parts[3]),
-                        'height': float(parts[4])
-                    })
-                    
+        Returns:
+            标注列表,每个标注包含class_id, x_center, y_center, width, height
+        """
+        # 标签缓存以 float32 保存，直接转 float64 会带出 0.30000001192… 这样的尾数；
+        # YOLO 标签文件为 6 位小数，float32 的误差远小于 5e-7，四舍五入到 6 位即还原文件中的数值
+        coords = np.round(boxes[:, 1:].astype(np.float64), 6).tolist()
+        annotations = [
+            {'class_id': class_id, 'x_center': x, 'y_center': y, 'width': w, 'height': h}
+            for class_id, (x, y, w, h) in zip(boxes[:, 0].astype(int).tolist(), coords)
+        ]
         return annotations
     
     def yolo_to_label_studio_bbox(self, yolo_box: Dict[str, Any], 
@@ -101,6 +142,21 @@ class YoloToLabelStudioConverter:
             'height': h
         }
     
+    @staticmethod
+    def image_url(image_path: Path, dataset_relative_path: str = None) -> str:
+        """
+        Label Studio中的图像地址
+        
+        使用相对于datasets的路径，格式：/data/local-files/?d=相对路径
+        """
+        if dataset_relative_path:
+            # 构建相对路径：如 test/images/xxx.jpg
+            image_relative_path = f"{dataset_relative_path}/{image_path.name}"
+        else:
+            # 仅使用文件名
+            image_relative_path = image_path.name
+        return f"/data/local-files/?d={image_relative_path}"
+    
     def convert_image(self, image_path: Path, label_path: Path, 
                      task_id: int, dataset_relative_path: str = None) -> Dict[str, Any]:
         """
@@ -115,16 +171,26 @@ class YoloToLabelStudioConverter:
         Returns:
             Label Studio任务字典
         """
-        # 读取图像尺寸
+        # 分片中的图像：尺寸和标注都在索引中，不读取文件
+        shard_index = self.shard_reader.find(image_path.name) if self.shard_reader is not None else None
+        
+        # 读取图像尺寸（只解析文件头，命中缓存时不读取文件）
         try:
-            with Image.open(image_path) as img:
-                img_width, img_height = img.size
+            if shard_index is not None:
+                img_height, img_width = (int(v) for v in self.shard_reader.shapes[shard_index])
+            elif self.size_cache:
+                img_width, img_height = self.size_cache.get(image_path)
+            else:
+                img_width, img_height = read_image_size(image_path)
         except Exception as e:
             print(f"Warning: Cannot read image {image_path}: {e}")
             return None
         
         # 读取YOLO标注
-        yolo_annotations = self.read_yolo_annotation(label_path)
+        if shard_index is not None:
+            yolo_annotations = self.boxes_to_annotations(self.shard_reader.labels(shard_index))
+        else:
+            yolo_annotations = self.read_yolo_annotation(label_path)
         
         # 转换为Label Studio格式
         annotations = []
@@ -156,19 +222,9 @@ class YoloToLabelStudioConverter:
             annotations.append(annotation)
         
         # 创建Label Studio任务
-        # 使用相对于datasets的路径，格式：/data/local-files/?d=相对路径
-        if dataset_relative_path:
-            # 构建相对路径：如 test/images/xxx.jpg
-            image_relative_path = f"{dataset_relative_path}/{image_path.name}"
-        else:
-            # 仅使用文件名
-            image_relative_path = image_path.name
-            
-        image_url = f"/data/local-files/?d={image_relative_path}"
-        
         task = {
             "data": {
-                "image": image_url
+                "image": self.image_url(image_path, dataset_relative_path)
             },
             "annotations": [
                 {
@@ -180,65 +236,487 @@ class YoloToLabelStudioConverter:
         
         return task
     
-    def convert_dataset(self, images_dir: Path, labels_dir: Path, 
-                       dataset_relative_path: str = None) -> List[Dict[str, Any]]:
+    def prediction_task(self, image_path: Path, detections, img_width: int, img_height: int,
+                        task_id: int, dataset_relative_path: str = None,
+                        model_version: str = 'yolo') -> Dict[str, Any]:
         """
-        转换整个数据集
+        把模型检测结果转换为带预标注(predictions)的Label Studio任务
         
         Args:
+            image_path: 图像文件路径
+            detections: (N, 6) 数组 [x1, y1, x2, y2, conf, cls]，原图像素坐标
+            img_width: 图像宽度
+            img_height: 图像高度
+            task_id: 任务ID
+            dataset_relative_path: 相对于datasets的路径 (如 "test/images")
+            model_version: 写入predictions的模型版本
+            
+        Returns:
+            Label Studio任务字典
+        """
+        results = []
+        for x1, y1, x2, y2, score, class_id in detections.tolist():
+            class_id = int(class_id)
+            if class_id >= len(self.class_names):
+                # 模型类别与配置不一致，汇总后统一提示
+                self.unknown_class_ids[class_id] = self.unknown_class_ids.get(class_id, 0) + 1
+                continue
+            
+            yolo_box = {
+                'x_center': (x1 + x2) / 2 / img_width,
+                'y_center': (y1 + y2) / 2 / img_height,
+                'width': (x2 - x1) / img_width,
+                'height': (y2 - y1) / img_height
+            }
+            ls_box = self.yolo_to_label_studio_bbox(yolo_box, img_width, img_height)
+            
+            results.append({
+                "id": f"{task_id}_{len(results)}",
+                "type": "rectanglelabels",
+                "value": {
+                    "x": ls_box['x'],
+                    "y": ls_box['y'],
+                    "width": ls_box['width'],
+                    "height": ls_box['height'],
+                    "rotation": 0,
+                    "rectanglelabels": [self.class_names[class_id]]
+                },
+                "score": score,
+                "to_name": "image",
+                "from_name": "label",
+                "image_rotation": 0,
+                "original_width": img_width,
+                "original_height": img_height
+            })
+        
+        return {
+            "data": {
+                "image": self.image_url(image_path, dataset_relative_path)
+            },
+            "predictions": [
+                {
+                    "model_version": model_version,
+                    "score": sum(r['score'] for r in results) / len(results) if results else 0.0,
+                    "result": results
+                }
+            ]
+        }
+    
+    def iter_predictions(self, model, images_dir: Path, dataset_relative_path: str = None,
+                         model_version: str = 'yolo', conf_threshold: float = 0.25,
+                         imgsz: int = 640, batch_size: int = 16,
+                         workers: int = 4) -> Iterator[Dict[str, Any]]:
+        """
+        批量推理并逐个生成带预标注的任务
+        
+        图像解码与letterbox在后台线程中预取，模型按批次推理，结果逐个产出，
+        内存占用与图像数量无关
+        
+        Args:
+            model: YOLO 模型或 OnnxDetector
             images_dir: 图像目录路径
-            labels_dir: 标签目录路径
+            dataset_relative_path: 相对于datasets的路径 (如 "test/images")
+            model_version: 写入predictions的模型版本
+            conf_threshold: 置信度阈值
+            imgsz: 推理尺寸
+            batch_size: 推理批次大小
+            workers: 解码线程数
+            
+        Yields:
+            Label Studio任务字典
+        """
+        from inference_pipeline import iter_detections
+        
+        image_files = self.list_images(images_dir)
+        print(f"Found {len(image_files)} images in {images_dir}")
+        
+        start = time.perf_counter()
+        total_boxes = 0
+        task_id = 0
+        for item, detections in iter_detections(model, [str(f) for f in image_files], conf_threshold,
+                                                imgsz, batch_size, workers):
+            task_id += 1
+            img_height, img_width = item.image.shape[:2]
+            total_boxes += len(detections)
+            yield self.prediction_task(Path(item.path), detections, img_width, img_height,
+                                       task_id, dataset_relative_path, model_version)
+            
+            if task_id % 100 == 0:
+                print(f"Predicted {task_id} images...")
+        
+        elapsed = time.perf_counter() - start
+        print(f"Predicted {task_id} images ({total_boxes} boxes) in {elapsed:.1f}s "
+              f"({task_id / max(elapsed, 1e-9):.1f} images/s)")
+        if self.unknown_class_ids:
+            print(f"Warning: Skipped {sum(self.unknown_class_ids.values())} boxes with class IDs "
+                  f"{sorted(self.unknown_class_ids)} not in {self.class_names}")
+    
+    def convert_chunk(self, pairs: List[Tuple[Path, Path, int]],
+                      dataset_relative_path: str = None) -> Tuple[List[Optional[Dict[str, Any]]], int, float, int]:
+        """
+        转换一组图像（在子进程中执行）
+        
+        Args:
+            pairs: [(图像路径, 标注路径, 临时任务ID), ...]
             dataset_relative_path: 相对于datasets的路径 (如 "test/images")
             
         Returns:
-            Label Studio任务列表
+            (与pairs一一对应的任务列表(读取失败为None), 子进程pid, 耗时秒数, 命中尺寸缓存的图像数)
         """
-        tasks = []
-        task_id = 1
+        start = time.perf_counter()
+        hits = self.size_cache.hits if self.size_cache else 0
+        tasks = [self.convert_image(image_file, label_file, task_id, dataset_relative_path)
+                 for image_file, label_file, task_id in pairs]
+        if self.size_cache:
+            self.size_cache.flush()
+            hits = self.size_cache.hits - hits
+        return tasks, os.getpid(), time.perf_counter() - start, hits
+    
+    @staticmethod
+    def _renumber(task: Dict[str, Any], task_id: int) -> Dict[str, Any]:
+        """把任务中标注 / 预标注结果的ID改为最终的任务ID"""
+        for annotation in task.get('annotations', []) + task.get('predictions', []):
+            for idx, result in enumerate(annotation.get('result', [])):
+                result['id'] = f"{task_id}_{idx}"
+        return task
+    
+    def _ordered_results(self, executor: ProcessPoolExecutor, chunks: List[list],
+                         dataset_relative_path: str, max_pending: int) -> Iterator[tuple]:
+        """按提交顺序返回子任务结果，同时最多 max_pending 个子任务在执行，已转换未写出的任务不会堆积"""
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(self.convert_chunk, chunk, dataset_relative_path))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    
+    @staticmethod
+    def list_images(images_dir: Path) -> List[Path]:
+        """按文件名排序的图像列表"""
+        return sorted(f for f in images_dir.iterdir() if f.suffix.lower() in IMAGE_EXTENSIONS)
+    
+    def iter_dataset(self, images_dir: Path, labels_dir: Path,
+                     dataset_relative_path: str = None, workers: int = 1,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     image_files: Optional[List[Path]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        按文件名顺序逐个生成Label Studio任务
         
-        # 支持的图像格式
-        image_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif'}
+        workers > 1 时图像按 chunk_size 分块提交到进程池并行转换，结果仍按文件名顺序输出，
+        任务ID与单进程转换完全一致（读取失败的图像不占用ID）
         
+        Args:
+            images_dir: 图像目录路径
+            labels_dir: 标签目录路径
+            dataset_relative_path: 相对于datasets的路径 (如 "test/images")
+            workers: 并行进程数，1 表示在当前进程中转换
+            chunk_size: 每个子任务包含的图像数
+            image_files: 只转换这些图像（增量转换），None 表示目录中的全部图像
+            
+        Yields:
+            Label Studio任务字典
+        """
         # 遍历所有图像
         if not images_dir.exists():
             print(f"Error: Images directory not found: {images_dir}")
-            return tasks
+            return
             
-        image_files = [f for f in images_dir.iterdir() 
-                      if f.suffix.lower() in image_extensions]
+        if image_files is None:
+            image_files = self.list_images(images_dir)
+            print(f"Found {len(image_files)} images in {images_dir}")
+        else:
+            image_files = sorted(image_files)
+            print(f"Converting {len(image_files)} images in {images_dir}")
         
-        print(f"Found {len(image_files)} images in {images_dir}")
+        # 临时任务ID为图像序号，转换完成后按成功顺序重新编号
+        pairs = [(image_file, labels_dir / f"{image_file.stem}.txt", index)
+                 for index, image_file in enumerate(image_files, start=1)]
+        chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
         
-        for image_file in sorted(image_files):
-            # 查找对应的标注文件
-            label_file = labels_dir / f"{image_file.stem}.txt"
-            
-            # 转换
-            task = self.convert_image(image_file, label_file, task_id, dataset_relative_path)
-            if task:
-                tasks.append(task)
-                task_id += 1
+        start = time.perf_counter()
+        worker_stats = {}
+        cache_hits = 0
+        task_id = 1
+        
+        if workers > 1 and len(chunks) > 1:
+            print(f"Converting with {workers} workers ({len(chunks)} chunks of {chunk_size})")
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = self._ordered_results(executor, chunks, dataset_relative_path, workers * 2)
+        else:
+            executor = None
+            results = (self.convert_chunk(chunk, dataset_relative_path) for chunk in chunks)
+        
+        try:
+            for chunk, (tasks, pid, elapsed, hits) in zip(chunks, results):
+                count, seconds = worker_stats.get(pid, (0, 0.0))
+                worker_stats[pid] = (count + len(chunk), seconds + elapsed)
+                cache_hits += hits
                 
-                if task_id % 100 == 0:
-                    print(f"Processed {task_id - 1} images...")
+                for (_, _, index), task in zip(chunk, tasks):
+                    if not task:
+                        continue
+                    yield task if index == task_id else self._renumber(task, task_id)
+                    task_id += 1
+                    
+                    if task_id % 100 == 0:
+                        print(f"Processed {task_id - 1} images...")
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+        
+        elapsed = time.perf_counter() - start
+        print(f"Successfully converted {task_id - 1} images in {elapsed:.1f}s "
+              f"({len(image_files) / max(elapsed, 1e-9):.1f} images/s)")
+        if self.size_cache:
+            print(f"Image sizes: {cache_hits} from cache, {len(image_files) - cache_hits} read from headers "
+                  f"({self.size_cache.db_path})")
+        if len(worker_stats) > 1:
+            for pid, (count, seconds) in sorted(worker_stats.items()):
+                print(f"  worker {pid}: {count} images, {seconds:.1f}s, "
+                      f"{count / max(seconds, 1e-9):.1f} images/s")
+    
+    def convert_dataset(self, images_dir: Path, labels_dir: Path, 
+                       dataset_relative_path: str = None, workers: int = 1,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[Dict[str, Any]]:
+        """
+        转换整个数据集
+        
+        Args:
+            images_dir: 图像目录路径
+            labels_dir: 标签目录路径
+            dataset_relative_path: 相对于datasets的路径 (如 "test/images")
+            workers: 并行进程数，1 表示在当前进程中转换
+            chunk_size: 并行时每个子任务包含的图像数
+            
+        Returns:
+            Label Studio任务列表
+        """
+        return list(self.iter_dataset(images_dir, labels_dir, dataset_relative_path,
+                                      workers, chunk_size))
+
+
+class TaskWriter:
+    """
+    逐个写出Label Studio任务，不在内存中保留任务列表
+    
+    - json: 合法的JSON数组；默认与 json.dump(tasks, indent=2) 的输出完全一致
+    - jsonl: 每行一个任务
+    - shard_size > 0 时每 N 个任务切换到新文件: output-00000.json, output-00001.json, ...
+    - compress=True 时以 gzip 写出并追加 .gz 后缀
+    """
+    
+    def __init__(self, output_path: Path, fmt: str = None, compact: bool = False,
+                 compress: bool = False, shard_size: int = 0):
+        """
+        Args:
+            output_path: 输出文件路径
+            fmt: 'json' / 'jsonl'，None 表示按后缀判断
+            compact: 是否输出紧凑格式（无缩进）
+            compress: 是否gzip压缩
+            shard_size: 每个文件的任务数，0 表示不分片
+        """
+        self.output_path = Path(output_path)
+        self.fmt = fmt or ('jsonl' if self.output_path.suffix == '.jsonl' else 'json')
+        if self.fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format: {self.fmt}")
+        self.compact = compact
+        self.compress = compress
+        self.shard_size = shard_size
+        
+        self.files = []
+        self.count = 0
+        self._file = None
+        self._shard_count = 0
+    
+    def _shard_path(self, index: int) -> Path:
+        path = self.output_path
+        if self.shard_size:
+            path = path.with_name(f"{path.stem}-{index:05d}{path.suffix}")
+        if self.compress:
+            path = path.with_name(path.name + '.gz')
+        return path
+    
+    def _open(self):
+        path = self._shard_path(len(self.files))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if self.compress:
+            self._file = gzip.open(path, 'wt', encoding='utf-8')
+        else:
+            self._file = open(path, 'w', encoding='utf-8')
+        self.files.append(path)
+        self._shard_count = 0
+        if self.fmt == 'json':
+            self._file.write('[')
+    
+    def _close(self):
+        if self._file is None:
+            return
+        if self.fmt == 'json':
+            self._file.write('\n]' if self._shard_count else ']')
+        self._file.close()
+        self._file = None
+    
+    def _dumps(self, task: Dict[str, Any]) -> str:
+        if self.compact or self.fmt == 'jsonl':
+            return json.dumps(task, ensure_ascii=False, separators=(',', ':'))
+        # 与 json.dump(tasks, indent=2) 一致：数组元素整体缩进两格
+        return '  ' + json.dumps(task, indent=2, ensure_ascii=False).replace('\n', '\n  ')
+    
+    def write(self, task: Dict[str, Any]):
+        """写出一个任务"""
+        if self._file is None or (self.shard_size and self._shard_count >= self.shard_size):
+            self._close()
+            self._open()
         
-        print(f"Successfully converted {len(tasks)} images")
-        return tasks
+        text = self._dumps(task)
+        if self.fmt == 'jsonl':
+            self._file.write(text + '\n')
+        else:
+            self._file.write((',\n' if self._shard_count else '\n') + text)
+        self._shard_count += 1
+        self.count += 1
+    
+    def close(self):
+        """结束当前文件"""
+        self._close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def read_tasks(path: Path) -> Iterator[Dict[str, Any]]:
+    """
+    读取已有的导出文件（TaskWriter 写出的 json / jsonl，可为 .gz）
+    
+    Args:
+        path: 导出文件路径
+        
+    Yields:
+        Label Studio任务字典
+    """
+    path = Path(path)
+    compressed = path.suffix == '.gz'
+    fmt = 'jsonl' if (path.with_suffix('') if compressed else path).suffix == '.jsonl' else 'json'
+    
+    with (gzip.open(path, 'rt', encoding='utf-8') if compressed
+          else open(path, 'r', encoding='utf-8')) as f:
+        if fmt == 'json':
+            # 流式解析，--merge-into 的大导出不整个读入内存
+            yield from iter_json_array(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class TaskSpool:
+    """
+    按图像地址暂存任务的磁盘字典（临时 SQLite 文件）
+    
+    --merge-into 时新任务先写入这里，再流式读取已有导出逐个合并，内存占用与任务数量无关
+    """
+    
+    def __init__(self, directory: Optional[Path] = None):
+        """
+        Args:
+            directory: 临时文件所在目录，默认系统临时目录
+        """
+        fd, self.path = tempfile.mkstemp(prefix='.merge_', suffix='.sqlite', dir=directory)
+        os.close(fd)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode=OFF')
+        self.conn.execute('PRAGMA synchronous=OFF')
+        self.conn.execute('CREATE TABLE tasks (url TEXT PRIMARY KEY, task TEXT NOT NULL)')
+    
+    def extend(self, tasks: Iterator[Dict[str, Any]]):
+        """写入任务，同一图像地址保留最后一个"""
+        self.conn.executemany('INSERT OR REPLACE INTO tasks (url, task) VALUES (?, ?)',
+                              ((task['data']['image'], json.dumps(task, ensure_ascii=False))
+                               for task in tasks))
+    
+    def __len__(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+    
+    def __contains__(self, url: str) -> bool:
+        return self.conn.execute('SELECT 1 FROM tasks WHERE url = ?', (url,)).fetchone() is not None
+    
+    def pop(self, url: str) -> Dict[str, Any]:
+        row = self.conn.execute('SELECT task FROM tasks WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            raise KeyError(url)
+        self.conn.execute('DELETE FROM tasks WHERE url = ?', (url,))
+        return json.loads(row[0])
+    
+    def values(self) -> Iterator[Dict[str, Any]]:
+        """按写入顺序返回剩余的任务"""
+        for (task,) in self.conn.execute('SELECT task FROM tasks ORDER BY rowid'):
+            yield json.loads(task)
+    
+    def close(self):
+        self.conn.close()
+        os.remove(self.path)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
 
 
-def load_config(config_path: Path) -> Dict[str, Any]:
+def merge_task(existing: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
     """
-    加载YOLO数据集配置文件
+    合并同一图像的已有任务和新任务
+    
+    转换得到的任务（带 annotations）整体替换已有任务；预标注任务只更新 predictions：
+    保留已有的人工标注和其它模型版本的预标注，同一 model_version 的预标注被替换
     
     Args:
-        config_path: data.yaml配置文件路径
+        existing: 已有导出中的任务
+        update: 新任务
         
     Returns:
-        配置字典
+        合并后的任务
+    """
+    if 'annotations' in update:
+        return update
+    versions = {p.get('model_version') for p in update.get('predictions', [])}
+    merged = dict(existing)
+    merged['predictions'] = [p for p in existing.get('predictions', [])
+                             if p.get('model_version') not in versions] + update.get('predictions', [])
+    return merged
+
+
+def merge_tasks(existing: Iterator[Dict[str, Any]], updates, deleted: set) -> Iterator[Dict[str, Any]]:
     """
-    with open(config_path, 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
-    return config
+    把增量任务合并到已有导出中
+    
+    已有任务保持原顺序：变化的按 merge_task 合并，已删除的移除；新增任务追加在末尾。
+    标注结果ID按合并后的顺序重新编号
+    
+    Args:
+        existing: 已有导出的任务
+        updates: {图像地址: 新任务} 或 TaskSpool，合并过的任务会被取出
+        deleted: 已删除的图像地址
+        
+    Yields:
+        合并后的任务
+    """
+    task_id = 1
+    for task in existing:
+        url = task['data']['image']
+        if url in deleted:
+            continue
+        if url in updates:
+            task = merge_task(task, updates.pop(url))
+        yield YoloToLabelStudioConverter._renumber(task, task_id)
+        task_id += 1
+    for task in updates.values():
+        yield YoloToLabelStudioConverter._renumber(task, task_id)
+        task_id += 1
 
 
 def main():
@@ -262,6 +740,28 @@ Examples:
   
   # 指定配置文件
   python yolo2label_studio.py --dataset train --config ./datasets/data.yaml --output train_ls.json
+  
+  # 使用16个进程并行转换
+  python yolo2label_studio.py --dataset train --output train_ls.json --workers 16
+  
+  # 不使用图像尺寸缓存 (默认缓存在数据集目录旁的 .image_sizes.sqlite)
+  python yolo2label_studio.py --dataset train --output train_ls.json --no-size-cache
+  
+  # 紧凑的JSONL + gzip，每个文件1万个任务
+  python yolo2label_studio.py --dataset train --output train_ls.jsonl --compact --gzip --shard-size 10000
+  
+  # 增量转换：只输出上次转换后新增/变化的任务，已删除的图像写入 train_delta.deleted.json
+  python yolo2label_studio.py --dataset train --output train_delta.json --incremental --tombstones
+  
+  # 增量转换并合并到已有导出
+  python yolo2label_studio.py --dataset train --output train_ls.json --incremental --merge-into train_ls.json
+  
+  # 预标注：用训练好的模型批量推理未标注图像，写入predictions
+  python yolo2label_studio.py --dataset-path ./datasets/unlabeled --output pre.json --model best.pt
+  
+  # 把预标注合并到已审核的导出：保留人工标注，同一 model_version 的预标注被替换
+  python yolo2label_studio.py --dataset train --output train_ls.json --model best.pt --merge-into reviewed.json
+  python yolo2label_studio.py --dataset-path ./datasets/unlabeled --output pre.jsonl --model best.onnx --batch 32
         """
     )
     
@@ -278,6 +778,14 @@ Examples:
         help='Custom dataset path (alternative to --dataset)'
     )
     
+    parser.add_argument(
+        '--shards',
+        type=str,
+        default=None,
+        help='Read image sizes and labels from a split packed by dataset_shards.py '
+             '(URLs still use --dataset/--dataset-path)'
+    )
+    
     parser.add_argument(
         '--config',
         type=str,
@@ -299,6 +807,127 @@ Examples:
         help='Project root directory (default: ./datasets)'
     )
     
+    parser.add_argument(
+        '--format',
+        type=str,
+        choices=OUTPUT_FORMATS,
+        default=None,
+        help='Output format: json array or jsonl (default: inferred from --output suffix)'
+    )
+    
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='Write compact JSON without indentation'
+    )
+    
+    parser.add_argument(
+        '--gzip',
+        action='store_true',
+        help='Compress output files with gzip (appends .gz)'
+    )
+    
+    parser.add_argument(
+        '--shard-size',
+        type=int,
+        default=0,
+        help='Split output into files of N tasks each (default: 0, no sharding)'
+    )
+    
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Only emit tasks for images/labels that are new or changed since the last run'
+    )
+    
+    parser.add_argument(
+        '--manifest',
+        type=str,
+        default=None,
+        help=f'Manifest file for --incremental (default: <dataset path>/{MANIFEST_NAME})'
+    )
+    
+    parser.add_argument(
+        '--tombstones',
+        action='store_true',
+        help='With --incremental, write deleted images to <output>.deleted.json'
+    )
+    
+    parser.add_argument(
+        '--merge-into',
+        type=str,
+        default=None,
+        help='Existing export (json/jsonl, optionally .gz) to merge the converted tasks into'
+    )
+    
+    parser.add_argument(
+        '--model',
+        type=str,
+        default=None,
+        help='Pre-annotation mode: run this model (.pt or .onnx) and write predictions instead of annotations'
+    )
+    
+    parser.add_argument(
+        '--model-version',
+        type=str,
+        default=None,
+        help='model_version written to predictions (default: <model name>-<content hash>)'
+    )
+    
+    parser.add_argument(
+        '--conf',
+        type=float,
+        default=0.25,
+        help='Confidence threshold for pre-annotations (default: 0.25)'
+    )
+    
+    parser.add_argument(
+        '--imgsz',
+        type=int,
+        default=640,
+        help='Inference image size for pre-annotations (default: 640)'
+    )
+    
+    parser.add_argument(
+        '--batch',
+        type=int,
+        default=16,
+        help='Inference batch size for pre-annotations (default: 16)'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of worker processes for conversion (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f'Images per task submitted to each worker (default: {DEFAULT_CHUNK_SIZE})'
+    )
+    
+    parser.add_argument(
+        '--size-cache',
+        type=str,
+        default=None,
+        help=f'Image size cache file (default: <dataset parent>/{SIZE_CACHE_NAME})'
+    )
+    
+    parser.add_argument(
+        '--no-size-cache',
+        action='store_true',
+        help='Disable the persistent image size cache'
+    )
+    
+    parser.add_argument(
+        '--no-label-cache',
+        action='store_true',
+        help='Parse label files directly instead of using the compiled <labels>.index.npz cache'
+    )
+    
     args = parser.parse_args()
     
     # 验证参数
@@ -308,6 +937,12 @@ Examples:
     if args.dataset and args.dataset_path:
         parser.error("Cannot specify both --dataset and --dataset-path")
     
+    if args.model and args.incremental:
+        parser.error("--incremental cannot be combined with --model")
+    
+    if args.tombstones and not args.incremental:
+        parser.error("--tombstones requires --incremental")
+    
     # 加载配置
     config_path = Path(args.config)
     if not config_path.exists():
@@ -347,6 +982,16 @@ Examples:
         labels_dir = dataset_path / 'labels'
         dataset_relative_path = f"{args.dataset}/images"
     
+    # 打包后的分片：尺寸和标注都从分片索引读取
+    shard_reader = None
+    if args.shards:
+        if args.model or args.incremental:
+            print("Error: --shards cannot be combined with --model or --incremental")
+            return
+        shard_reader = ShardReader(args.shards)
+        images_dir = labels_dir = Path(shard_reader.shard_dir)
+        print(f"Shards: {images_dir} ({len(shard_reader)} images)")
+    
     print(f"Dataset path: {dataset_path}")
     print(f"Images directory: {images_dir}")
     print(f"Labels directory: {labels_dir}")
@@ -357,45 +1002,150 @@ Examples:
         print(f"Error: Images directory not found: {images_dir}")
         return
     
-    if not labels_dir.exists():
+    if not labels_dir.exists() and not args.model and not shard_reader:
         print(f"Warning: Labels directory not found: {labels_dir}")
         print("Creating tasks without annotations...")
     
-    # 创建转换器
-    converter = YoloToLabelStudioConverter(
-        dataset_root=str(project_root),
-        class_names=class_names
-    )
+    # 图像尺寸缓存
+    size_cache = None
+    if not args.no_size_cache and not shard_reader:
+        size_cache = ImageSizeCache(args.size_cache or dataset_path.parent / SIZE_CACHE_NAME)
+        print(f"Image size cache: {size_cache.db_path}")
     
-    # 转换数据集
-    print("\nStarting conversion...")
-    tasks = converter.convert_dataset(images_dir, labels_dir, dataset_relative_path)
+    spool = None
+    merge_copy = None
+    try:
+        # 标签缓存：只重新解析变化的标签文件
+        label_cache = None
+        if not args.no_label_cache and labels_dir.exists() and not args.model and not shard_reader:
+            label_cache = LabelCache.load(labels_dir, workers=args.workers or None)
     
-    if not tasks:
-        print("No tasks were created. Please check your dataset.")
-        return
+        # 创建转换器
+        converter = YoloToLabelStudioConverter(
+            dataset_root=str(project_root),
+            class_names=class_names,
+            size_cache=size_cache,
+            label_cache=label_cache,
+            shard_reader=shard_reader
+        )
+    
+        # 增量转换：对比 manifest，只转换新增或变化的图像
+        image_files = None
+        if shard_reader:
+            image_files = [Path(shard_reader.path(i)) for i in range(len(shard_reader))]
+        manifest = None
+        plan = None
+        if args.incremental:
+            manifest = ConversionManifest.load(
+                args.manifest or dataset_path / MANIFEST_NAME,
+                {'class_names': list(class_names), 'dataset_relative_path': dataset_relative_path}
+            )
+            all_images = converter.list_images(images_dir)
+            urls = {f: converter.image_url(f, dataset_relative_path) for f in all_images}
+            plan = manifest.plan([(urls[f], f, labels_dir / f"{f.stem}.txt") for f in all_images])
+            image_files = [f for f in all_images if urls[f] in plan.changed]
+            print(f"\nIncremental ({manifest.path}): {plan.new} new, {plan.modified} changed, "
+                  f"{plan.unchanged} unchanged, {len(plan.deleted)} deleted")
+    
+        # 转换数据集，边转换边写出
+        print("\nStarting conversion...")
+        converted = set()
     
-    # 保存结果
-    output_path = Path(args.output)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+        def converted_tasks():
+            for task in converter.iter_dataset(images_dir, labels_dir, dataset_relative_path,
+                                               workers=args.workers, chunk_size=args.chunk_size,
+                                               image_files=image_files):
+                converted.add(task['data']['image'])
+                yield task
+    
+        if args.model:
+            # 预标注模式：批量推理，结果直接写入predictions
+            from model_registry import get_model
+        
+            model_path = Path(args.model)
+            if not model_path.exists():
+                print(f"Error: Model not found: {model_path}")
+                return
+            model_version = args.model_version or f"{model_path.stem}-{file_digest(model_path)[:8]}"
+            backend = 'onnx' if model_path.suffix == '.onnx' else 'torch'
+            print(f"Pre-annotating with {model_path} ({backend}, model_version={model_version})")
+        
+            tasks = converter.iter_predictions(get_model(str(model_path), backend=backend), images_dir,
+                                               dataset_relative_path, model_version, args.conf,
+                                               args.imgsz, args.batch, max(args.workers, 1))
+        else:
+            tasks = converted_tasks()
+        if args.merge_into:
+            merge_path = Path(args.merge_into)
+            if not merge_path.exists():
+                print(f"Error: Export to merge into not found: {merge_path}")
+                return
+            if merge_path.resolve() in (Path(args.output).resolve(), Path(args.output + '.gz').resolve()):
+                # 输出覆盖同一文件：从已有导出的副本流式读取
+                fd, merge_copy = tempfile.mkstemp(prefix='.merge_', suffix=f".{merge_path.name}",
+                                                  dir=merge_path.parent)
+                os.close(fd)
+                shutil.copyfile(merge_path, merge_copy)
+                merge_path = Path(merge_copy)
+            spool = TaskSpool(Path(args.output).resolve().parent)
+            spool.extend(tasks)
+            print(f"Merging {len(spool)} converted tasks into {args.merge_into}")
+            tasks = merge_tasks(read_tasks(merge_path), spool, set(plan.deleted) if plan else set())
     
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(tasks, f, indent=2, ensure_ascii=False)
+        writer = TaskWriter(Path(args.output), fmt=args.format, compact=args.compact,
+                            compress=args.gzip, shard_size=args.shard_size)
+        total_annotations = 0
     
-    print(f"\n✓ Successfully converted {len(tasks)} tasks")
-    print(f"✓ Output saved to: {output_path}")
-    print(f"\nYou can now import {output_path} into Label Studio")
+        with writer:
+            for task in tasks:
+                writer.write(task)
+                if task.get('annotations'):
+                    total_annotations += len(task['annotations'][0]['result'])
+                elif task.get('predictions'):
+                    total_annotations += len(task['predictions'][0]['result'])
+    finally:
+        # 提前返回（模型或合并文件不存在）时同样写回尺寸缓存
+        if size_cache:
+            size_cache.close()
+        if spool is not None:
+            spool.close()
+        if merge_copy:
+            os.remove(merge_copy)
+    
+    # 输出写完后再更新 manifest，中断的转换下次会重新输出
+    if manifest:
+        failed = {converter.image_url(f, dataset_relative_path) for f in image_files} - converted
+        manifest.update(converted, failed)
+        manifest.save()
+        
+        if args.tombstones and plan.deleted:
+            output_path = Path(args.output)
+            tombstone_path = output_path.with_name(f"{output_path.stem}.deleted.json")
+            with open(tombstone_path, 'w', encoding='utf-8') as f:
+                json.dump([{'image': url} for url in plan.deleted], f, indent=2, ensure_ascii=False)
+            print(f"✓ {len(plan.deleted)} deleted images written to: {tombstone_path}")
+    
+    if not writer.count:
+        if args.incremental:
+            print("No new or changed tasks since the last conversion.")
+        else:
+            print("No tasks were created. Please check your dataset.")
+        return
+    
+    print(f"\n✓ Successfully converted {writer.count} tasks")
+    if len(writer.files) == 1:
+        print(f"✓ Output saved to: {writer.files[0]}")
+    else:
+        print(f"✓ Output saved to {len(writer.files)} files: {writer.files[0]} ... {writer.files[-1]}")
+    print(f"\nYou can now import {', '.join(str(f) for f in writer.files[:3])}"
+          f"{' ...' if len(writer.files) > 3 else ''} into Label Studio")
     
     # 打印统计信息
-    total_annotations = sum(
-        len(task['annotations'][0]['result']) 
-        for task in tasks 
-        if task.get('annotations')
-    )
     print(f"\nStatistics:")
-    print(f"  Total tasks: {len(tasks)}")
-    print(f"  Total annotations: {total_annotations}")
-    print(f"  Average annotations per image: {total_annotations / len(tasks):.2f}")
+    print(f"  Total tasks: {writer.count}")
+    kind = 'predictions' if args.model else 'annotations'
+    print(f"  Total {kind}: {total_annotations}")
+    print(f"  Average {kind} per image: {total_annotations / writer.count:.2f}")
 
 
 if __name__ == '__main__':